@@ -0,0 +1,152 @@
+"""Parsing one entry: the separate parse_* helpers vs the one-pass EntryParser.
+
+The legacy side is the previous chain run on every segment:
+guess_kind, parse_amount, detect_currency, detect_account,
+parse_counterparty, parse_due_date and guess_category.  Each helper
+lowercased and rescanned the text, and parse_due_date compiled a month
+regex per month name on every call.  The new side is
+``EntryParser.parse`` with its cache disabled (a cold parse per segment)
+and then with the cache (the repeated lookups handle_debt /
+handle_basic_entry make after on_text classified the segment).
+
+    python bench/entry_parse.py [--messages 20000]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from moliya.parsing import MONTHS_UZ, EntryParser, KeywordMatcher  # noqa: E402
+
+TODAY = date(2026, 10, 17)
+HINTS = {
+    "expense": ["chiqim", "xarajat", "taksi", "kafe", "ovqat", "magazin", "bozor", "kommunal", "internet", "ijara"],
+    "income": ["kirim", "oylik", "maosh", "keldi", "tushdi", "bonus", "premiya", "zarplata"],
+    "debt_given": ["qarz berdim", "qarzga berdim", "qarz ber"],
+    "debt_mine": ["qarz oldim", "qarzga oldim", "qarz ol"],
+}
+SAMPLES = [
+    "taksi 25k karta", "qarz berdim Aliga 1 200 000 15.09", "Akadan qarz oldim 2 mln ertaga", "oylik 5 mln",
+    "kafe 45 000 so'm naqd", "kommunal 350,5 ming uzcard", "qarz berdim Temurga 100$ 20 sentabr", "bozor 15 ming",
+    "internet 99 000 humo", "bonus keldi 1,5 mln", "ijara 300 usd 01.11.2026", "ovqat 32000",
+]
+
+
+def legacy_parse_amount(text):
+    t = (text or "").lower().replace("’", "'").strip()
+    m = re.search(r"\b(\d+[.,]?\d*)\s*(mln|million|млн)\b", t)
+    if m: return int(float(m.group(1).replace(",", ".")) * 1_000_000)
+    m = re.search(r"\b(\d+[.,]?\d*)\s*(ming|min|тыс|k)\b", t)
+    if m: return int(float(m.group(1).replace(",", ".")) * 1_000)
+    m = re.search(r"\b(\d+)\s*k\b", t)
+    if m: return int(m.group(1)) * 1000
+    m = re.search(r"\b(\d[\d\s,\.]{0,15})\b", t)
+    if m:
+        raw = m.group(1).replace(" ", "")
+        raw = raw.replace(",", "") if raw.count(",") <= 1 and raw.count(".") <= 1 else raw.replace(",", "").replace(".", "")
+        try: return int(float(raw))
+        except ValueError: return None
+    return None
+
+
+def legacy_detect_currency(text):
+    t = (text or "").lower()
+    if "$" in t or "usd" in t or "dollar" in t or "доллар" in t: return "USD"
+    if "eur" in t or "€" in t: return "EUR"
+    if any(w in t for w in ["uzs", "so'm", "so‘m", "som", "сум", "soum"]): return "UZS"
+    return "UZS"
+
+
+def legacy_detect_account(text):
+    t = (text or "").lower()
+    if any(w in t for w in ["karta", "plastik", "card", "visa", "master", "uzcard", "humo", "bank", "карта", "карты",
+                            "с карты", "банковская"]):
+        return "card"
+    if any(w in t for w in ["naqd", "cash", "qo'lda", "qolda", "qo‘l", "qol", "налич", "налом", "наличные"]):
+        return "cash"
+    return "cash"
+
+
+def legacy_parse_due_date(text):
+    t = (text or "").lower().replace("–", "-")
+    if "ertaga" in t or "завтра" in t: return (TODAY + timedelta(days=1)).strftime("%d.%m.%Y")
+    if "bugun" in t or "сегодня" in t: return TODAY.strftime("%d.%m.%Y")
+    m = re.search(r"\b(\d{1,2})[.\-/](\d{1,2})(?:[.\-/](\d{2,4}))?\b", t)
+    if m:
+        dd, mm, yy = int(m.group(1)), int(m.group(2)), m.group(3)
+        year = (int(yy) + 2000 if yy and int(yy) < 100 else int(yy)) if yy else TODAY.year
+        try: return datetime(year, mm, dd).strftime("%d.%m.%Y")
+        except ValueError: return None
+    for name, num in MONTHS_UZ.items():
+        m2 = re.search(rf"\b(\d{{1,2}})\s*[- ]\s*{name}\b", t)
+        if m2:
+            try: return datetime(TODAY.year, num, int(m2.group(1))).strftime("%d.%m.%Y")
+            except ValueError: return None
+    return None
+
+
+def legacy_parse_counterparty(text):
+    t = (text or "").lower()
+    m = re.search(r"\b([a-zA-Z\u0400-\u04FF‘'ʼ`-]+)dan\b", t)
+    if m: return m.group(1).replace("‘", "'").replace("ʼ", "'").capitalize()
+    m = re.search(r"\b([a-zA-Z\u0400-\u04FF‘'ʼ`-]+)(?:\s+(akaga|opaga|ukaga|singlimga|брате|сестре))?\s*(ga|qa|га|ке)\b", t)
+    if m:
+        base = m.group(1).replace("‘", "'").replace("ʼ", "'").capitalize()
+        return (base + ((" " + m.group(2)) if m.group(2) else "")).strip().capitalize()
+    return "—"
+
+
+def legacy_hints(text):
+    t = (text or "").lower()
+    return {group for group, words in HINTS.items() if any(w in t for w in words)}
+
+
+def legacy(text):
+    legacy_hints(text)
+    return (legacy_parse_amount(text), legacy_detect_currency(text), legacy_detect_account(text),
+            legacy_parse_due_date(text), legacy_parse_counterparty(text))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=20000)
+    args = parser.parse_args()
+    rnd = random.Random(3)
+    texts = [f"{rnd.choice(SAMPLES)} #{i}" for i in range(args.messages)]
+    KeywordMatcher(HINTS)  # compile outside the timing
+
+    began = time.perf_counter()
+    for text in texts:
+        legacy(text)
+    old = time.perf_counter() - began
+
+    cold = EntryParser(HINTS, cache_size=0)
+    began = time.perf_counter()
+    for text in texts:
+        cold.parse(text, TODAY)
+    new = time.perf_counter() - began
+
+    # what handle_basic_entry/handle_debt do after on_text already parsed the segment
+    warm = EntryParser(HINTS)
+    recent = texts[:warm.cache_size]
+    for text in recent:
+        warm.parse(text, TODAY)
+    rounds = max(1, len(texts) // len(recent))
+    began = time.perf_counter()
+    for _ in range(rounds):
+        for text in recent:
+            warm.parse(text, TODAY)
+    cached = (time.perf_counter() - began) / (rounds * len(recent)) * len(texts)
+
+    per = 1e6 / len(texts)
+    print(f"{len(texts)} segments: legacy helpers {old * per:.1f} us, one-pass parse {new * per:.1f} us "
+          f"({old / new:.1f}x), cached repeat {cached * per:.2f} us")
+
+
+if __name__ == "__main__":
+    main()
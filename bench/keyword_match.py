@@ -0,0 +1,98 @@
+"""guess_kind/guess_category: one automaton scan vs per-keyword substring tests.
+
+Uses the real hint tables from ``moliya.parsing``, checks that the compiled
+matcher gives the same kind and category as the original
+``any(w in t for w in hints)`` logic on a generated corpus, then times both.
+
+    python bench/keyword_match.py [--messages 20000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from moliya import parsing  # noqa: E402
+
+FILLER = ["bugun", "kecha", "do'konda", "uchun", "va", "ham", "so'm", "сегодня", "за", "и", "100", "250 000",
+          "50k", "1,5 mln", "naqd", "karta", "usd", "akaga", "opa", "ertaga", "15.09"]
+
+
+def reference_kind(text: str) -> str:
+    """The pre-matcher guess_kind: one substring test per keyword."""
+    h = parsing.KIND_HINTS
+    t = (text or "").lower()
+    if any(w in t for w in h["debt_given"]): return "debt_given"
+    if any(w in t for w in h["debt_mine"]): return "debt_mine"
+    if "avans" in t:
+        if any(w in t for w in h["avans_income"]): return "income"
+        if any(w in t for w in h["avans_expense"]): return "expense"
+    if any(w in t for w in h["purchase"]): return "expense"
+    if any(w in t for w in h["expense"]): return "expense"
+    if any(w in t for w in h["income"]): return "income"
+    if "oldim" in t and any(w in t for w in h["oldim_income"]): return "income"
+    if "oldim" in t: return "expense"
+    if t.strip().startswith("+"): return "income"
+    if t.strip().startswith("-"): return "expense"
+    return "expense"
+
+
+def reference_category(text: str, lang: str = "uz") -> str:
+    t = (text or "").lower()
+    for key, hints in parsing.CATEGORY_HINTS.items():
+        if any(h in t for h in hints):
+            labels = parsing.CATEGORY_LABELS.get(key, parsing.CATEGORY_LABELS["other"])
+            return labels.get(lang, labels.get("uz"))
+    labels = parsing.CATEGORY_LABELS["other"]
+    return labels.get(lang, labels.get("uz"))
+
+
+def corpus(count: int) -> list:
+    rnd = random.Random(7)
+    words = [w for group in parsing.KIND_HINTS.values() for w in group]
+    words += [w for group in parsing.CATEGORY_HINTS.values() for w in group]
+    out = []
+    for _ in range(count):
+        parts = rnd.choices(FILLER, k=rnd.randint(2, 6)) + rnd.choices(words, k=rnd.randint(0, 3))
+        rnd.shuffle(parts)
+        text = " ".join(parts)
+        if rnd.random() < 0.3:
+            # glue words together so hits overlap and straddle word boundaries
+            text = text.replace(" ", "", rnd.randint(1, 3))
+        out.append(rnd.choice(["", "+", "-", "Avans "]) + text)
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=20000)
+    args = parser.parse_args()
+    texts = corpus(args.messages)
+
+    matcher = parsing.ENTRY_PARSER.matcher
+    for text in texts:
+        expected = (reference_kind(text), reference_category(text))
+        hints = matcher.hits(text.lower())
+        got = (parsing.guess_kind(text, hints), parsing.guess_category(text, "uz", hints))
+        assert got == expected, (text, got, expected)
+
+    began = time.perf_counter()
+    for text in texts:
+        reference_kind(text)
+        reference_category(text)
+    old = time.perf_counter() - began
+    began = time.perf_counter()
+    for text in texts:
+        hints = matcher.hits(text.lower())
+        parsing.guess_kind(text, hints)
+        parsing.guess_category(text, "uz", hints)
+    new = time.perf_counter() - began
+    per = 1e6 / len(texts)
+    print(f"{len(texts)} messages, identical results: substring scans {old * per:.1f} us/msg, "
+          f"matcher {new * per:.1f} us/msg ({old / new:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Time and memory of exporting a long ledger as CSV and XLSX.
+
+Seeds ``--rows`` transactions for one user, exports them in both formats
+and prints wall time, file size and how much the peak RSS grew.  The files
+are then read back with the statement importer's parser to check that every
+row survives the round trip.
+
+    python bench/ledger_export.py [--rows 200000]
+"""
+import argparse
+import asyncio
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+_TMP = tempfile.TemporaryDirectory()
+os.environ["DB_PATH"] = os.path.join(_TMP.name, "export.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+from services.export import export_ledger  # noqa: E402
+from services.importer import iter_statement  # noqa: E402
+from services.ledger import Ledger  # noqa: E402
+
+HEADERS = ["Sana", "Turi", "Kategoriya", "Summa", "Valyuta", "Hisob", "Izoh"]
+KINDS = {"income": "Kirim", "expense": "Chiqim"}
+
+
+async def _seed(ledger: Ledger, rows: int) -> None:
+    start = datetime(2019, 1, 1, tzinfo=timezone.utc)
+    chunk = []
+    for i in range(rows):
+        kind = "income" if i % 10 == 0 else "expense"
+        chunk.append((kind, 1000 + i % 977 * 100, "UZS", "card", "🍔 Oziq-ovqat", f"Korzinka #{i}",
+                      start + timedelta(minutes=13 * i)))
+        if len(chunk) == 5000:
+            await ledger.import_history(1, chunk)
+            chunk = []
+    await ledger.import_history(1, chunk)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    args = parser.parse_args()
+
+    await db.run_migrations()
+    ledger = Ledger()
+    await ledger.start()
+    await _seed(ledger, args.rows)
+    print(f"seeded {args.rows} transactions")
+
+    for fmt in ("csv", "xlsx"):
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        started = time.perf_counter()
+        file, count = await export_ledger(ledger, 1, fmt, HEADERS, KINDS.get)
+        elapsed = time.perf_counter() - started
+        rss_growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+        path = os.path.join(_TMP.name, f"export.{fmt}")
+        with file, open(path, "wb") as out:
+            shutil.copyfileobj(file, out)
+        back = sum(1 for row in iter_statement(path, path, timezone.utc) if row is not None)
+        print(f"{fmt:>4}: {count} rows in {elapsed:.2f} s, {os.path.getsize(path) / 1024 / 1024:.1f} MB, "
+              f"peak RSS growth {rss_growth / 1024:.1f} MB, read back {back}")
+        assert count == args.rows == back, (count, back)
+    await ledger.close()
+    await db.POOL.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
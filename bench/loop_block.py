@@ -0,0 +1,155 @@
+"""Loop-blocking check for the handlers that touch the database.
+
+Runs the phone gate, contact, pay-debug and subscription handlers against a
+scratch database while another connection holds the write lock, with asyncio
+debug mode reporting every callback that keeps the loop busy longer than
+``--threshold-ms``.  A blocking ``sqlite3`` call is replayed first to show the
+detector fires; any report from the real handlers fails the check (exit
+status 1).
+
+    python bench/loop_block.py [--threshold-ms 5] [--lock-ms 300]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+_TMP = tempfile.TemporaryDirectory()
+os.environ["DB_PATH"] = os.path.join(_TMP.name, "loop.db")
+os.environ.pop("WEB_BASE", None)
+os.environ["ALLOW_MANUAL_CONFIRM"] = "true"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+from bot.middlewares.phone_gate import PhoneGateMiddleware  # noqa: E402
+from bot.routers import contact_router, pay_debug, subscription_plans  # noqa: E402
+
+
+class SlowCallbacks(logging.Handler):
+    """Collects asyncio's "Executing <Handle ...> took N seconds" reports."""
+
+    def __init__(self) -> None:
+        super().__init__(logging.WARNING)
+        self.reports = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        message = record.getMessage()
+        if message.startswith("Executing"):
+            self.reports.append(message)
+
+
+class FakeMessage:
+    def __init__(self, user_id: int, text: str = "") -> None:
+        self.from_user = SimpleNamespace(id=user_id)
+        self.text = text
+        self.contact = None
+        self.replies = []
+
+    async def answer(self, text: str, **_kw) -> None:
+        self.replies.append(text)
+
+
+class FakeCallback:
+    def __init__(self, user_id: int) -> None:
+        self.from_user = SimpleNamespace(id=user_id)
+        self.message = FakeMessage(user_id)
+
+    async def answer(self, *_a, **_kw) -> None:
+        return None
+
+
+def _hold_write_lock(seconds: float, locked: threading.Event) -> None:
+    conn = sqlite3.connect(os.environ["DB_PATH"])
+    conn.execute("BEGIN IMMEDIATE")
+    locked.set()
+    time.sleep(seconds)
+    conn.commit()
+    conn.close()
+
+
+async def _under_lock(lock_s: float, work) -> None:
+    locked = threading.Event()
+    holder = threading.Thread(target=_hold_write_lock, args=(lock_s, locked))
+    holder.start()
+    while not locked.is_set():
+        await asyncio.sleep(0.001)
+    try:
+        await work()
+    finally:
+        while holder.is_alive():
+            await asyncio.sleep(0.005)
+        # the slow-callback report is logged once the current step yields
+        await asyncio.sleep(0)
+
+
+async def _handlers(user_id: int) -> None:
+    async def passthrough(_event, _data):
+        return None
+
+    gate = PhoneGateMiddleware()
+    await gate(passthrough, FakeMessage(user_id, "salom"), {})
+    await contact_router._store_phone(user_id, "+998901234567")
+    await subscription_plans.show_subscription_plans(FakeMessage(user_id))
+    await pay_debug.pay_status(FakeMessage(user_id, "/pay_status"))
+    await pay_debug.last_invoice(FakeMessage(user_id, "/last_invoice"))
+    await pay_debug.force_return(FakeMessage(user_id, "/force_return"))
+    await subscription_plans.pay_check(FakeCallback(user_id))
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threshold-ms", type=float, default=5.0)
+    parser.add_argument("--lock-ms", type=float, default=300.0)
+    args = parser.parse_args()
+
+    loop = asyncio.get_running_loop()
+    loop.slow_callback_duration = args.threshold_ms / 1000
+    detector = SlowCallbacks()
+    logging.getLogger("asyncio").addHandler(detector)
+    await db.run_migrations()
+    await asyncio.sleep(0)
+    detector.reports.clear()
+    lock_s = args.lock_ms / 1000
+
+    async def blocking_store() -> None:
+        conn = sqlite3.connect(os.environ["DB_PATH"], timeout=5)
+        conn.execute("UPDATE users SET phone='x' WHERE user_id=0")
+        conn.commit()
+        conn.close()
+
+    await _under_lock(lock_s, blocking_store)
+    baseline = len(detector.reports)
+    print(f"blocking sqlite3 baseline: {baseline} slow callback(s)")
+    detector.reports.clear()
+
+    started = time.perf_counter()
+    await _under_lock(lock_s, lambda: _handlers(42))
+    elapsed = (time.perf_counter() - started) * 1000
+    async with db.POOL.acquire() as conn:
+        cur = await conn.execute("SELECT phone FROM users WHERE user_id=42")
+        phone = (await cur.fetchone())["phone"]
+        cur = await conn.execute("SELECT status FROM payments WHERE user_id=42")
+        statuses = [row["status"] for row in await cur.fetchall()]
+    print(f"handlers under a {args.lock_ms:.0f} ms write lock: {elapsed:.0f} ms, "
+          f"phone={phone} payments={statuses}")
+    for report in detector.reports:
+        print(f"FAIL {report}")
+    if not detector.reports:
+        print("ok   no handler blocked the loop")
+
+    await db.WRITES.close()
+    await db.POOL.close()
+    if not baseline:
+        print("detector did not fire on the blocking baseline")
+        return 1
+    return 1 if detector.reports else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(), debug=True))
@@ -0,0 +1,211 @@
+"""Generate bench/parser_corpus.jsonl, the labelled corpus for parser_accuracy.py.
+
+Messages are built from templates in Uzbek (Latin and Cyrillic) and
+Russian, so every label comes from the template rather than from the
+parser being measured.  Each line is one message:
+
+    {"text": "...", "lang": "uz|uz_cyr|ru",
+     "entries": [{"kind": ..., "amount": ..., "currency": ..., "category": ..., "due": ...}]}
+
+``category`` is a ``CATEGORY_LABELS`` key for expenses and null otherwise;
+``due`` is an ISO date for debts (relative to ``TODAY``) and null otherwise.
+The output is deterministic for a given ``--seed``.
+
+    python bench/make_parser_corpus.py [--messages 3000] [--seed 2025]
+"""
+import argparse
+import json
+import os
+import random
+from datetime import date, timedelta
+
+TODAY = date(2025, 9, 10)
+OUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "parser_corpus.jsonl")
+
+EXPENSES = {
+    "transport": {
+        "uz": ["taksi", "benzin", "avtobus", "yo'l kira", "yandex taxi"],
+        "uz_cyr": ["такси", "бензин", "метро", "автобус"],
+        "ru": ["такси", "бензин", "метро", "автобус", "парковка"],
+    },
+    "food": {
+        "uz": ["ovqat", "kafe", "tushlik", "osh", "non"],
+        "uz_cyr": ["овқат", "кафе", "тушлик", "ош"],
+        "ru": ["еда", "кафе", "обед в ресторане", "пицца", "фастфуд"],
+    },
+    "utilities": {
+        "uz": ["kommunal", "svet puli", "gaz", "suv puli"],
+        "uz_cyr": ["коммунал", "свет", "газ"],
+        "ru": ["коммуналка", "свет", "вода", "газ"],
+    },
+    "communication": {
+        "uz": ["internet", "telefon", "uzmobile", "beeline"],
+        "uz_cyr": ["интернет", "телефон"],
+        "ru": ["интернет", "связь", "телефон"],
+    },
+    "housing": {
+        "uz": ["ijara", "kvartira ijarasi"],
+        "uz_cyr": ["ижара", "квартира"],
+        "ru": ["аренда", "квартира", "ипотека"],
+    },
+    "health": {
+        "uz": ["dorixona", "dori", "shifokor"],
+        "uz_cyr": ["дорихона", "дори"],
+        "ru": ["аптека", "врач", "лекарства"],
+    },
+    "shopping": {
+        "uz": ["bozor", "kiyim", "magazin", "sumka"],
+        "uz_cyr": ["бозор", "кийим", "магазин"],
+        "ru": ["магазин", "одежда", "рынок"],
+    },
+    "entertainment": {
+        "uz": ["kino", "konsert"],
+        "uz_cyr": ["кино", "концерт"],
+        "ru": ["кино", "концерт", "театр"],
+    },
+    "education": {
+        "uz": ["kurs", "dars"],
+        "uz_cyr": ["курс", "дарс"],
+        "ru": ["курс", "семинар"],
+    },
+    "other": {
+        "uz": ["sovg'a", "to'yga"],
+        "uz_cyr": ["совға"],
+        "ru": ["подарок"],
+    },
+}
+INCOME = {
+    "uz": ["oylik tushdi", "maosh keldi", "bonus", "premiya oldim", "avans oldim", "kirim"],
+    "uz_cyr": ["ойлик тушди", "маош келди", "бонус", "кирим"],
+    "ru": ["зарплата", "пришла зарплата", "получил премию", "доход", "продал телефон"],
+}
+EXPENSE_TEMPLATES = {
+    "uz": ["{what} {amount}", "{amount} {what}", "{what} uchun {amount} to'ladim", "bugun {what} {amount}"],
+    "uz_cyr": ["{what} {amount}", "{what} учун {amount} тўладим"],
+    "ru": ["{what} {amount}", "потратил {amount} на {what}", "{what} — {amount}"],
+}
+INCOME_TEMPLATES = {
+    "uz": ["{what} {amount}", "{amount} {what}"],
+    "uz_cyr": ["{what} {amount}"],
+    "ru": ["{what} {amount}", "{amount} {what}"],
+}
+NAMES = {"uz": ["Ali", "Vali", "Temur", "Aziz", "Dilshod", "Sardor"], "uz_cyr": ["Али", "Темур", "Азиз"],
+         "ru": ["Саше", "Диме", "Олегу"]}
+DEBT_TEMPLATES = {
+    ("uz", "debt_given"): ["qarz berdim {name}ga {amount} {due}", "{name}ga qarzga berdim {amount} {due}"],
+    ("uz", "debt_mine"): ["qarz oldim {name}dan {amount} {due}", "{name}dan {amount} qarz oldim {due}"],
+    ("uz_cyr", "debt_given"): ["қарз бердим {name}га {amount} {due}"],
+    ("uz_cyr", "debt_mine"): ["{name}дан қарз олдим {amount} {due}"],
+    ("ru", "debt_given"): ["дал в долг {name} {amount} до {due}"],
+    ("ru", "debt_mine"): ["взял в долг {amount} до {due}"],
+}
+MONTH_NAMES = ["yanvar", "fevral", "mart", "aprel", "may", "iyun", "iyul", "avgust", "sentabr", "oktabr",
+               "noyabr", "dekabr"]
+JOINERS = {"uz": [", ", " va ", "\n"], "uz_cyr": [", ", "\n"], "ru": [", ", " и ", "\n"]}
+
+
+def _uzs(rnd: random.Random, lang: str) -> tuple:
+    value = rnd.choice([rnd.randrange(2, 500) * 1000, rnd.randrange(1, 60) * 100_000, rnd.randrange(5, 999) * 100])
+    styles = ["plain", "spaced", "dotted"]
+    if value % 1000 == 0 and value < 1_000_000:
+        styles += ["k", "thousand"]
+    if value % 100_000 == 0 and value >= 1_000_000:
+        styles += ["mln"]
+    style = rnd.choice(styles)
+    if style == "plain":
+        text = str(value)
+    elif style == "spaced":
+        text = f"{value:,}".replace(",", " ")
+    elif style == "dotted":
+        text = f"{value:,}".replace(",", ".")
+    elif style == "k":
+        text = f"{value // 1000}k"
+    elif style == "thousand":
+        text = f"{value // 1000} " + {"uz": "ming", "uz_cyr": "минг", "ru": "тыс"}[lang]
+    else:
+        millions = f"{value / 1_000_000:g}"
+        text = (millions.replace(".", ",") if rnd.random() < 0.5 else millions) + " " + \
+            {"uz": "mln", "uz_cyr": "млн", "ru": "млн"}[lang]
+    if rnd.random() < 0.3:
+        text += " " + {"uz": rnd.choice(["so'm", "so‘m", "som"]), "uz_cyr": "сўм", "ru": "сум"}[lang]
+    return value, "UZS", text
+
+
+def _foreign(rnd: random.Random, lang: str) -> tuple:
+    value = rnd.randrange(5, 500)
+    if rnd.random() < 0.75:
+        return value, "USD", rnd.choice([f"{value}$", f"${value}", f"{value} usd", f"{value} USD",
+                                         f"{value} " + ("доллар" if lang != "uz" else "dollar")])
+    return value, "EUR", rnd.choice([f"{value} eur", f"{value}€", f"{value} евро"])
+
+
+def _amount(rnd: random.Random, lang: str) -> tuple:
+    return _uzs(rnd, lang) if rnd.random() < 0.8 else _foreign(rnd, lang)
+
+
+def _due(rnd: random.Random, lang: str) -> tuple:
+    offset = rnd.randrange(1, 60)
+    when = TODAY + timedelta(days=offset)
+    choices = [(f"{when:%d.%m}", when), (f"{when:%d.%m.%Y}", when)]
+    if lang == "uz":
+        choices += [("ertaga", TODAY + timedelta(days=1)), ("bugun", TODAY),
+                    (f"{when.day} {MONTH_NAMES[when.month - 1]}", when)]
+    elif lang == "ru":
+        choices += [("завтра", TODAY + timedelta(days=1))]
+    text, due = rnd.choice(choices)
+    return text, due.isoformat()
+
+
+def _basic(rnd: random.Random, lang: str, income: bool) -> tuple:
+    value, currency, amount_text = _amount(rnd, lang)
+    if income:
+        what = rnd.choice(INCOME[lang])
+        template = rnd.choice(INCOME_TEMPLATES[lang])
+        label = {"kind": "income", "category": None}
+    else:
+        category = rnd.choice(list(EXPENSES))
+        what = rnd.choice(EXPENSES[category][lang])
+        template = rnd.choice(EXPENSE_TEMPLATES[lang])
+        label = {"kind": "expense", "category": category}
+    label.update(amount=value, currency=currency, due=None)
+    return template.format(what=what, amount=amount_text), label
+
+
+def _debt(rnd: random.Random, lang: str) -> tuple:
+    kind = rnd.choice(["debt_given", "debt_mine"])
+    value, currency, amount_text = _amount(rnd, lang)
+    due_text, due = _due(rnd, lang)
+    template = rnd.choice(DEBT_TEMPLATES[(lang, kind)])
+    text = template.format(name=rnd.choice(NAMES[lang]), amount=amount_text, due=due_text)
+    return text, {"kind": kind, "category": None, "amount": value, "currency": currency, "due": due}
+
+
+def message(rnd: random.Random) -> dict:
+    lang = rnd.choices(["uz", "uz_cyr", "ru"], weights=[5, 2, 3])[0]
+    roll = rnd.random()
+    if roll < 0.12:
+        text, label = _debt(rnd, lang)
+        return {"text": text, "lang": lang, "entries": [label]}
+    if roll < 0.27:
+        parts = [_basic(rnd, lang, rnd.random() < 0.3) for _ in range(rnd.randint(2, 3))]
+        return {"text": rnd.choice(JOINERS[lang]).join(p[0] for p in parts), "lang": lang,
+                "entries": [p[1] for p in parts]}
+    text, label = _basic(rnd, lang, roll > 0.85)
+    return {"text": text, "lang": lang, "entries": [label]}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=3000)
+    parser.add_argument("--seed", type=int, default=2025)
+    parser.add_argument("--out", default=OUT)
+    args = parser.parse_args()
+    rnd = random.Random(args.seed)
+    with open(args.out, "w", encoding="utf-8") as f:
+        for _ in range(args.messages):
+            f.write(json.dumps(message(rnd), ensure_ascii=False, separators=(",", ":")) + "\n")
+    print(f"wrote {args.messages} messages to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
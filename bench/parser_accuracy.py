@@ -0,0 +1,132 @@
+"""Parser accuracy and throughput on the labelled corpus (bench/parser_corpus.jsonl).
+
+Every message goes through the same path as a chat message:
+``message_entries`` (``split_tx_entries`` plus ``attach_debt_due``) and then
+kind, amount, currency, category (expenses) and due date (debts) of each
+entry, all from ``moliya.parsing``.  The harness reports the share of
+correct segment counts, per-field accuracy over the labelled entries and
+messages/second.  A message split into the wrong number of segments counts
+every entry as wrong.
+
+Due dates resolve against the corpus ``TODAY`` so relative dates
+("ertaga", "15.09") give the same answer on every run.  ``--workers N``
+also times the corpus spread over N worker processes.
+
+    python bench/parser_accuracy.py [--errors 5] [--repeat 3] [--workers 4]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS = os.path.join(ROOT, "bench", "parser_corpus.jsonl")
+FIELDS = ("kind", "amount", "currency", "category", "due")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+
+from make_parser_corpus import TODAY  # noqa: E402
+from moliya import parsing  # noqa: E402
+
+
+def entry(segment: str) -> dict:
+    parsed = parsing.parse_entry(segment, TODAY)
+    return {
+        "kind": parsing.guess_kind(segment, parsed.hints),
+        "amount": parsed.amount,
+        "currency": parsed.currency,
+        "category": parsing.category_key(segment, parsed.hints),
+        "due": parsed.due.isoformat() if parsed.due else None,
+    }
+
+
+def run(text: str) -> list:
+    return [entry(segment) for segment in parsing.message_entries(text, TODAY)]
+
+
+def run_chunk(texts: list) -> int:
+    for text in texts:
+        run(text)
+    return len(texts)
+
+
+def expected_value(label: dict, field: str):
+    if field == "category" and label["kind"] != "expense":
+        return None
+    if field == "due" and not label["kind"].startswith("debt"):
+        return None
+    return label[field]
+
+
+def score(messages: list, show_errors: int) -> None:
+    total = Counter()
+    correct = Counter()
+    by_lang = defaultdict(Counter)
+    errors = defaultdict(list)
+    split_ok = 0
+    for msg in messages:
+        got = run(msg["text"])
+        same_split = len(got) == len(msg["entries"])
+        split_ok += same_split
+        for i, label in enumerate(msg["entries"]):
+            for field in FIELDS:
+                want = expected_value(label, field)
+                if want is None and field in ("category", "due"):
+                    continue
+                total[field] += 1
+                value = got[i][field] if same_split else "<split>"
+                if value == want:
+                    correct[field] += 1
+                    by_lang[msg["lang"]][field] += 1
+                elif len(errors[field]) < show_errors:
+                    errors[field].append((msg["text"], want, value))
+                by_lang[msg["lang"]][f"{field}:n"] += 1
+
+    print(f"segments  {split_ok / len(messages):7.1%}  ({split_ok}/{len(messages)} messages)")
+    for field in FIELDS:
+        cells = "  ".join(
+            f"{lang} {by_lang[lang][field] / by_lang[lang][f'{field}:n']:6.1%}"
+            for lang in ("uz", "uz_cyr", "ru") if by_lang[lang][f"{field}:n"]
+        )
+        print(f"{field:<9} {correct[field] / total[field]:7.1%}  ({correct[field]}/{total[field]})   {cells}")
+    for field in FIELDS:
+        for text, want, value in errors[field]:
+            print(f"  {field}: {text!r}: expected {want!r}, got {value!r}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", default=CORPUS)
+    parser.add_argument("--errors", type=int, default=0, help="print up to N mismatches per field")
+    parser.add_argument("--repeat", type=int, default=3, help="timed passes; the best one is reported")
+    parser.add_argument("--workers", type=int, default=0, help="also time N worker processes")
+    args = parser.parse_args()
+    with open(args.corpus, encoding="utf-8") as f:
+        messages = [json.loads(line) for line in f if line.strip()]
+    texts = [msg["text"] for msg in messages]
+
+    score(messages, args.errors)
+    best = None
+    for _ in range(args.repeat):
+        # a cold entry cache each pass, as for fresh messages
+        parsing.ENTRY_PARSER.clear()
+        began = time.perf_counter()
+        run_chunk(texts)
+        elapsed = time.perf_counter() - began
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{len(texts)} messages, {len(texts) / best:,.0f} messages/s ({best / len(texts) * 1e6:.1f} us/message)")
+
+    if args.workers:
+        began = time.perf_counter()
+        with ProcessPoolExecutor(args.workers) as pool:
+            size = -(-len(texts) // args.workers)
+            done = sum(pool.map(run_chunk, [texts[i:i + size] for i in range(0, len(texts), size)]))
+        elapsed = time.perf_counter() - began
+        print(f"{args.workers} workers (including start-up and import): {done / elapsed:,.0f} messages/s")
+
+
+if __name__ == "__main__":
+    main()
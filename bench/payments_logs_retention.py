@@ -0,0 +1,95 @@
+"""Size and checkpoint time of payments_logs before and after retention.
+
+Builds a scratch database whose payments_logs holds ``--rows`` uncompressed
+Click events spread over the last ``--months`` months (what production
+accumulates today).  It then runs the migrations, which compress the
+payloads, and one retention pass, and prints the report.
+
+    python bench/payments_logs_retention.py [--rows 200000] [--months 6] [--retention-days 90]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+_TMP = tempfile.TemporaryDirectory()
+os.environ["DB_PATH"] = os.path.join(_TMP.name, "logs.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+from services.payment_logs import PaymentLogRetention  # noqa: E402
+
+
+def _seed(rows: int, months: int) -> None:
+    now = datetime.now(timezone.utc)
+    step = timedelta(days=30 * months) / rows
+    conn = sqlite3.connect(os.environ["DB_PATH"])
+    # as run_migrations creates new databases
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(db.PAYMENTS_LOGS_TABLE)
+    payload = {
+        "click_trans_id": 0, "service_id": "31337", "click_paydoc_id": 0,
+        "merchant_trans_id": "", "amount": "19900.00", "action": "1", "error": "0",
+        "error_note": "Success", "sign_time": "", "sign_string": "f" * 32,
+    }
+    batch = []
+    for i in range(rows):
+        payload.update(click_trans_id=i, click_paydoc_id=i * 7, merchant_trans_id=f"INV-{i % 5000}-{i}")
+        ts = db.to_db_ts(now - step * (rows - i))
+        payload["sign_time"] = ts
+        batch.append(("click_complete", json.dumps(payload), 1, ts))
+        if len(batch) == 10000:
+            conn.executemany(
+                "INSERT INTO payments_logs(event_type, raw_payload, verified, created_at) VALUES(?,?,?,?)",
+                batch,
+            )
+            batch.clear()
+    if batch:
+        conn.executemany(
+            "INSERT INTO payments_logs(event_type, raw_payload, verified, created_at) VALUES(?,?,?,?)",
+            batch,
+        )
+    conn.commit()
+    conn.close()
+
+
+def _mb(value: int) -> str:
+    return f"{value / 1024 / 1024:8.2f} MB"
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--months", type=int, default=6)
+    parser.add_argument("--retention-days", type=int, default=90)
+    args = parser.parse_args()
+
+    _seed(args.rows, args.months)
+    print(f"seeded {args.rows} rows:        {_mb(os.path.getsize(os.environ['DB_PATH']))}")
+    await db.run_migrations()
+    retention = PaymentLogRetention(
+        retention_days=args.retention_days, archive_dir=os.path.join(_TMP.name, "archive")
+    )
+    report = await retention.run()
+    before, after = report["before"], report["after"]
+    print(f"after compression migration: {_mb(before['db_bytes'])}  wal {_mb(before['wal_bytes'])}  "
+          f"checkpoint {before['checkpoint_ms']:7.2f} ms  rows {before['log_rows']}")
+    print(f"after retention ({report['compaction']}):  {_mb(after['db_bytes'])}  wal {_mb(after['wal_bytes'])}  "
+          f"checkpoint {after['checkpoint_ms']:7.2f} ms  rows {after['log_rows']}")
+    for month, moved in report["archived"].items():
+        size = os.path.getsize(retention.archive_path(month))
+        print(f"  archived {month}: {moved:7d} rows  {_mb(size)}")
+    sample_month = next(iter(report["archived"]), None)
+    if sample_month:
+        rows = await retention.read_archive(sample_month)
+        print(f"  {sample_month} first archived payload: {rows[0]['payload']['merchant_trans_id']}")
+    await db.POOL.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,104 @@
+"""Connect-per-call vs pooled connections for a Click callback burst.
+
+Every Click complete callback reads the payment, appends a payments_logs row
+and flips the payment to paid.  Before the pool each of those steps opened
+its own aiosqlite connection; this script replays the same three statements
+both ways against a scratch database and prints throughput and latency.
+
+    python bench/pool_callback.py [--callbacks 2000] [--concurrency 32]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aiosqlite  # noqa: E402
+
+from db import PAYMENTS_LOGS_TABLE, PAYMENTS_TABLE, ConnectionPool  # noqa: E402
+
+
+async def _prepare(path: str, invoices: int) -> None:
+    async with aiosqlite.connect(path) as db:
+        await db.execute("PRAGMA journal_mode=WAL")
+        await db.execute(PAYMENTS_TABLE)
+        await db.execute(PAYMENTS_LOGS_TABLE)
+        await db.executemany(
+            "INSERT INTO payments(user_id, amount, status, invoice_id) VALUES(?, ?, 'pending', ?)",
+            [(i, 7990, f"inv-{i}") for i in range(invoices)],
+        )
+        await db.commit()
+
+
+async def _callback(db: aiosqlite.Connection, invoice_id: str) -> None:
+    cur = await db.execute("SELECT * FROM payments WHERE invoice_id=?", (invoice_id,))
+    await cur.fetchone()
+    await db.execute(
+        "INSERT INTO payments_logs(event_type, raw_payload, verified) VALUES(?, ?, ?)",
+        ("click_complete", f'{{"merchant_trans_id": "{invoice_id}", "error": "0"}}', 1),
+    )
+    await db.execute(
+        "UPDATE payments SET status='paid', paid_at=CURRENT_TIMESTAMP WHERE invoice_id=?",
+        (invoice_id,),
+    )
+    await db.commit()
+
+
+async def _run(label: str, handler, callbacks: int, concurrency: int) -> None:
+    sem = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int) -> None:
+        async with sem:
+            started = time.perf_counter()
+            await handler(f"inv-{i}")
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(callbacks)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(
+        f"{label:<16} {callbacks / elapsed:8.0f} cb/s   "
+        f"p50 {statistics.median(latencies) * 1000:6.2f} ms   p95 {p95 * 1000:6.2f} ms"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--callbacks", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--pool-size", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "direct.db")
+        await _prepare(path, args.callbacks)
+
+        async def direct(invoice_id: str) -> None:
+            async with aiosqlite.connect(path) as db:
+                await _callback(db, invoice_id)
+
+        await _run("connect-per-call", direct, args.callbacks, args.concurrency)
+
+        path = os.path.join(tmp, "pooled.db")
+        await _prepare(path, args.callbacks)
+        pool = ConnectionPool(path, args.pool_size)
+
+        async def pooled(invoice_id: str) -> None:
+            async with pool.acquire() as db:
+                await _callback(db, invoice_id)
+
+        try:
+            await _run(f"pool({args.pool_size})", pooled, args.callbacks, args.concurrency)
+        finally:
+            await pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,93 @@
+"""Check that the time-range and status lookups are served by an index.
+
+Runs the migrations against a scratch database, calls the real query helpers
+with tracing on, and feeds every SELECT they issue to EXPLAIN QUERY PLAN.  A
+full-table SCAN of any table fails the check (exit status 1).
+
+    python bench/query_plans.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+_TMP = tempfile.TemporaryDirectory()
+os.environ["DB_PATH"] = os.path.join(_TMP.name, "plans.db")
+os.environ["DB_POOL_SIZE"] = "1"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import payments  # noqa: E402
+from services.ledger import Ledger  # noqa: E402
+
+
+async def _seed(conn) -> None:
+    now = datetime.now(timezone.utc)
+    rows = [(i % 50, "expense" if i % 3 else "income", 1000 + i, db.to_db_ts(now - timedelta(hours=i)))
+            for i in range(2000)]
+    await conn.executemany(
+        "INSERT INTO transactions(user_id, kind, amount, created_at) VALUES(?,?,?,?)", rows
+    )
+    await conn.executemany(
+        "INSERT INTO payments(user_id, invoice_id, amount, status, created_at) VALUES(?,?,?,?,?)",
+        [(i % 50, f"inv-{i}", 19900, "paid" if i % 2 else "pending", ts) for i, (_, _, _, ts) in enumerate(rows)],
+    )
+    await conn.executemany(
+        "INSERT INTO subs(user_id, plan, status, pay_id, start_at, end_at) VALUES(?,?,?,?,?,?)",
+        [(i % 50, "sub_month", "active", f"inv-{i}", ts, ts) for i, (_, _, _, ts) in enumerate(rows)],
+    )
+    await conn.executemany(
+        "INSERT INTO debts(user_id, direction, amount, due_date) VALUES(?,?,?,?)",
+        [(i % 50, "given", 5000, ts[:10]) for i, (_, _, _, ts) in enumerate(rows)],
+    )
+    await conn.commit()
+    await conn.execute("ANALYZE")
+
+
+async def main() -> int:
+    await db.run_migrations()
+    statements = []
+    async with db.POOL.acquire() as conn:
+        await _seed(conn)
+    ledger = Ledger(tz=timezone.utc, cache_per_user=1)
+    await ledger.start()
+    since = datetime.now(timezone.utc) - timedelta(days=7)
+
+    async with db.POOL.acquire() as conn:
+        await conn.set_trace_callback(statements.append)
+    try:
+        async with db.POOL.acquire() as conn:
+            await db.stats(conn, 7, since)
+            await db.list_report(conn, 7, 30)
+            await db.debts_due_today_morning(conn)
+            await db.debts_due_today_evening(conn)
+            await db.current_sub(conn, 7)
+        await payments.get_recent_pending_payment(7)
+        await payments.get_latest_payment(7)
+        await ledger.range(7, since=since - timedelta(days=365))
+        await ledger.kind_totals_since(7, since)
+        await ledger.month_stats(7, since.strftime("%Y%m"))
+    finally:
+        async with db.POOL.acquire() as conn:
+            await conn.set_trace_callback(None)
+
+    failed = 0
+    async with db.POOL.acquire() as conn:
+        for sql in statements:
+            if not sql.lstrip().upper().startswith("SELECT"):
+                continue
+            cur = await conn.execute(f"EXPLAIN QUERY PLAN {sql}")
+            plan = [row["detail"] for row in await cur.fetchall()]
+            scans = [d for d in plan if d.startswith("SCAN") and "USING" not in d]
+            failed += bool(scans)
+            print(("FAIL " if scans else "ok   ") + " ".join(sql.split()))
+            for detail in plan:
+                print(f"       {detail}")
+    await ledger.close()
+    await db.POOL.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,111 @@
+"""Per-record memory of ledger transactions and debts: dicts vs slotted records.
+
+Rows come out of an in-memory SQLite table the way the ledger reads them,
+so every string is a fresh object.  Each variant is measured with
+tracemalloc while ``--records`` of them are alive:
+
+* dict: the shape used before (string keys, aware ``datetime``),
+* record: ``TxRecord`` / ``DebtRecord`` (``__slots__``, epoch seconds,
+  interned kind/currency/account/category/direction/status).
+
+    python bench/record_memory.py [--records 100000]
+"""
+import argparse
+import gc
+import os
+import sqlite3
+import sys
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.records import DebtRecord, TxRecord  # noqa: E402
+
+TZ = timezone(timedelta(hours=5))
+CATEGORIES = ["🍔 Oziq-ovqat", "🚕 Transport", "🏠 Uy-joy", "💊 Sog‘liq", "🧾 Boshqa xarajatlar"]
+
+
+def _tx_rows(conn: sqlite3.Connection, count: int) -> list:
+    conn.execute("CREATE TABLE tx(id, kind, amount, currency, account, category, note, created_at)")
+    start = datetime(2024, 1, 1)
+    conn.executemany(
+        "INSERT INTO tx VALUES(?,?,?,?,?,?,?,?)",
+        (
+            (i, "expense" if i % 7 else "income", 1000 + i, "UZS" if i % 5 else "USD", "cash" if i % 3 else "card",
+             CATEGORIES[i % len(CATEGORIES)], f"note {i % 50}", (start + timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M:%S"))
+            for i in range(count)
+        ),
+    )
+    return conn.execute("SELECT * FROM tx").fetchall()
+
+
+def _debt_rows(conn: sqlite3.Connection, count: int) -> list:
+    conn.execute("CREATE TABLE debts(id, direction, amount, currency, counterparty, due, status, created_at)")
+    start = datetime(2024, 1, 1)
+    conn.executemany(
+        "INSERT INTO debts VALUES(?,?,?,?,?,?,?,?)",
+        (
+            (i, "given" if i % 2 else "mine", 50000 + i, "UZS", f"Aka{i % 40}", "01.09.2025", "wait",
+             (start + timedelta(hours=i)).strftime("%Y-%m-%d %H:%M:%S"))
+            for i in range(count)
+        ),
+    )
+    return conn.execute("SELECT * FROM debts").fetchall()
+
+
+def _ts(raw: str) -> datetime:
+    return datetime.strptime(raw, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc).astimezone(TZ)
+
+
+def _tx_dict(row: tuple) -> dict:
+    return {"id": row[0], "ts": _ts(row[7]), "kind": row[1], "amount": row[2], "currency": row[3],
+            "account": row[4], "category": row[5], "desc": row[6]}
+
+
+def _tx_record(row: tuple) -> TxRecord:
+    return TxRecord(row[0], int(_ts(row[7]).timestamp()), row[1], row[2], row[3], row[4], row[5], row[6])
+
+
+def _debt_dict(row: tuple) -> dict:
+    return {"id": row[0], "ts": _ts(row[7]), "direction": row[1], "amount": row[2], "currency": row[3],
+            "counterparty": row[4], "due": row[5], "status": row[6], "paid": 0}
+
+
+def _debt_record(row: tuple) -> DebtRecord:
+    return DebtRecord(row[0], int(_ts(row[7]).timestamp()), row[1], row[2], row[3], row[4], row[5], row[6], 0)
+
+
+def _measure(build, rows: list) -> float:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    items = [build(row) for row in rows]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del items
+    return (after - before) / len(rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=100000)
+    args = parser.parse_args()
+
+    # rows are fetched again for every variant so no strings are shared
+    conn = sqlite3.connect(":memory:")
+    tx_rows = _tx_rows(conn, args.records)
+    debt_rows = _debt_rows(conn, args.records)
+    for name, as_dict, as_record, rows_again in (
+        ("transaction", _tx_dict, _tx_record, lambda: conn.execute("SELECT * FROM tx").fetchall()),
+        ("debt", _debt_dict, _debt_record, lambda: conn.execute("SELECT * FROM debts").fetchall()),
+    ):
+        dict_bytes = _measure(as_dict, rows_again())
+        record_bytes = _measure(as_record, rows_again())
+        print(f"{name:>11}: dict {dict_bytes:6.0f} B/record   slotted {record_bytes:6.0f} B/record   "
+              f"-{(1 - record_bytes / dict_bytes) * 100:.0f}%")
+    del tx_rows, debt_rows
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Range lookups on a ledger window: bisect index vs the old full scan.
+
+Builds a window of ``--items`` transactions one minute apart and times a
+one-day range query both ways.  The scan grows with the window; the bisect
+lookup grows only with the number of rows returned.
+
+    python bench/report_range.py [--items 200000] [--repeat 200]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.ledger import _UserWindow  # noqa: E402
+from services.records import TxRecord  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    start = 1_700_000_000
+    window = _UserWindow([], True)
+    for i in range(args.items):
+        window.add(TxRecord(i + 1, start + 60 * i, "expense", 1000, "UZS", "cash", "🍔 Oziq-ovqat", ""), args.items)
+    hi = start + 60 * (args.items - 1)
+    lo = hi - 86400
+
+    began = time.perf_counter()
+    for _ in range(args.repeat):
+        scanned = [it for it in window.items if lo <= it.ts <= hi]
+    scan = (time.perf_counter() - began) / args.repeat
+    began = time.perf_counter()
+    for _ in range(args.repeat):
+        found = window.slice(lo, hi)
+    indexed = (time.perf_counter() - began) / args.repeat
+    assert [it.id for it in found] == [it.id for it in scanned]
+    print(f"{args.items} items, {len(found)} in range: scan {scan * 1e3:.3f} ms, "
+          f"bisect {indexed * 1e3:.3f} ms ({scan / indexed:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
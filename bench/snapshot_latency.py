@@ -0,0 +1,83 @@
+"""Handler-side cost of persisting cards.json: direct write vs snapshotter.
+
+The old ``save_cards_storage`` rewrote the whole file inside the handler, so
+its latency grew with the number of users.  With the snapshotter a handler
+only marks the store dirty; the write happens later off the event loop.
+Prints the per-call latency of both for growing files and checks that the
+file written on shutdown is complete.
+
+    python bench/snapshot_latency.py [--users 1000 10000 50000] [--calls 50]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.snapshots import JsonSnapshotter  # noqa: E402
+
+
+def _cards(users: int) -> dict:
+    return {
+        uid: [{"label": "Humo", "pan": "9860123412341234", "expires": "12/27", "owner": "Ali Valiyev"}]
+        for uid in range(users)
+    }
+
+
+def _direct_save(path: Path, cards: dict) -> None:
+    with path.open("w", encoding="utf-8") as f:
+        json.dump({str(uid): items for uid, items in cards.items()}, f, default=str)
+
+
+async def _measure(users: int, calls: int, tmp: str) -> None:
+    cards = _cards(users)
+    path = Path(tmp) / f"cards-{users}.json"
+
+    direct = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        _direct_save(path, cards)
+        direct.append(time.perf_counter() - started)
+
+    snapshots = JsonSnapshotter(interval=0.05)
+    snapshots.register(
+        "cards", path, lambda: {str(uid): [dict(c) for c in items] for uid, items in cards.items()}
+    )
+    await snapshots.start()
+    marked = []
+    for i in range(calls):
+        cards[users + i] = [{"label": "Uzcard", "pan": "8600", "expires": "", "owner": ""}]
+        started = time.perf_counter()
+        snapshots.mark_dirty("cards")
+        marked.append(time.perf_counter() - started)
+        await asyncio.sleep(0)
+    await snapshots.close()
+
+    with path.open("r", encoding="utf-8") as f:
+        written = len(json.load(f))
+    assert written == len(cards), (written, len(cards))
+    print(
+        f"{users:>7} users   direct p50 {statistics.median(direct) * 1000:8.3f} ms   "
+        f"mark_dirty p50 {statistics.median(marked) * 1000:8.4f} ms   "
+        f"file writes {calls} -> {snapshots.writes}"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--calls", type=int, default=50)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        for users in args.users:
+            await _measure(users, args.calls, tmp)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,107 @@
+"""Time and peak memory of importing a large CSV statement.
+
+Writes a ``--rows`` line bank statement (Uzbek/Russian merchant names,
+signed amounts with decimals, two years of dates), imports it for one user
+through the bot's own classifier and prints wall time, rows/s, how much the
+peak RSS grew and how long the event loop was blocked at most (tracemalloc
+is left off: it slows the parser threads down several times).  Also checks that
+``user_month_stats`` adds up to the imported rows.
+
+    python bench/statement_import.py [--rows 100000] [--chunk 2000]
+"""
+import argparse
+import asyncio
+import csv
+import importlib.util
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+_TMP = tempfile.TemporaryDirectory()
+os.environ["DB_PATH"] = os.path.join(_TMP.name, "import.db")
+os.environ.setdefault("BOT_TOKEN", "123456:bench")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# bot.py is shadowed by the bot/ package, load it by path
+_spec = importlib.util.spec_from_file_location("moliya_bot", os.path.join(ROOT, "bot.py"))
+B = importlib.util.module_from_spec(_spec)
+sys.modules["moliya_bot"] = B
+_spec.loader.exec_module(B)
+os.chdir(_TMP.name)
+
+from services.importer import import_statement  # noqa: E402
+
+MERCHANTS = [
+    "Korzinka supermarket", "Yandex taxi", "Evos fastfood", "Uzbektelecom internet",
+    "Apteka 999", "Oylik maosh", "Makro магазин", "Заправка benzin", "Click perevod",
+]
+
+
+def _write_csv(path: str, rows: int) -> None:
+    rnd = random.Random(7)
+    start = datetime(2023, 1, 1)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(["Дата операции", "Описание", "Сумма", "Валюта"])
+        for i in range(rows):
+            ts = start + timedelta(minutes=7 * i)
+            merchant = rnd.choice(MERCHANTS)
+            amount = rnd.randint(5, 900) * 1000 + rnd.randint(0, 99) / 100
+            sign = "" if merchant.startswith("Oylik") else "-"
+            writer.writerow([ts.strftime("%d.%m.%Y %H:%M"), merchant, f"{sign}{amount:,.2f}".replace(",", " "), "UZS"])
+
+
+async def _loop_lag(stop: asyncio.Event, worst: list) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.005)
+        worst[0] = max(worst[0], time.perf_counter() - started - 0.005)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--chunk", type=int, default=2000)
+    args = parser.parse_args()
+
+    path = os.path.join(_TMP.name, "statement.csv")
+    _write_csv(path, args.rows)
+    print(f"statement: {args.rows} rows, {os.path.getsize(path) / 1024 / 1024:.1f} MB")
+
+    await B.run_migrations()
+    await B.LEDGER.start()
+    stop, worst = asyncio.Event(), [0.0]
+    lag = asyncio.create_task(_loop_lag(stop, worst))
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    result = await import_statement(
+        B.LEDGER, 1, path, "statement.csv", lambda row: B.classify_statement_row(row, "uz"),
+        chunk_size=args.chunk,
+    )
+    elapsed = time.perf_counter() - started
+    rss_growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+    stop.set()
+    await lag
+
+    async with B.POOL.acquire() as db:
+        cur = await db.execute(
+            "SELECT (SELECT COUNT(*) FROM transactions WHERE user_id=1), "
+            "(SELECT COALESCE(SUM(tx_count), 0) FROM user_month_stats WHERE user_id=1)"
+        )
+        count, stats_count = await cur.fetchone()
+    print(f"imported {result['imported']} skipped {result['skipped']} in {elapsed:.2f} s "
+          f"({result['imported'] / elapsed:,.0f} rows/s)")
+    print(f"peak RSS growth {rss_growth / 1024:.1f} MB, worst loop stall {worst[0] * 1000:.1f} ms")
+    assert count == result["imported"], (count, result)
+    assert stats_count == count, (stats_count, count)
+    await B.LEDGER.close()
+    await B.POOL.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
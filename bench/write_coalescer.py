@@ -0,0 +1,92 @@
+"""Commit-per-write vs group commit for small concurrent writes.
+
+Simulates many handlers each logging one payments_logs row (the shape of
+``log_callback``), first with an immediate commit per write and then through
+``db.WriteCoalescer``, and prints throughput plus the coalescer's batch-size
+and commit-latency metrics.  A second pass starts one writer every
+``--spacing-ms`` (handlers arriving a little apart rather than all at once)
+to show the batches the ``--delay-ms`` window still gathers.
+
+    python bench/write_coalescer.py [--writes 5000] [--concurrency 64] [--spacing-ms 1]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import PAYMENTS_LOGS_TABLE, ConnectionPool, WriteCoalescer  # noqa: E402
+
+INSERT = "INSERT INTO payments_logs(event_type, raw_payload, verified) VALUES(?, ?, ?)"
+
+
+async def _run(label: str, write, writes: int, concurrency: int, spacing: float = 0.0) -> None:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i: int) -> None:
+        async with sem:
+            await write((f"bench_{i % 7}", f'{{"n": {i}}}', i % 2))
+
+    started = time.perf_counter()
+    if spacing:
+        tasks = []
+        for i in range(writes):
+            tasks.append(asyncio.create_task(one(i)))
+            await asyncio.sleep(spacing)
+        await asyncio.gather(*tasks)
+    else:
+        await asyncio.gather(*(one(i) for i in range(writes)))
+    elapsed = time.perf_counter() - started
+    print(f"{label:<18} {writes / elapsed:9.0f} writes/s   {elapsed:6.2f} s")
+
+
+def _metrics(writes: WriteCoalescer) -> None:
+    for key, value in writes.metrics().items():
+        print(f"  {key:<14} {value:10.2f}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--writes", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--delay-ms", type=float, default=5)
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--spacing-ms", type=float, default=1)
+    parser.add_argument("--spaced-writes", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pool = ConnectionPool(os.path.join(tmp, "bench.db"), 4)
+        async with pool.acquire() as db:
+            await db.execute(PAYMENTS_LOGS_TABLE)
+            await db.commit()
+
+        async def direct(params) -> None:
+            async with pool.acquire() as db:
+                await db.execute(INSERT, params)
+                await db.commit()
+
+        await _run("commit-per-write", direct, args.writes, args.concurrency)
+
+        writes = WriteCoalescer(pool, max_delay=args.delay_ms / 1000, max_batch=args.batch)
+
+        async def coalesced(params) -> None:
+            await writes.execute(INSERT, params)
+
+        await _run("group-commit", coalesced, args.writes, args.concurrency)
+        _metrics(writes)
+        await writes.close()
+
+        writes = WriteCoalescer(pool, max_delay=args.delay_ms / 1000, max_batch=args.batch)
+        await _run(f"{args.spacing_ms:g} ms apart", coalesced, args.spaced_writes, args.concurrency,
+                   args.spacing_ms / 1000)
+        _metrics(writes)
+        await writes.close()
+        await pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
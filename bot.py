@@ -1,12 +1,11 @@
 # bot.py
-import asyncio, os, re, json, logging, sys, types
-import aiosqlite
+import asyncio, os, re, json, logging, sys, tempfile, types
 from decimal import Decimal
 from pathlib import Path
 from datetime import datetime, timedelta, timezone
 from zoneinfo import ZoneInfo
 from urllib.parse import quote_plus, urlencode, urlparse, urlunparse, parse_qsl
-from typing import Optional, Dict, List, Tuple, Any
+from typing import Optional, Dict, FrozenSet, List, Tuple, Any
 
 import httpx
 
@@ -19,19 +18,45 @@ from aiogram.filters import CommandStart, Command
 from aiogram.types import (
     Message, CallbackQuery,
     ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove,
-    InlineKeyboardMarkup, InlineKeyboardButton, BotCommand, WebAppInfo,
+    InlineKeyboardMarkup, InlineKeyboardButton, BotCommand, WebAppInfo, InputFile,
 )
 from dotenv import load_dotenv
 
-from db import DB_PATH
+from db import POOL, WRITES, run_migrations
+from moliya.parsing import (
+    CATEGORY_LABELS,
+    MEMORY_STOPWORDS,
+    ParsedEntry,
+    attach_debt_due,
+    category_key,
+    category_label,
+    detect_account,
+    detect_currency,
+    guess_kind,
+    parse_amount,
+    parse_due_date,
+    parse_entry as _parse_entry,
+    split_tx_entries,
+)
 from payments import (
     create_invoice as payments_create_invoice,
     detect_plan as payments_detect_plan,
-    ensure_schema as ensure_payment_schema,
     get_latest_payment as payments_get_latest_payment,
     mark_payment_paid as payments_mark_payment_paid,
     users_for_expiry_reminder as payments_users_for_expiry_reminder,
 )
+from services.category_memory import CategoryMemory
+from services.debt_archive import DebtArchive
+from services.debt_reminders import DebtReminderLog
+from services.debts import DebtStore
+from services.export import EXPORT_FORMATS, export_filename, export_ledger
+from services.importer import IMPORT_EXTENSIONS, StatementFormatError, StatementRow, import_statement
+from services.ledger import Ledger
+from services.payment_logs import PaymentLogRetention
+from services.profiles import UserProfiles
+from services.records import DebtRecord
+from services.snapshots import JsonSnapshotter
+from services.user_context import USER_CONTEXT
 from services.payments import create_invoice_id, build_miniapp_url
 
 # ====== ENV ======
@@ -135,6 +160,8 @@ rt = Router()
 reports_range_router = Router()
 cards_entry_router = Router()
 debts_archive_router = Router()
+import_router = Router()
+export_router = Router()
 
 # ====== VAQT/FMT ======
 try:
@@ -200,18 +227,14 @@ SEEN_USERS: set[int] = set()
 USER_ACTIVATED: Dict[int, bool] = {}
 REPORT_RANGE_STATE: Dict[int, Dict[str, str]] = {}
 
-ANALYSIS_COUNTERS: Dict[int, Dict[str, int]] = {}
 LAST_RESET_YYYYMM: Optional[str] = None
 ANALYSIS_STATE_PATH = Path("analysis_state.json")
 
 CARDS_FILE = Path("cards.json")
 USER_CARDS: Dict[int, List[dict]] = {}
 
-DEBTS_ARCHIVE: Dict[int, List[dict]] = {}
-DEBTS_ARCHIVE_FILE = Path("debts_archive.json")
-
-USERS_PROFILE_FILE = Path("users.json")
-USERS_PROFILE_CACHE: Dict[int, Dict[str, Any]] = {}
+USER_PROFILES = UserProfiles()
+SNAPSHOTS = JsonSnapshotter()
 BOT_DESCRIPTION_APPLIED = False
 
 
@@ -230,7 +253,7 @@ def _profile_is_activated(profile: Optional[Dict[str, Any]]) -> bool:
 def ensure_user_activation(uid: int, profile: Optional[Dict[str, Any]] = None) -> bool:
     if USER_ACTIVATED.get(uid):
         return True
-    profile_data = profile if isinstance(profile, dict) else USERS_PROFILE_CACHE.get(uid)
+    profile_data = profile if isinstance(profile, dict) else USER_PROFILES.get(uid)
     if _profile_is_activated(profile_data):
         USER_ACTIVATED[uid] = True
         return True
@@ -254,14 +277,6 @@ def _load_json(path: Path) -> dict:
     except Exception:
         return {}
 
-
-def _save_json(path: Path, payload: dict) -> None:
-    try:
-        with path.open("w", encoding="utf-8") as f:
-            json.dump(payload, f, default=str)
-    except Exception:
-        pass
-
 def load_cards_storage() -> None:
     USER_CARDS.clear()
     data = _load_json(CARDS_FILE)
@@ -294,9 +309,12 @@ def load_cards_storage() -> None:
             USER_CARDS[uid] = clean
 
 
+def _cards_snapshot() -> dict:
+    return {str(uid): [dict(card) for card in cards] for uid, cards in USER_CARDS.items()}
+
+
 def save_cards_storage() -> None:
-    payload = {str(uid): cards for uid, cards in USER_CARDS.items()}
-    _save_json(CARDS_FILE, payload)
+    SNAPSHOTS.mark_dirty("cards")
 
 
 def get_cards(uid: int) -> List[dict]:
@@ -315,118 +333,13 @@ def save_card(uid: int, label: str, pan: str, expires: str, owner: str) -> None:
     save_cards_storage()
 
 
-def load_users_storage() -> None:
-    global USERS_PROFILE_CACHE
-    if not USERS_PROFILE_FILE.exists():
-        USERS_PROFILE_CACHE = {}
-        return
-    try:
-        raw = USERS_PROFILE_FILE.read_text(encoding="utf-8")
-        data = json.loads(raw)
-    except Exception:
-        USERS_PROFILE_CACHE = {}
-        return
-    if not isinstance(data, dict):
-        USERS_PROFILE_CACHE = {}
-        return
-    cache: Dict[int, Dict[str, Any]] = {}
-    for key, value in data.items():
-        if not isinstance(value, dict):
-            continue
-        try:
-            uid = int(key)
-        except Exception:
-            continue
-        cache[uid] = value
-    USERS_PROFILE_CACHE = cache
-    for uid, profile in cache.items():
-        if _profile_is_activated(profile):
-            USER_ACTIVATED[uid] = True
-        else:
-            USER_ACTIVATED.setdefault(uid, False)
-        lang_val = profile.get("lang") if isinstance(profile, dict) else None
-        if isinstance(lang_val, str) and lang_val:
-            USER_LANG[uid] = lang_val
-        SEEN_USERS.add(uid)
-
-
-def save_users_storage() -> None:
-    try:
-        USERS_PROFILE_FILE.parent.mkdir(parents=True, exist_ok=True)
-        dump = {str(uid): data for uid, data in USERS_PROFILE_CACHE.items()}
-        USERS_PROFILE_FILE.write_text(
-            json.dumps(dump, ensure_ascii=False, indent=2),
-            encoding="utf-8",
-        )
-    except Exception:
-        pass
-
-
-def update_user_profile(user_id: int, **fields: Any) -> None:
+async def update_user_profile(user_id: int, **fields: Any) -> None:
     if not fields:
         return
-    profile = USERS_PROFILE_CACHE.setdefault(user_id, {})
-    changed = False
-    now_iso = datetime.now(timezone.utc).isoformat()
-    if "created_at" not in profile:
-        profile["created_at"] = now_iso
-        changed = True
-    for key, value in fields.items():
-        if value is None:
-            continue
-        if profile.get(key) != value:
-            profile[key] = value
-            changed = True
-    if changed:
-        profile["updated_at"] = now_iso
-        save_users_storage()
-
-
-def load_debts_archive() -> None:
-    data = _load_json(DEBTS_ARCHIVE_FILE)
-    items = data.get("items", {}) if isinstance(data, dict) else {}
-    if not isinstance(items, dict):
-        return
-    for k, v in items.items():
-        try:
-            uid = int(k)
-        except Exception:
-            continue
-        if not isinstance(v, list):
-            continue
-        clean: List[dict] = []
-        for it in v:
-            if not isinstance(it, dict):
-                continue
-            copy = dict(it)
-            ts_val = copy.get("ts")
-            if isinstance(ts_val, str):
-                try:
-                    copy["ts"] = datetime.fromisoformat(ts_val)
-                except Exception:
-                    copy["ts"] = now_tk()
-            archived_val = copy.get("archived_at")
-            if isinstance(archived_val, str):
-                try:
-                    copy["archived_at"] = datetime.fromisoformat(archived_val)
-                except Exception:
-                    copy["archived_at"] = now_tk()
-            clean.append(copy)
-        if clean:
-            DEBTS_ARCHIVE[uid] = clean
-
-
-def save_debts_archive() -> None:
-    payload = {"items": {str(uid): items for uid, items in DEBTS_ARCHIVE.items()}}
-    _save_json(DEBTS_ARCHIVE_FILE, payload)
-
-
-def archive_debt_record(uid:int, debt:dict) -> None:
-    items = DEBTS_ARCHIVE.setdefault(uid, [])
-    payload = dict(debt)
-    payload["archived_at"] = now_tk()
-    items.append(payload)
-    save_debts_archive()
+    try:
+        await USER_PROFILES.update(user_id, **fields)
+    except Exception as exc:
+        logger.warning("user-profile-update-failed", extra={"uid": user_id, "error": str(exc)})
 
 
 def load_analysis_state() -> None:
@@ -437,57 +350,16 @@ def load_analysis_state() -> None:
         LAST_RESET_YYYYMM = value
 
 
-def save_analysis_state() -> None:
-    if LAST_RESET_YYYYMM:
-        _save_json(ANALYSIS_STATE_PATH, {"last_reset": LAST_RESET_YYYYMM})
-
-
-def reset_analysis_counters() -> None:
-    for counters in ANALYSIS_COUNTERS.values():
-        counters["income"] = 0
-        counters["expense"] = 0
-        counters["tx_count"] = 0
+def _analysis_state_snapshot() -> Optional[dict]:
+    return {"last_reset": LAST_RESET_YYYYMM} if LAST_RESET_YYYYMM else None
 
 
-def update_analysis_counters(uid: int, kind: str, amount: int, currency: str) -> None:
-    counters = ANALYSIS_COUNTERS.setdefault(uid, {"income": 0, "expense": 0, "tx_count": 0})
-    amt_uzs = to_uzs(amount, currency)
-    if kind == "income":
-        counters["income"] += amt_uzs
-    else:
-        counters["expense"] += amt_uzs
-    counters["tx_count"] += 1
+def save_analysis_state() -> None:
+    SNAPSHOTS.mark_dirty("analysis_state")
 
 
-def revert_analysis_counters(uid: int, kind: str, amount: int, currency: str) -> None:
-    counters = ANALYSIS_COUNTERS.get(uid)
-    if not counters:
-        return
-    amt_uzs = to_uzs(amount, currency)
-    if kind == "income":
-        counters["income"] = max(0, counters["income"] - amt_uzs)
-    else:
-        counters["expense"] = max(0, counters["expense"] - amt_uzs)
-    counters["tx_count"] = max(0, counters["tx_count"] - 1)
-
-
-async def _ensure_subscription_columns(db: aiosqlite.Connection) -> None:
-    cur = await db.execute("PRAGMA table_info(users)")
-    cols = {row[1] for row in await cur.fetchall()}
-    statements = []
-    if "sub_started_at" not in cols:
-        statements.append("ALTER TABLE users ADD COLUMN sub_started_at TIMESTAMP")
-    if "sub_until" not in cols:
-        statements.append("ALTER TABLE users ADD COLUMN sub_until TIMESTAMP")
-    if "sub_reminder_sent" not in cols:
-        statements.append("ALTER TABLE users ADD COLUMN sub_reminder_sent INTEGER DEFAULT 0")
-    for stmt in statements:
-        try:
-            await db.execute(stmt)
-        except Exception:
-            pass
-    if statements:
-        await db.commit()
+SNAPSHOTS.register("cards", CARDS_FILE, _cards_snapshot)
+SNAPSHOTS.register("analysis_state", ANALYSIS_STATE_PATH, _analysis_state_snapshot)
 
 
 async def ensure_month_rollover() -> None:
@@ -497,7 +369,6 @@ async def ensure_month_rollover() -> None:
     current = now_tk().strftime("%Y%m")
     if LAST_RESET_YYYYMM == current:
         return
-    reset_analysis_counters()
     LAST_RESET_YYYYMM = current
     save_analysis_state()
 
@@ -610,21 +481,22 @@ SUB_STARTED: Dict[int,datetime] = {}
 SUB_REMINDER_DONE: Dict[int,bool] = {}
 SUB_EXPIRED_NOTICE: set[int] = set()
 
-# tranzaksiya: {id, ts, kind(income|expense), amount, currency(UZS|USD|EUR), account(cash|card), category, desc}
-MEM_TX: Dict[int, List[dict]] = {}
-MEM_TX_SEQ: Dict[int, int] = {}
-# qarz: {id, ts, direction(mine|given), amount, currency, counterparty, due, status(wait|paid|received)}
-MEM_DEBTS: Dict[int, List[dict]] = {}
-MEM_DEBTS_SEQ: Dict[int,int] = {}
+# tranzaksiya: TxRecord(id, ts, kind(income|expense), amount, currency(UZS|USD|EUR), account(cash|card), category, desc)
+LEDGER = Ledger(tz=TASHKENT)
+DEBT_ARCHIVE = DebtArchive(tz=TASHKENT)
+DEBT_ARCHIVE_PAGE = 10
+PAYMENT_LOGS = PaymentLogRetention()
+PAYMENTS_LOG_MAINTENANCE_HOUR = int(os.getenv("PAYMENTS_LOG_MAINTENANCE_HOUR", "4"))
+# qarz: DebtRecord(id, ts, direction(mine|given), amount, currency, counterparty, due, status(wait|paid|received), paid)
+DEBTS = DebtStore(tz=TASHKENT)
 PENDING_DEBT: Dict[int,dict] = {}
 DEBT_EDIT_STATE: Dict[int, dict] = {}
+DEBT_REMINDERS = DebtReminderLog()
 
 # payment pending
 # pid -> {"uid","plan","period_days","amount","currency","status","created"}
 PENDING_PAYMENTS: Dict[str,dict] = {}
 
-DEBT_REMIND_SENT: set[Tuple[int,int,str,str]] = set()
-
 NAV_STACK: Dict[int, List[str]] = {}
 
 
@@ -692,16 +564,8 @@ def _parse_dt(val: Any) -> Optional[datetime]:
 
 
 async def ensure_subscription_state(uid: int) -> None:
-    row = None
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
-            await _ensure_subscription_columns(db)
-            db.row_factory = aiosqlite.Row
-            cur = await db.execute(
-                "SELECT sub_started_at, sub_until, sub_reminder_sent FROM users WHERE user_id=?",
-                (uid,),
-            )
-            row = await cur.fetchone()
+        row = await USER_CONTEXT.get(uid)
     except Exception as exc:
         logger.warning("subscription-state-refresh-failed", extra={"uid": uid, "error": str(exc)})
         return
@@ -710,9 +574,9 @@ async def ensure_subscription_state(uid: int) -> None:
         SUB_EXPIRES.pop(uid, None)
         SUB_REMINDER_DONE.pop(uid, None)
         return
-    start = _parse_dt(row.get("sub_started_at")) if isinstance(row, dict) else _parse_dt(row["sub_started_at"])
-    until = _parse_dt(row.get("sub_until")) if isinstance(row, dict) else _parse_dt(row["sub_until"])
-    reminder_sent_raw = row.get("sub_reminder_sent") if isinstance(row, dict) else row["sub_reminder_sent"]
+    start = _parse_dt(row["sub_started_at"])
+    until = _parse_dt(row["sub_until"])
+    reminder_sent_raw = row["sub_reminder_sent"]
     SUB_STARTED[uid] = start or SUB_STARTED.get(uid)
     if until:
         SUB_EXPIRES[uid] = until
@@ -724,21 +588,15 @@ async def ensure_subscription_state(uid: int) -> None:
 async def set_user_subscription(uid: int, start_dt: datetime, end_dt: datetime) -> None:
     start_local = _parse_dt(start_dt) or start_dt.astimezone(TASHKENT)
     end_local = _parse_dt(end_dt) or end_dt.astimezone(TASHKENT)
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with POOL.acquire() as db:
         await db.execute("INSERT INTO users(user_id) VALUES(?) ON CONFLICT(user_id) DO NOTHING", (uid,))
-        await _ensure_subscription_columns(db)
-        cur = await db.execute("PRAGMA table_info(users)")
-        cols = {row[1] for row in await cur.fetchall()}
-        set_parts = ["sub_started_at=?", "sub_until=?", "sub_reminder_sent=0"]
-        params = [start_local.isoformat(), end_local.isoformat()]
-        if "activated" in cols:
-            set_parts.append("activated=1")
-        if "trial_used" in cols:
-            set_parts.append("trial_used=1")
-        sql = f"UPDATE users SET {', '.join(set_parts)} WHERE user_id=?"
-        params.append(uid)
-        await db.execute(sql, params)
+        await db.execute(
+            "UPDATE users SET sub_started_at=?, sub_until=?, sub_reminder_sent=0, activated=1, trial_used=1 "
+            "WHERE user_id=?",
+            (start_local.isoformat(), end_local.isoformat(), uid),
+        )
         await db.commit()
+    USER_CONTEXT.invalidate(uid)
     SUB_STARTED[uid] = start_local
     SUB_EXPIRES[uid] = end_local
     SUB_REMINDER_DONE[uid] = False
@@ -746,12 +604,12 @@ async def set_user_subscription(uid: int, start_dt: datetime, end_dt: datetime)
 
 
 async def mark_reminder_sent(uid: int) -> None:
-    async with aiosqlite.connect(DB_PATH) as db:
-        await _ensure_subscription_columns(db)
+    async with POOL.acquire() as db:
         await db.execute(
             "UPDATE users SET sub_reminder_sent=1 WHERE user_id=?", (uid,)
         )
         await db.commit()
+    USER_CONTEXT.invalidate(uid)
     SUB_REMINDER_DONE[uid] = True
 
 
@@ -816,6 +674,14 @@ def t_uz(k,**kw):
         "rep_range_invalid":"Sana formati noto‘g‘ri. Masalan: 2024-05-01",
         "rep_line":"{date} — {kind} — {cat} — {amount} {cur}",
         "rep_empty":"Bu bo‘lim uchun yozuv yo‘q.",
+        "rep_export":"📤 Eksport (CSV/XLSX)",
+        "export_choose":"Qaysi davr va formatda yuklab olasiz?\nBoshqa davr: <code>/export xlsx 2024-01-01 2024-03-31</code>",
+        "export_period_month":"Bu oy","export_period_year":"Bu yil","export_period_all":"Hammasi",
+        "export_started":"⏳ Fayl tayyorlanmoqda…",
+        "export_caption":"📤 {count} ta yozuv.",
+        "export_busy":"Oldingi eksport hali tayyorlanmoqda, biroz kuting.",
+        "export_failed":"Faylni tayyorlab bo‘lmadi. Keyinroq urinib ko‘ring.",
+        "export_headers":"Sana|Turi|Kategoriya|Summa|Valyuta|Hisob|Izoh",
         "btn_limit":"💡 Limit belgilash",
         "btn_reset_totals":"♻️ Hisobni 0 qilish",
         "limit_prompt":"Yangi harajat limitini so‘mda yuboring. 0 kiritsangiz, limit o‘chiriladi.",
@@ -824,6 +690,16 @@ def t_uz(k,**kw):
         "limit_invalid":"Iltimos, son kiriting. Masalan: 150000",
         "limit_reached":"⚠️ Harajat limiti ({limit}) bajarildi. Jami xarajat: {spent}.",
         "reset_done":"✅ Hisob va analiz nolga tushirildi.",
+        "import_help":("Bank ko‘chirmasi yoki jadvalni <b>CSV</b> yoki <b>XLSX</b> fayl qilib yuboring.\n"
+                       "Ustunlar: <i>sana</i>, <i>summa</i> (yoki <i>kirim</i>/<i>chiqim</i>), <i>izoh</i>, ixtiyoriy <i>valyuta</i>."),
+        "import_started":"⏳ Import boshlandi…",
+        "import_progress":"⏳ Import: {imported} ta yozuv qo‘shildi, {skipped} ta qator o‘tkazib yuborildi…",
+        "import_done":"✅ Import tugadi: {imported} ta yozuv qo‘shildi, {skipped} ta qator o‘tkazib yuborildi.",
+        "import_bad_file":"Faqat CSV yoki XLSX fayllarni import qilish mumkin.",
+        "import_too_big":"Fayl juda katta (20 MB dan oshmasin).",
+        "import_busy":"Oldingi import hali tugamadi, biroz kuting.",
+        "import_no_header":"Jadval sarlavhasi topilmadi. Kamida <i>sana</i> va <i>summa</i> ustunlari kerak.",
+        "import_failed":"Importda xatolik yuz berdi. Faylni tekshirib, qayta yuboring.",
 
         "btn_cards":"💳 Kartalarim",
         "cards_header":"Kartalar ro‘yxati:",
@@ -875,6 +751,7 @@ def t_uz(k,**kw):
         "debt_archive_btn":"🗂 Arxiv",
         "debt_archive_header":"🗂 Arxivdagi qarzlar:",
         "debt_archive_empty":"Arxiv bo‘sh.",
+        "debt_archive_more":"⬇️ Yana ko‘rsatish",
         "debt_archive_note":"📦 Arxivga o‘tgan sana: {date}",
 
         "start_gate_msg":"Iltimos, /start bosing",
@@ -1016,6 +893,14 @@ def t_ru(k, **kw):
         "rep_range_invalid": "Неверный формат даты. Например: 2024-05-01",
         "rep_line": "{date} — {kind} — {cat} — {amount} {cur}",
         "rep_empty": "Пока нет записей для этого раздела.",
+        "rep_export": "📤 Экспорт (CSV/XLSX)",
+        "export_choose": "За какой период и в каком формате выгрузить?\nДругой период: <code>/export xlsx 2024-01-01 2024-03-31</code>",
+        "export_period_month": "Этот месяц", "export_period_year": "Этот год", "export_period_all": "Всё время",
+        "export_started": "⏳ Готовлю файл…",
+        "export_caption": "📤 Записей: {count}.",
+        "export_busy": "Предыдущая выгрузка ещё готовится, подождите немного.",
+        "export_failed": "Не удалось подготовить файл. Попробуйте позже.",
+        "export_headers": "Дата|Тип|Категория|Сумма|Валюта|Счёт|Комментарий",
         "btn_limit": "💡 Установить лимит",
         "btn_reset_totals": "♻️ Обнулить учет",
         "limit_prompt": "Отправьте новый лимит расходов (в суммах). Укажите 0, чтобы отключить.",
@@ -1024,6 +909,18 @@ def t_ru(k, **kw):
         "limit_invalid": "Пожалуйста, отправьте число. Например: 150000",
         "limit_reached": "⚠️ Лимит расходов ({limit}) достигнут. Всего расходов: {spent}.",
         "reset_done": "✅ Учёт и анализ обнулены.",
+        "import_help": (
+            "Отправьте выписку из банка или таблицу файлом <b>CSV</b> или <b>XLSX</b>.\n"
+            "Колонки: <i>дата</i>, <i>сумма</i> (или <i>приход</i>/<i>расход</i>), <i>описание</i>, по желанию <i>валюта</i>."
+        ),
+        "import_started": "⏳ Импорт начался…",
+        "import_progress": "⏳ Импорт: добавлено {imported} записей, пропущено строк: {skipped}…",
+        "import_done": "✅ Импорт завершён: добавлено {imported} записей, пропущено строк: {skipped}.",
+        "import_bad_file": "Импортировать можно только файлы CSV или XLSX.",
+        "import_too_big": "Файл слишком большой (не более 20 МБ).",
+        "import_busy": "Предыдущий импорт ещё идёт, подождите немного.",
+        "import_no_header": "Не нашёл заголовок таблицы. Нужны хотя бы колонки <i>дата</i> и <i>сумма</i>.",
+        "import_failed": "Не удалось импортировать файл. Проверьте его и отправьте ещё раз.",
 
         "btn_cards": "💳 Мои карты",
         "cards_header": "Список карт:",
@@ -1075,6 +972,7 @@ def t_ru(k, **kw):
         "debt_archive_btn": "🗂 Архив",
         "debt_archive_header": "🗂 Архив долгов:",
         "debt_archive_empty": "Архив пуст.",
+        "debt_archive_more": "⬇️ Показать ещё",
         "debt_archive_note": "📦 Дата архивирования: {date}",
 
         "start_gate_msg": "Пожалуйста, нажмите /start",
@@ -1167,7 +1065,7 @@ def get_lang(uid: int) -> str:
     lang = USER_LANG.get(uid)
     if lang:
         return lang
-    profile = USERS_PROFILE_CACHE.get(uid)
+    profile = USER_PROFILES.get(uid)
     if isinstance(profile, dict):
         lang_val = profile.get("lang")
         if lang_val:
@@ -1357,6 +1255,7 @@ def kb_rep_main(lang: str = "uz") -> ReplyKeyboardMarkup:
         keyboard=[
             [KeyboardButton(text=T("rep_tx"))],
             [KeyboardButton(text=T("rep_debts"))],
+            [KeyboardButton(text=T("rep_export"))],
             [KeyboardButton(text=T("btn_back"))],
         ],
         resize_keyboard=True,
@@ -1427,13 +1326,21 @@ def kb_payment_with_miniapp(pid: str, pay_url: str, lang: str, mini_url: str) ->
     ])
 
 
-def kb_tx_cancel(tx_id: int, lang: str) -> InlineKeyboardMarkup:
+def kb_tx_cancel(tx_id: int, lang: str, recategorize: bool = False) -> InlineKeyboardMarkup:
     text = "❌ Bekor qilish" if lang == "uz" else "❌ Отменить"
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [InlineKeyboardButton(text=text, callback_data=f"txcancel:{tx_id}")]
-        ]
-    )
+    rows = [[InlineKeyboardButton(text=text, callback_data=f"txcancel:{tx_id}")]]
+    if recategorize:
+        cat_text = "🏷 Kategoriya" if lang == "uz" else "🏷 Категория"
+        rows[0].append(InlineKeyboardButton(text=cat_text, callback_data=f"txcat:{tx_id}"))
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+def kb_tx_categories(tx_id: int, lang: str) -> InlineKeyboardMarkup:
+    buttons = [
+        InlineKeyboardButton(text=labels.get(lang, labels["uz"]), callback_data=f"txcatset:{tx_id}:{key}")
+        for key, labels in CATEGORY_LABELS.items()
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=[buttons[i:i + 2] for i in range(0, len(buttons), 2)])
 
 
 async def show_navigation_state(uid: int, lang: str, state: str, message: Message) -> None:
@@ -1482,217 +1389,46 @@ async def handle_back_button(m: Message, uid: int, lang: str) -> None:
     await show_navigation_state(uid, lang, state, m)
 
 # ====== PARSERLAR ======
-MULTI_AMOUNT_TOKEN_RE = re.compile(
-    r"(?:(?:\d+[.,]?\d*)\s*(?:mln|million|млн|ming|min|тыс|k)\b|\b\d+\b)",
-    re.IGNORECASE,
-)
-MULTI_LETTER_RE = re.compile(r"[A-Za-z\u0400-\u04FF]")
-DUE_WORD_PREFIX_RE = re.compile(
-    r"^(?P<due>(?:bugunlik|bugun|ertalikka|ertaga|indin|today|tomorrow|сегодня|завтра|послезавтра))\b[\s,.:;-]*",
-    re.IGNORECASE,
-)
-DUE_DATE_PREFIX_RE = re.compile(
-    r"^(?P<due>(?:\d{1,2}[./-]\d{1,2}(?:[./-]\d{2,4})?|\d{4}-\d{2}-\d{2}))\b[\s,.:;-]*",
-)
-
-
-def split_tx_entries(text: str) -> list[str]:
-    """Split text into transaction-sized chunks using detected amount tokens."""
-    raw = (text or "").strip()
-    if not raw:
-        return [raw]
-
-    matches = list(MULTI_AMOUNT_TOKEN_RE.finditer(raw))
-    if len(matches) <= 1:
-        return [raw]
-
-    segments: list[str] = []
-    segment_start = 0
-    prev_end = matches[0].end()
-    for match in matches[1:]:
-        between = raw[prev_end:match.start()]
-        has_words = bool(MULTI_LETTER_RE.search(between))
-        has_split_char = any(ch in between for ch in ("\n", ",", ";", "/", "|"))
-        if has_words or has_split_char:
-            segment = raw[segment_start:prev_end].strip()
-            if segment:
-                segments.append(segment)
-            segment_start = prev_end
-        prev_end = match.end()
-
-    last_segment = raw[segment_start:prev_end].strip()
-    if last_segment:
-        segments.append(last_segment)
-
-    tail = raw[prev_end:].strip()
-    if tail:
-        if segments:
-            segments[-1] = f"{segments[-1]} {tail}".strip()
-        else:
-            segments.append(tail)
-
-    return segments or [raw]
-
-
-def parse_amount(text:str)->Optional[int]:
-    t=(text or "").lower().replace("’","'").strip()
-    m=re.search(r"\b(\d+[.,]?\d*)\s*(mln|million|млн)\b",t)
-    if m: return int(float(m.group(1).replace(",", "."))*1_000_000)
-    m=re.search(r"\b(\d+[.,]?\d*)\s*(ming|min|тыс|k)\b",t)
-    if m: return int(float(m.group(1).replace(",", "."))*1_000)
-    m=re.search(r"\b(\d+)\s*k\b",t)
-    if m: return int(m.group(1))*1000
-    m=re.search(r"\b(\d[\d\s,\.]{0,15})\b",t)
-    if m:
-        raw=m.group(1).replace(" ","")
-        raw=raw.replace(",", "") if raw.count(",")<=1 and raw.count(".")<=1 else raw.replace(",","").replace(".","")
-        try: return int(float(raw))
-        except: return None
-    return None
-
-def detect_currency(text:str)->str:
-    t=(text or "").lower()
-    if "$" in t or "usd" in t or "dollar" in t or "доллар" in t: return "USD"
-    if "eur" in t or "€" in t: return "EUR"
-    if any(w in t for w in ["uzs","so'm","so‘m","som","сум","soum"]): return "UZS"
-    return "UZS"
-
-def detect_account(text:str)->str:
-    t=(text or "").lower()
-    if any(w in t for w in ["karta","plastik","card","visa","master","uzcard","humo","bank","карта","карты","с карты","банковская"]):
-        return "card"
-    if any(w in t for w in ["naqd","cash","qo'lda","qolda","qo‘l","qol","налич","налом","наличные"]):
-        return "cash"
-    return "cash"
-
-def guess_kind(text:str)->str:
-    t=(text or "").lower()
-    if "qarz berdim" in t or "qarzga berdim" in t or "qarz ber" in t: return "debt_given"
-    if "qarz oldim" in t or "qarzga oldim" in t or "qarz ol" in t: return "debt_mine"
-    if "avans" in t:
-        if any(w in t for w in ["oldim","olindi","keldi","tushdi","berishdi","berildi"]):
-            return "income"
-        if any(w in t for w in ["to'ladim","tuladim","toladim","berdim","qaytardim","qaytardik"]):
-            return "expense"
-    if "sotib oldim" in t or "сотиб олдим" in t or "kiyim oldim" in t: return "expense"
-    expense_hints = [
-        "chiqim","xarajat","rashod","расход","расходы","трата","траты","potrat","потратил","потратила","потратим",
-        "oplati","оплатил","оплатила","оплата","оплатить","zaplat","заплатил","заплатила","заплатить",
-        "kup","купил","купила","покупк","купить","приобрёл","приобрела","списан","списали","снял","сняла",
-        "taksi","taxi","uber","bolt","yandex taxi","yandextaxi","cab","benzin","ovqat","продукт","еда","пища","корм",
-        "kafe","restoran","ресторан","фастфуд","кафе","кофе","coffee","market","supermarket","магазин","маркет","супермаркет",
-        "kommunal","komunal","коммунал","svet","электр","газ","свет","вода","internet","интернет","wifi",
-        "telefon","телефон","связь","ijara","аренда","arenda","ipoteka","ипотека",
-        "kiyim","одежда","dress","oyoq kiyim","обувь","botinka","sumka","сумка","shop","magazin","bozor","магаз",
-        "dorixona","apteka","lek","лекар","dori","medicine","аптека","врач","больница"
-    ]
-    if any(w in t for w in expense_hints):
-        return "expense"
-    income_hints = [
-        "kirim","кирим","oylik","maosh","маош","maosh","keldi","tushdi","келди","тушди","stipendiya","premiya","bonus","dividend",
-        "dohod","доход","доходы","дохода","дoход","daxod","pribil","pribyl","прибыль","zarplata","зарплата","зарплату","зарплаты",
-        "zarabotok","заработок","заработал","заработала","получил","получила","получили","пришло","пришла","пришли",
-        "зачислили","выдали","поступил","поступило","поступили","возврат","вернули","продал","продали","продажа"
-    ]
-    if any(w in t for w in income_hints):
-        return "income"
-    if "oldim" in t and any(w in t for w in ["pul","oylik","maosh","bonus","premiya"]):
-        return "income"
-    if "oldim" in t:
-        return "expense"
-    if t.strip().startswith("+"): return "income"
-    if t.strip().startswith("-"): return "expense"
-    return "expense"
-
-MONTHS_UZ={"yanvar":1,"fevral":2,"mart":3,"aprel":4,"may":5,"iyun":6,"iyul":7,"avgust":8,"sentabr":9,"sentyabr":9,"oktabr":10,"noyabr":11,"dekabr":12}
-def parse_due_date(text:str)->Optional[str]:
-    t=(text or "").lower().replace("–","-")
-    if "ertaga" in t or "завтра" in t: return (now_tk().date()+timedelta(days=1)).strftime("%d.%m.%Y")
-    if "bugun" in t or "сегодня" in t: return (now_tk().date()).strftime("%d.%m.%Y")
-    m=re.search(r"\b(\d{1,2})[.\-/](\d{1,2})(?:[.\-/](\d{2,4}))?\b",t)
-    if m:
-        dd,mm,yy=int(m.group(1)),int(m.group(2)),m.group(3)
-        year=(int(yy)+2000 if yy and int(yy)<100 else int(yy)) if yy else now_tk().year
-        try: return datetime(year,mm,dd,tzinfo=TASHKENT).strftime("%d.%m.%Y")
-        except: return None
-    for name,num in MONTHS_UZ.items():
-        m2=re.search(rf"\b(\d{{1,2}})\s*[- ]\s*{name}\b",t)
-        if m2:
-            dd=int(m2.group(1))
-            try: return datetime(now_tk().year,num,dd,tzinfo=TASHKENT).strftime("%d.%m.%Y")
-            except: return None
-    return None
-
-def parse_counterparty(text:str)->str:
-    t=(text or "").lower()
-    m=re.search(r"\b([a-zA-Z\u0400-\u04FF‘'ʼ`-]+)dan\b",t)
-    if m: return m.group(1).replace("‘","'").replace("ʼ","'").capitalize()
-    m=re.search(r"\b([a-zA-Z\u0400-\u04FF‘'ʼ`-]+)(?:\s+(akaga|opaga|ukaga|singlimga|брате|сестре))?\s*(ga|qa|га|ке)\b",t)
-    if m:
-        base=m.group(1).replace("‘","'").replace("ʼ","'").capitalize()
-        suf=(" "+m.group(2)) if m.group(2) else ""
-        return (base+suf).strip().capitalize()
-    return "—"
+def parse_entry(text:str)->ParsedEntry:
+    """``moliya.parsing.parse_entry`` against the bot's clock."""
+    return _parse_entry(text, now_tk().date())
 
 # ====== SAVE ======
-def next_debt_id(uid:int)->int:
-    MEM_DEBTS_SEQ[uid]=MEM_DEBTS_SEQ.get(uid,0)+1
-    return MEM_DEBTS_SEQ[uid]
-
 async def save_tx(uid:int, kind:str, amount:int, currency:str, account:str, category:str, desc:str):
     await ensure_month_rollover()
-    tx_list = MEM_TX.setdefault(uid, [])
-    tx_id = MEM_TX_SEQ.get(uid, 0) + 1
-    MEM_TX_SEQ[uid] = tx_id
-    tx = {
-        "id": tx_id,
-        "ts": now_tk(),
-        "kind": kind,
-        "amount": amount,
-        "currency": currency,
-        "account": account,
-        "category": category,
-        "desc": desc,
-    }
-    tx_list.append(tx)
-    update_analysis_counters(uid, kind, amount, currency)
-    return tx
+    return await LEDGER.add(uid, kind, amount, currency, account, category, desc)
 
-async def save_debt(uid:int, direction:str, amount:int, currency:str, counterparty:str, due:str)->dict:
+async def save_debt(uid:int, direction:str, amount:int, currency:str, counterparty:str, due:str)->DebtRecord:
     await ensure_month_rollover()
-    did=next_debt_id(uid)
-    debt = {
-        "id":did,
-        "ts":now_tk(),
-        "direction":direction,
-        "amount":amount,
-        "currency":currency,
-        "counterparty":counterparty,
-        "due":due,
-        "status":"wait",
-        "paid":0,
-    }
-    MEM_DEBTS.setdefault(uid,[]).append(debt)
+    debt = await DEBTS.add(uid, direction, amount, currency, counterparty, due)
+    adjust_debt_balance(uid, debt, amount)
     return debt
 
-def debt_card(it:dict, lang="uz")->str:
+def adjust_debt_balance(uid:int, debt:DebtRecord, amount:int) -> None:
+    # balans ekranidagi ochiq qarz qoldig'i (yo'nalish x valyuta)
+    LEDGER.adjust_balance(uid, "debt", debt.direction, debt.currency, amount)
+
+async def archive_debt_record(uid:int, debt:DebtRecord) -> datetime:
+    # holat va arxiv nusxasi bitta tranzaksiyada
+    archived_at = await DEBT_ARCHIVE.add(uid, debt, with_statements=[DEBTS.save_statement(debt)])
+    await DEBT_REMINDERS.forget(uid, debt.id)
+    return archived_at
+
+
+def debt_card(it:DebtRecord, lang="uz")->str:
     T=L(lang)
-    s={"wait":T("st_wait"),"paid":T("st_paid"),"received":T("st_rcv")}[it.get("status","wait")]
-    direction_key = "debt_dir_given" if it.get("direction") == "given" else "debt_dir_mine"
+    s={"wait":T("st_wait"),"paid":T("st_paid"),"received":T("st_rcv")}[it.status]
+    direction_key = "debt_dir_given" if it.direction == "given" else "debt_dir_mine"
     dir_label = T(direction_key)
-    paid_amt = it.get("paid", 0) or 0
-    amount_total = it.get("amount", 0) or 0
-    remain = max(amount_total - paid_amt, 0)
-    currency = it.get("currency","UZS")
     return T(
         "card_debt",
-        created=fmt_date(it["ts"]),
-        who=it.get("counterparty") or "—",
-        cur=currency,
-        amount=fmt_amount(amount_total),
-        paid=fmt_amount(paid_amt),
-        remain=fmt_amount(remain),
-        due=it.get("due") or "—",
+        created=fmt_date(it.when(TASHKENT)),
+        who=it.counterparty or "—",
+        cur=it.currency,
+        amount=fmt_amount(it.amount),
+        paid=fmt_amount(it.paid),
+        remain=fmt_amount(it.remaining),
+        due=it.due or "—",
         status=s,
         direction=dir_label,
     )
@@ -1719,6 +1455,12 @@ def parse_report_range_date(text:str)->Optional[datetime]:
 class StartGateMiddleware(BaseMiddleware):
     async def __call__(self, handler, event, data):
         await ensure_month_rollover()
+        from_user = data.get("event_from_user")
+        if from_user:
+            try:
+                await USER_PROFILES.load(from_user.id)
+            except Exception as exc:
+                logger.warning("user-profile-load-failed", extra={"uid": from_user.id, "error": str(exc)})
         user_id=None
         if isinstance(event, Message):
             if not event.from_user:
@@ -1763,7 +1505,7 @@ def to_uzs(amount:int, currency:str)->int:
 
 
 def _get_limit_profile(uid: int) -> tuple[int, Optional[datetime], bool]:
-    profile = USERS_PROFILE_CACHE.get(uid)
+    profile = USER_PROFILES.get(uid)
     limit_raw = 0
     start_raw = None
     notified = False
@@ -1790,8 +1532,8 @@ def _get_limit_profile(uid: int) -> tuple[int, Optional[datetime], bool]:
     return limit_raw, start_dt, notified
 
 
-def _set_limit_profile(uid: int, limit: int, start_iso: str, notified: int) -> None:
-    update_user_profile(
+async def _set_limit_profile(uid: int, limit: int, start_iso: str, notified: int) -> None:
+    await update_user_profile(
         uid,
         expense_limit=limit,
         expense_limit_start=start_iso,
@@ -1799,13 +1541,11 @@ def _set_limit_profile(uid: int, limit: int, start_iso: str, notified: int) -> N
     )
 
 
-def _reset_user_totals(uid: int) -> None:
-    MEM_TX.pop(uid, None)
-    MEM_TX_SEQ.pop(uid, None)
-    ANALYSIS_COUNTERS.pop(uid, None)
-    profile = USERS_PROFILE_CACHE.get(uid)
+async def _reset_user_totals(uid: int) -> None:
+    await LEDGER.clear_user(uid)
+    profile = USER_PROFILES.get(uid)
     if isinstance(profile, dict) and int(float(profile.get("expense_limit") or 0)) > 0:
-        _set_limit_profile(uid, int(float(profile.get("expense_limit") or 0)), now_tk().isoformat(), 0)
+        await _set_limit_profile(uid, int(float(profile.get("expense_limit") or 0)), now_tk().isoformat(), 0)
 
 
 async def maybe_notify_limit(uid: int, lang: str) -> None:
@@ -1815,18 +1555,14 @@ async def maybe_notify_limit(uid: int, lang: str) -> None:
 
     if start_dt is None:
         start_dt = now_tk()
-        _set_limit_profile(uid, limit, start_dt.isoformat(), 0)
+        await _set_limit_profile(uid, limit, start_dt.isoformat(), 0)
         notified = False
 
     expenses = 0
-    for tx in MEM_TX.get(uid, []):
-        if tx.get("kind") != "expense":
-            continue
-        ts = tx.get("ts")
-        if isinstance(ts, datetime) and start_dt and ts < start_dt:
+    for (kind, currency), total in (await LEDGER.kind_totals_since(uid, start_dt)).items():
+        if kind != "expense":
             continue
-        currency = tx.get("currency", "UZS")
-        expenses += to_uzs(tx.get("amount") or 0, currency)
+        expenses += to_uzs(total, currency)
 
     if expenses >= limit and not notified:
         T = L(lang)
@@ -1835,7 +1571,7 @@ async def maybe_notify_limit(uid: int, lang: str) -> None:
             await bot.send_message(uid, message)
         except Exception:
             pass
-        _set_limit_profile(uid, limit, (start_dt or now_tk()).isoformat(), 1)
+        await _set_limit_profile(uid, limit, (start_dt or now_tk()).isoformat(), 1)
 
 # ====== HANDLERS ======
 @rt.message(CommandStart())
@@ -1844,7 +1580,7 @@ async def start(m:Message):
     USER_ACTIVATED[uid] = True
     SEEN_USERS.add(uid)
     TRIAL_START.setdefault(uid, now_tk())
-    profile = USERS_PROFILE_CACHE.get(uid)
+    profile = await USER_PROFILES.load(uid)
     lang_pref = None
     if isinstance(profile, dict):
         lang_pref = profile.get("lang")
@@ -1866,7 +1602,7 @@ async def start(m:Message):
         STEP[uid] = "main"
         await ensure_subscription_state(uid)
         if not profile.get("activated_at"):
-            update_user_profile(uid, activated_at=datetime.now(timezone.utc).isoformat())
+            await update_user_profile(uid, activated_at=datetime.now(timezone.utc).isoformat())
         display_name = profile.get("name") if isinstance(profile, dict) else None
         if not display_name:
             display_name = (m.from_user.full_name or m.from_user.first_name or m.from_user.username or "") if m.from_user else ""
@@ -1906,7 +1642,7 @@ async def refresh_bio_cmd(m:Message):
     if ADMIN_ID and m.from_user.id!=ADMIN_ID:
         return
     await ensure_month_rollover()
-    total_users = sum(1 for _, flag in USER_ACTIVATED.items() if flag) or len(SEEN_USERS)
+    total_users = await USER_PROFILES.count_activated() or len(SEEN_USERS)
     await update_bot_bio(total_users)
     lang=get_lang(m.from_user.id)
     T=L(lang)
@@ -1948,7 +1684,7 @@ async def on_text(m:Message):
             return
 
         if t == T("btn_reset_totals"):
-            _reset_user_totals(uid)
+            await _reset_user_totals(uid)
             await m.answer(T("reset_done"), reply_markup=kb_input_entry(lang))
             STEP[uid] = "input_tx"
             return
@@ -1976,11 +1712,11 @@ async def on_text(m:Message):
                 await m.answer(T("limit_invalid"), reply_markup=kb_card_cancel(lang))
                 return
             if amount_val <= 0:
-                _set_limit_profile(uid, 0, "", 0)
+                await _set_limit_profile(uid, 0, "", 0)
                 await m.answer(T("limit_disabled"), reply_markup=kb_input_entry(lang))
             else:
                 now_iso = now_tk().isoformat()
-                _set_limit_profile(uid, int(amount_val), now_iso, 0)
+                await _set_limit_profile(uid, int(amount_val), now_iso, 0)
                 await m.answer(T("limit_saved", amount=fmt_amount(int(amount_val))), reply_markup=kb_input_entry(lang))
             STEP[uid] = "input_tx"
             return
@@ -2010,24 +1746,25 @@ async def on_text(m:Message):
                 return
 
             debt_id = state.get("id")
-            debts = MEM_DEBTS.get(uid, [])
-            debt = next((item for item in debts if item.get("id") == debt_id), None)
-            if not debt:
+            debt = await DEBTS.get(uid, debt_id) if debt_id else None
+            if not debt or debt.status != "wait":
                 DEBT_EDIT_STATE.pop(uid, None)
                 STEP[uid] = "main"
                 await m.answer(T("debt_edit_not_found"), reply_markup=kb_debt_menu_reply(lang))
                 return
 
-            currency = debt.get("currency", "UZS")
-            amount_total = int(debt.get("amount", 0) or 0)
-            paid_total = int(debt.get("paid", 0) or 0)
+            currency = debt.currency
+            amount_total = debt.amount
+            paid_total = debt.paid
             remain_after = max(amount_total - paid_total, 0)
             reply_text = None
             archived = False
 
             if mode == "increase":
-                debt["amount"] = amount_total + amount_val
-                amount_total = int(debt.get("amount", 0) or 0)
+                debt.amount = amount_total + amount_val
+                await DEBTS.save(debt)
+                adjust_debt_balance(uid, debt, amount_val)
+                amount_total = debt.amount
                 remain_after = max(amount_total - paid_total, 0)
                 reply_text = T(
                     "debt_edit_added",
@@ -2036,7 +1773,7 @@ async def on_text(m:Message):
                     remain=fmt_amount(remain_after),
                 )
                 if amount_val > 0:
-                    direction = debt.get("direction")
+                    direction = debt.direction
                     if direction == "given":
                         await save_tx(uid, "expense", amount_val, currency, "cash", T("debt_tx_extra_given"), "")
                         await maybe_notify_limit(uid, lang)
@@ -2051,12 +1788,13 @@ async def on_text(m:Message):
                     return
 
                 applied = min(amount_val, remain_before)
-                debt["paid"] = paid_total + applied
-                paid_total = int(debt.get("paid", 0) or 0)
+                debt.paid = paid_total + applied
+                adjust_debt_balance(uid, debt, -applied)
+                paid_total = debt.paid
                 remain_after = max(amount_total - paid_total, 0)
 
                 if applied > 0:
-                    direction = debt.get("direction")
+                    direction = debt.direction
                     if direction == "mine":
                         await save_tx(uid, "expense", applied, currency, "cash", T("debt_tx_partial_paid"), "")
                         await maybe_notify_limit(uid, lang)
@@ -2064,13 +1802,13 @@ async def on_text(m:Message):
                         await save_tx(uid, "income", applied, currency, "cash", T("debt_tx_partial_received"), "")
 
                 if remain_after <= 0:
-                    debt["status"] = "paid" if debt.get("direction") == "mine" else "received"
-                    debt["paid"] = debt.get("amount", 0)
-                    archive_debt_record(uid, debt)
-                    MEM_DEBTS[uid] = [item for item in debts if item.get("id") != debt_id]
+                    debt.status = "paid" if debt.direction == "mine" else "received"
+                    debt.paid = debt.amount
+                    archived_at = await archive_debt_record(uid, debt)
                     archived = True
                     reply_text = T("debt_edit_completed")
                 else:
+                    await DEBTS.save(debt)
                     reply_text = T(
                         "debt_edit_saved",
                         cur=currency,
@@ -2081,22 +1819,11 @@ async def on_text(m:Message):
             state = DEBT_EDIT_STATE.pop(uid, None)
             STEP[uid] = "main"
 
-            message_markup = None if archived else kb_debt_done(debt.get("direction"), debt_id, lang)
+            message_markup = None if archived else kb_debt_done(debt.direction, debt_id, lang)
             message_text = debt_card(debt, lang)
 
             if archived:
-                note_date = fmt_date(now_tk())
-                archived_items = DEBTS_ARCHIVE.get(uid, [])
-                if archived_items:
-                    arch_last = next((item for item in reversed(archived_items) if item.get("id") == debt_id), archived_items[-1])
-                    arch_dt = arch_last.get("archived_at")
-                    if isinstance(arch_dt, datetime):
-                        note_date = fmt_date(arch_dt)
-                    elif isinstance(arch_dt, str):
-                        try:
-                            note_date = fmt_date(datetime.fromisoformat(arch_dt))
-                        except Exception:
-                            note_date = arch_dt
+                note_date = fmt_date(archived_at)
                 message_text = f"{message_text}\n{T('debt_archive_note', date=note_date)}"
 
             if state:
@@ -2142,13 +1869,13 @@ async def on_text(m:Message):
                 start_dt, end_dt = end_dt, start_dt
             since=datetime(start_dt.year,start_dt.month,start_dt.day,tzinfo=TASHKENT)
             until=datetime(end_dt.year,end_dt.month,end_dt.day,23,59,59,tzinfo=TASHKENT)
-            items=[it for it in MEM_TX.get(uid,[]) if since<=it["ts"]<=until]
+            items=await LEDGER.range(uid, since, until)
             if not items:
                 await m.answer(T("rep_empty"))
             else:
                 lines=[]
                 for it in items:
-                    lines.append(T("rep_line",date=fmt_date(it["ts"]),kind=("Kirim" if it["kind"]=="income" else ("Расход" if lang=="ru" else "Chiqim")),cat=it["category"],amount=fmt_amount(it["amount"]),cur=it["currency"]))
+                    lines.append(T("rep_line",date=fmt_date(it.when(TASHKENT)),kind=("Kirim" if it.kind=="income" else ("Расход" if lang=="ru" else "Chiqim")),cat=it.category,amount=fmt_amount(it.amount),cur=it.currency))
                 await m.answer("\n".join(lines))
             REPORT_RANGE_STATE.pop(uid, None)
             STEP[uid]="main"
@@ -2164,10 +1891,10 @@ async def on_text(m:Message):
             if not chosen_lang:
                 return
             USER_LANG[uid] = chosen_lang
-            existing_raw = USERS_PROFILE_CACHE.get(uid)
+            existing_raw = USER_PROFILES.get(uid)
             existing = existing_raw if isinstance(existing_raw, dict) else {}
             if _profile_is_activated(existing):
-                update_user_profile(uid, lang=chosen_lang)
+                await update_user_profile(uid, lang=chosen_lang)
                 nav_reset(uid)
                 STEP[uid] = "main"
                 translator = L(chosen_lang)
@@ -2179,7 +1906,7 @@ async def on_text(m:Message):
             if not raw_name:
                 raw_name = (m.from_user.full_name or m.from_user.first_name or m.from_user.username or "") if m.from_user else ""
             fallback_name = raw_name or ("do‘stim" if chosen_lang == "uz" else "друг")
-            update_user_profile(uid, lang=chosen_lang, name=raw_name or None)
+            await update_user_profile(uid, lang=chosen_lang, name=raw_name or None)
             STEP[uid]="need_phone"
             await m.answer(L(chosen_lang)("welcome", name=fallback_name), reply_markup=kb_share(chosen_lang))
             await m.answer("—", reply_markup=kb_oferta(chosen_lang))
@@ -2189,7 +1916,7 @@ async def on_text(m:Message):
             lang=get_lang(uid); T=L(lang)
             clean_name = t.strip()
             if clean_name:
-                update_user_profile(uid, name=clean_name, lang=lang)
+                await update_user_profile(uid, name=clean_name, lang=lang)
             display_name = clean_name or (m.from_user.full_name if m.from_user else "")
             if display_name and display_name.lower().startswith("polzovatel"):
                 display_name = ""
@@ -2208,7 +1935,7 @@ async def on_text(m:Message):
             if not tmp:
                 STEP[uid]="main"; await m.answer(T("enter_tx"), reply_markup=kb_input_entry(lang)); return
 
-            did = await save_debt(uid, tmp["direction"], tmp["amount"], tmp["currency"], tmp["who"], due)
+            await save_debt(uid, tmp["direction"], tmp["amount"], tmp["currency"], tmp["who"], due)
 
             # Debt create moment -> balansga darhol ta'sir
             if tmp["direction"]=="given":
@@ -2277,15 +2004,18 @@ async def on_text(m:Message):
             nav_push(uid, "report_range")
             await m.answer(T("report_main"), reply_markup=kb_rep_range(lang)); return
 
+        if t==T("rep_export"):
+            await m.answer(T("export_choose"), reply_markup=kb_export(lang)); return
+
         if t==T("rep_debts"):
             nav_push(uid, "report_debts")
-            debts=list(reversed(MEM_DEBTS.get(uid,[])))[:10]
+            debts=await DEBTS.open(uid, limit=10)
             if not debts:
                 await m.answer(T("rep_empty"), reply_markup=kb_rep_main(lang)); return
             for it in debts:
                 txt=debt_card(it, lang)
-                if it["status"]=="wait":
-                    await m.answer(txt, reply_markup=kb_debt_done(it["direction"],it["id"], lang))
+                if it.status=="wait":
+                    await m.answer(txt, reply_markup=kb_debt_done(it.direction,it.id, lang))
                 else:
                     await m.answer(txt)
             return
@@ -2306,7 +2036,7 @@ async def on_text(m:Message):
             if not kind_key:
                 await m.answer(T("error_generic"), reply_markup=kb_rep_main(lang)); return
             since, until = report_range(kind_key)
-            items=[it for it in MEM_TX.get(uid,[]) if since<=it["ts"]<=until]
+            items=await LEDGER.range(uid, since, until)
             if not items:
                 await m.answer(T("rep_empty"), reply_markup=kb_rep_main(lang)); return
             lines=[]
@@ -2314,15 +2044,15 @@ async def on_text(m:Message):
                 lines.append(
                     T(
                         "rep_line",
-                        date=fmt_date(it["ts"]),
+                        date=fmt_date(it.when(TASHKENT)),
                         kind=(
                             "Kirim"
-                            if it["kind"]=="income"
+                            if it.kind=="income"
                             else ("Расход" if lang=="ru" else "Chiqim")
                         ),
-                        cat=it["category"],
-                        amount=fmt_amount(it["amount"]),
-                        cur=it["currency"],
+                        cat=it.category,
+                        amount=fmt_amount(it.amount),
+                        cur=it.currency,
                     )
                 )
             await m.answer("\n".join(lines), reply_markup=kb_rep_main(lang))
@@ -2403,21 +2133,24 @@ async def on_text(m:Message):
             await m.answer(block_text(uid), reply_markup=kb_sub(lang))
             return
 
-        kind=guess_kind(t)
+        parsed=parse_entry(t)
+        hints=parsed.hints
+        kind=guess_kind(t, hints)
 
         async def handle_debt(entry_text: str, kind_label: str) -> bool:
             entry = entry_text.strip()
-            amount_val = parse_amount(entry) or 0
+            parsed = parse_entry(entry)
+            amount_val = parsed.amount or 0
             if amount_val <= 0:
                 await m.answer(T("debt_need"))
                 return False
-            curr_val = detect_currency(entry)
-            who_val = parse_counterparty(entry)
-            due_val = parse_due_date(entry)
+            curr_val = parsed.currency
+            who_val = parsed.counterparty
+            due_val = parsed.due.strftime("%d.%m.%Y") if parsed.due else None
 
             if due_val:
                 debt_direction = "mine" if kind_label == "debt_mine" else "given"
-                debt_id = await save_debt(uid, debt_direction, amount_val, curr_val, who_val, due_val)
+                debt_id = (await save_debt(uid, debt_direction, amount_val, curr_val, who_val, due_val)).id
 
                 # Debt create moment -> balansga darhol ta'sir
                 if kind_label == "debt_mine":
@@ -2450,18 +2183,20 @@ async def on_text(m:Message):
             if not entry:
                 return False
 
-            entry_kind = pre_kind or guess_kind(entry)
+            parsed = parse_entry(entry)
+            hints = parsed.hints
+            entry_kind = pre_kind or guess_kind(entry, hints)
             if entry_kind in ("debt_mine", "debt_given"):
                 await m.answer(T("need_sum"))
                 return False
 
-            amount_val = parse_amount(entry)
+            amount_val = parsed.amount
             if amount_val is None:
                 await m.answer(T("need_sum"))
                 return False
 
-            curr_val = detect_currency(entry)
-            acc_val = detect_account(entry)
+            curr_val = parsed.currency
+            acc_val = parsed.account
 
             if entry_kind == "income":
                 title = "💪 Mehnat daromadlari" if lang == "uz" else "💪 Доход от труда"
@@ -2474,10 +2209,11 @@ async def on_text(m:Message):
                         amount=fmt_amount(amount_val),
                         desc=entry,
                     ),
-                    reply_markup=kb_tx_cancel(tx_saved["id"], lang),
+                    reply_markup=kb_tx_cancel(tx_saved.id, lang),
                 )
             else:
-                cat_val = guess_category(entry, lang)
+                await CATEGORY_MEMORY.load(uid)
+                cat_val = guess_category(entry, lang, hints, uid)
                 tx_saved = await save_tx(uid, "expense", amount_val, curr_val, acc_val, cat_val, entry)
                 await m.answer(
                     T(
@@ -2488,51 +2224,21 @@ async def on_text(m:Message):
                         cat=cat_val,
                         desc=entry,
                     ),
-                    reply_markup=kb_tx_cancel(tx_saved["id"], lang),
+                    reply_markup=kb_tx_cancel(tx_saved.id, lang, recategorize=True),
                 )
                 await maybe_notify_limit(uid, lang)
 
             return True
 
-        def extract_due_prefix(text: str) -> tuple[str, str]:
-            raw = (text or "").lstrip()
-            if not raw:
-                return "", text
-            for pattern in (DUE_WORD_PREFIX_RE, DUE_DATE_PREFIX_RE):
-                m_pref = pattern.match(raw)
-                if not m_pref:
-                    continue
-                candidate = (m_pref.group("due") or "").strip(" ,.;:-")
-                if not candidate:
-                    continue
-                if parse_due_date(candidate) is None:
-                    continue
-                rest = raw[m_pref.end():].lstrip()
-                return candidate, rest
-            return "", text
-
-        raw_entries = split_tx_entries(t)
-        entries = [entry.strip() for entry in raw_entries if entry.strip()]
+        entries = [entry.strip() for entry in split_tx_entries(t) if entry.strip()]
         if len(entries) > 1:
+            entries = attach_debt_due(entries)
             processed_any = False
             idx = 0
             while idx < len(entries):
                 entry = entries[idx]
                 entry_kind = guess_kind(entry)
                 if entry_kind in ("debt_mine", "debt_given"):
-                    if parse_due_date(entry) is None:
-                        attach_idx = idx + 1
-                        while attach_idx < len(entries):
-                            candidate, remainder = extract_due_prefix(entries[attach_idx])
-                            if not candidate:
-                                break
-                            entry = f"{entry} {candidate}".strip()
-                            entries[idx] = entry
-                            if remainder:
-                                entries[attach_idx] = remainder
-                                break
-                            entries.pop(attach_idx)
-                        # After potential due merge, entry is updated
                     should_continue = await handle_debt(entry, entry_kind)
                     if not should_continue:
                         return
@@ -2562,22 +2268,23 @@ async def on_text(m:Message):
             await handle_debt(t, kind)
             return
 
-        amount=parse_amount(t)
+        amount=parsed.amount
         if amount is None: await m.answer(T("need_sum")); return
-        curr=detect_currency(t); acc=detect_account(t)
+        curr=parsed.currency; acc=parsed.account
         if kind=="income":
             tx_saved = await save_tx(uid,"income",amount,curr,acc,"💪 Mehnat daromadlari" if lang=="uz" else "💪 Доход от труда",t)
             await m.answer(
                 T("tx_inc",date=fmt_date(now_tk()),cur=curr,amount=fmt_amount(amount),desc=t),
-                reply_markup=kb_tx_cancel(tx_saved["id"], lang),
+                reply_markup=kb_tx_cancel(tx_saved.id, lang),
             )
             return
         else:
-            cat=guess_category(t, lang)
+            await CATEGORY_MEMORY.load(uid)
+            cat=guess_category(t, lang, hints, uid)
             tx_saved = await save_tx(uid,"expense",amount,curr,acc,cat,t)
             await m.answer(
                 T("tx_exp",date=fmt_date(now_tk()),cur=curr,amount=fmt_amount(amount),cat=cat,desc=t),
-                reply_markup=kb_tx_cancel(tx_saved["id"], lang),
+                reply_markup=kb_tx_cancel(tx_saved.id, lang, recategorize=True),
             )
             return
 
@@ -2599,7 +2306,7 @@ async def on_contact(m:Message):
     first_name = m.from_user.first_name if m.from_user else None
     last_name = m.from_user.last_name if m.from_user else None
     now_iso = datetime.now(timezone.utc).isoformat()
-    update_user_profile(
+    await update_user_profile(
         uid,
         phone=phone,
         username=username,
@@ -2632,10 +2339,10 @@ async def report_range_custom_cb(c:CallbackQuery):
     await c.answer()
 
 
-async def send_debt_archive_list(uid: int, lang: str, answer_call, reply_markup=None) -> None:
+async def send_debt_archive_list(uid: int, lang: str, answer_call, reply_markup=None, before_id: Optional[int] = None) -> None:
     await ensure_month_rollover()
     await ensure_subscription_state(uid)
-    items = DEBTS_ARCHIVE.get(uid, [])
+    items, next_cursor = await DEBT_ARCHIVE.page(uid, DEBT_ARCHIVE_PAGE, before_id)
     T = L(lang)
     if not items:
         if reply_markup is not None:
@@ -2643,34 +2350,23 @@ async def send_debt_archive_list(uid: int, lang: str, answer_call, reply_markup=
         else:
             await answer_call(T("debt_archive_empty"))
         return
-    if reply_markup is not None:
-        await answer_call(T("debt_archive_header"), reply_markup=reply_markup)
-    else:
-        await answer_call(T("debt_archive_header"))
-    for it in reversed(items[-10:]):
-        copy = dict(it)
-        ts_val = copy.get("ts")
-        if isinstance(ts_val, str):
-            try:
-                copy["ts"] = datetime.fromisoformat(ts_val)
-            except Exception:
-                copy["ts"] = now_tk()
-        elif not isinstance(ts_val, datetime):
-            copy["ts"] = now_tk()
-        text = debt_card(copy, lang)
-        arch_val = copy.get("archived_at")
-        if isinstance(arch_val, str):
-            try:
-                arch_dt = datetime.fromisoformat(arch_val)
-            except Exception:
-                arch_dt = None
-        elif isinstance(arch_val, datetime):
-            arch_dt = arch_val
+    if before_id is None:
+        if reply_markup is not None:
+            await answer_call(T("debt_archive_header"), reply_markup=reply_markup)
         else:
-            arch_dt = None
-        if arch_dt:
-            text += f"\n{T('debt_archive_note', date=fmt_date(arch_dt))}"
-        await answer_call(text)
+            await answer_call(T("debt_archive_header"))
+    more_kb = None
+    if next_cursor is not None:
+        more_kb = InlineKeyboardMarkup(inline_keyboard=[[
+            InlineKeyboardButton(text=T("debt_archive_more"), callback_data=f"debt:archive:{next_cursor}")
+        ]])
+    for idx, it in enumerate(items):
+        text = debt_card(it, lang)
+        text += f"\n{T('debt_archive_note', date=fmt_date(datetime.fromtimestamp(it.archived_at, TASHKENT)))}"
+        if more_kb is not None and idx == len(items) - 1:
+            await answer_call(text, reply_markup=more_kb)
+        else:
+            await answer_call(text)
 
 
 async def send_debt_direction(uid: int, lang: str, direction: str, answer_call, reply_markup=None) -> None:
@@ -2685,7 +2381,7 @@ async def send_debt_direction(uid: int, lang: str, direction: str, answer_call,
         await answer_call(head, reply_markup=reply_markup)
     else:
         await answer_call(head)
-    debts = [x for x in MEM_DEBTS.get(uid, []) if x["direction"] == direction]
+    debts = await DEBTS.open(uid, direction)
     if not debts:
         if reply_markup is not None:
             await answer_call(T("rep_empty"), reply_markup=reply_markup)
@@ -2694,8 +2390,8 @@ async def send_debt_direction(uid: int, lang: str, direction: str, answer_call,
         return
     for it in reversed(debts[-10:]):
         txt = debt_card(it, lang)
-        if it["status"] == "wait":
-            await answer_call(txt, reply_markup=kb_debt_done(it["direction"], it["id"], lang))
+        if it.status == "wait":
+            await answer_call(txt, reply_markup=kb_debt_done(it.direction, it.id, lang))
         else:
             await answer_call(txt)
 
@@ -2708,6 +2404,23 @@ async def debt_archive_cb(c:CallbackQuery):
     await c.answer()
 
 
+@debts_archive_router.callback_query(F.data.startswith("debt:archive:"))
+async def debt_archive_more_cb(c:CallbackQuery):
+    uid=c.from_user.id
+    lang=get_lang(uid)
+    try:
+        before_id = int(c.data.rsplit(":", 1)[1])
+    except Exception:
+        await c.answer()
+        return
+    try:
+        await c.message.edit_reply_markup(reply_markup=None)
+    except Exception:
+        pass
+    await send_debt_archive_list(uid, lang, c.message.answer, before_id=before_id)
+    await c.answer()
+
+
 @rt.callback_query(F.data.startswith("txcancel:"))
 async def tx_cancel_cb(c: CallbackQuery):
     user = c.from_user
@@ -2723,9 +2436,8 @@ async def tx_cancel_cb(c: CallbackQuery):
         await c.answer("Xatolik." if lang == "uz" else "Ошибка.", show_alert=True)
         return
 
-    tx_list = MEM_TX.get(uid, [])
-    index = next((i for i, item in enumerate(tx_list) if item.get("id") == tx_id), -1)
-    if index == -1:
+    tx = await LEDGER.remove(uid, tx_id)
+    if tx is None:
         msg = "Yozuv topilmadi yoki allaqachon bekor qilingan." if lang == "uz" else "Запись не найдена либо уже отменена."
         await c.answer(msg, show_alert=True)
         try:
@@ -2734,11 +2446,6 @@ async def tx_cancel_cb(c: CallbackQuery):
             pass
         return
 
-    tx = tx_list.pop(index)
-    if not tx_list:
-        MEM_TX.pop(uid, None)
-    revert_analysis_counters(uid, tx.get("kind", "expense"), tx.get("amount", 0), tx.get("currency", "UZS"))
-
     notification = "Bekor qilindi." if lang == "uz" else "Отменено."
     await c.answer(notification)
     final_text = "❌ Yozuv bekor qilindi." if lang == "uz" else "❌ Запись отменена."
@@ -2751,6 +2458,58 @@ async def tx_cancel_cb(c: CallbackQuery):
             pass
 
 
+@rt.callback_query(F.data.startswith("txcat:"))
+async def tx_category_cb(c: CallbackQuery):
+    uid = c.from_user.id
+    lang = get_lang(uid)
+    try:
+        tx_id = int(c.data.split(":", 1)[1])
+    except Exception:
+        await c.answer("Xatolik." if lang == "uz" else "Ошибка.", show_alert=True)
+        return
+    try:
+        await c.message.edit_reply_markup(reply_markup=kb_tx_categories(tx_id, lang))
+    except Exception:
+        pass
+    await c.answer()
+
+
+@rt.callback_query(F.data.startswith("txcatset:"))
+async def tx_category_set_cb(c: CallbackQuery):
+    uid = c.from_user.id
+    lang = get_lang(uid); T = L(lang)
+    try:
+        _, tx_id_raw, key = c.data.split(":", 2)
+        tx_id = int(tx_id_raw)
+        labels = CATEGORY_LABELS[key]
+    except Exception:
+        await c.answer("Xatolik." if lang == "uz" else "Ошибка.", show_alert=True)
+        return
+
+    cat = labels.get(lang, labels["uz"])
+    tx = await LEDGER.set_category(uid, tx_id, cat)
+    if tx is None:
+        msg = "Yozuv topilmadi yoki allaqachon bekor qilingan." if lang == "uz" else "Запись не найдена либо уже отменена."
+        await c.answer(msg, show_alert=True)
+        try:
+            await c.message.edit_reply_markup()
+        except Exception:
+            pass
+        return
+
+    # tanlangan (yoki tasdiqlangan) kategoriya shu tavsif so'zlari uchun eslab qolinadi
+    await CATEGORY_MEMORY.learn(uid, tx.desc, key)
+    await c.answer(cat)
+    try:
+        await c.message.edit_text(
+            T("tx_exp", date=fmt_date(tx.when(TASHKENT)), cur=tx.currency, amount=fmt_amount(tx.amount),
+              cat=cat, desc=tx.desc),
+            reply_markup=kb_tx_cancel(tx.id, lang, recategorize=True),
+        )
+    except Exception:
+        pass
+
+
 @rt.callback_query(F.data.startswith("rep:"))
 async def rep_cb(c:CallbackQuery):
     uid=c.from_user.id
@@ -2768,19 +2527,19 @@ async def rep_cb(c:CallbackQuery):
         await c.message.answer(T("report_main"), reply_markup=kb_rep_range(lang)); await c.answer(); return
     if kind in ("day","week","month"):
         since,until=report_range(kind)
-        items=[it for it in MEM_TX.get(uid,[]) if since<=it["ts"]<=until]
+        items=await LEDGER.range(uid, since, until)
         if not items: await c.message.answer(T("rep_empty")); await c.answer(); return
         lines=[]
         for it in items:
-            lines.append(T("rep_line",date=fmt_date(it["ts"]),kind=("Kirim" if it["kind"]=="income" else ("Расход" if lang=="ru" else "Chiqim")),cat=it["category"],amount=fmt_amount(it["amount"]),cur=it["currency"]))
+            lines.append(T("rep_line",date=fmt_date(it.when(TASHKENT)),kind=("Kirim" if it.kind=="income" else ("Расход" if lang=="ru" else "Chiqim")),cat=it.category,amount=fmt_amount(it.amount),cur=it.currency))
         await c.message.answer("\n".join(lines)); await c.answer(); return
     if kind=="debts":
         nav_push(uid, "report_debts")
-        debts=list(reversed(MEM_DEBTS.get(uid,[])))[:10]
+        debts=await DEBTS.open(uid, limit=10)
         if not debts: await c.message.answer(T("rep_empty")); await c.answer(); return
         for it in debts:
             txt=debt_card(it, lang)
-            if it["status"]=="wait": await c.message.answer(txt, reply_markup=kb_debt_done(it["direction"],it["id"], lang))
+            if it.status=="wait": await c.message.answer(txt, reply_markup=kb_debt_done(it.direction,it.id, lang))
             else: await c.message.answer(txt)
         await c.answer(); return
 
@@ -2826,9 +2585,8 @@ async def debt_edit_cb(c: CallbackQuery):
         await c.answer(T("debt_edit_not_found"), show_alert=True)
         return
 
-    debts = MEM_DEBTS.get(uid, [])
-    debt = next((item for item in debts if item.get("id") == did), None)
-    if not debt:
+    debt = await DEBTS.get(uid, did)
+    if not debt or debt.status != "wait":
         await c.answer(T("debt_edit_not_found"), show_alert=True)
         try:
             await c.message.edit_reply_markup()
@@ -2836,10 +2594,10 @@ async def debt_edit_cb(c: CallbackQuery):
             pass
         return
 
-    amount_total = int(debt.get("amount", 0) or 0)
-    paid_total = int(debt.get("paid", 0) or 0)
-    remain = max(amount_total - paid_total, 0)
-    currency = debt.get("currency", "UZS")
+    amount_total = debt.amount
+    paid_total = debt.paid
+    remain = debt.remaining
+    currency = debt.currency
 
     DEBT_EDIT_STATE[uid] = {
         "id": did,
@@ -2877,39 +2635,27 @@ async def debt_done(c:CallbackQuery):
         return
     T=L(lang)
     _,direction,sid=c.data.split(":"); did=int(sid)
-    for it in MEM_DEBTS.get(uid,[]):
-        if it["id"]==did:
-            amount_total = int(it.get("amount", 0) or 0)
-            paid_total = int(it.get("paid", 0) or 0)
-            currency = it.get("currency", "UZS")
-            remain = max(amount_total - paid_total, 0)
-
-            if direction=="mine":
-                it["status"]="paid"       # o'z qarzingizni to'ladingiz -> CHIQIM
-                it["paid"] = amount_total
-                if remain > 0:
-                    await save_tx(uid,"expense",remain,currency,"cash","💳 Qarz qaytarildi" if lang=="uz" else "💳 Долг оплачен","")
-                    await maybe_notify_limit(uid, lang)
-            else:
-                it["status"]="received"   # sizga qarz qaytdi -> KIRIM
-                it["paid"] = amount_total
-                if remain > 0:
-                    await save_tx(uid,"income",remain,currency,"cash","💳 Qarz qaytdi" if lang=="uz" else "💳 Долг возвращен","")
-            archive_debt_record(uid, it)
-            MEM_DEBTS[uid]=[d for d in MEM_DEBTS.get(uid,[]) if d.get("id")!=did]
-            note_date = fmt_date(now_tk())
-            archived_items = DEBTS_ARCHIVE.get(uid, [])
-            if archived_items:
-                arch_last = next((item for item in reversed(archived_items) if item.get("id")==did), archived_items[-1])
-                arch_dt = arch_last.get("archived_at")
-                if isinstance(arch_dt, datetime):
-                    note_date = fmt_date(arch_dt)
-                elif isinstance(arch_dt, str):
-                    try:
-                        note_date = fmt_date(datetime.fromisoformat(arch_dt))
-                    except Exception:
-                        note_date = arch_dt
-            text = debt_card(it, lang) + f"\n{T('debt_archive_note', date=note_date)}"
+    it = await DEBTS.get(uid, did)
+    if it and it.status=="wait":
+        amount_total = it.amount
+        currency = it.currency
+        remain = it.remaining
+        adjust_debt_balance(uid, it, -remain)
+
+        if direction=="mine":
+            it.status="paid"       # o'z qarzingizni to'ladingiz -> CHIQIM
+            it.paid = amount_total
+            if remain > 0:
+                await save_tx(uid,"expense",remain,currency,"cash","💳 Qarz qaytarildi" if lang=="uz" else "💳 Долг оплачен","")
+                await maybe_notify_limit(uid, lang)
+        else:
+            it.status="received"   # sizga qarz qaytdi -> KIRIM
+            it.paid = amount_total
+            if remain > 0:
+                await save_tx(uid,"income",remain,currency,"cash","💳 Qarz qaytdi" if lang=="uz" else "💳 Долг возвращен","")
+        archived_at = await archive_debt_record(uid, it)
+        note_date = fmt_date(archived_at)
+        text = debt_card(it, lang) + f"\n{T('debt_archive_note', date=note_date)}"
         await c.message.edit_text(text)
         await c.answer(("Holat yangilandi ✅" if lang=="uz" else "Статус обновлён ✅"))
         return
@@ -2927,32 +2673,238 @@ async def debt_cancel_cb(c: CallbackQuery):
             await c.message.answer(block_text(uid), reply_markup=kb_sub(lang))
         await c.answer()
         return
-    global DEBT_REMIND_SENT
     try:
         did = int(c.data.split(":", 1)[1])
     except Exception:
         await c.answer("Topilmadi" if lang == "uz" else "Не найдено", show_alert=True)
         return
 
-    debts = MEM_DEBTS.get(uid, [])
-    for idx, item in enumerate(debts):
-        if item.get("id") == did:
-            debts.pop(idx)
-            DEBT_REMIND_SENT = {
-                entry for entry in DEBT_REMIND_SENT if not (entry[0] == uid and entry[1] == did)
-            }
-            if not debts:
-                MEM_DEBTS.pop(uid, None)
-            if c.message:
-                try:
-                    await c.message.edit_text(T("debt_cancelled"))
-                except Exception:
-                    await c.message.answer(T("debt_cancelled"))
-            await c.answer("Bekor qilindi" if lang == "uz" else "Отменено")
-            return
+    item = await DEBTS.delete(uid, did)
+    if item:
+        adjust_debt_balance(uid, item, -item.remaining)
+        await DEBT_REMINDERS.forget(uid, did)
+        if c.message:
+            try:
+                await c.message.edit_text(T("debt_cancelled"))
+            except Exception:
+                await c.message.answer(T("debt_cancelled"))
+        await c.answer("Bekor qilindi" if lang == "uz" else "Отменено")
+        return
 
     await c.answer("Topilmadi" if lang == "uz" else "Не найдено", show_alert=True)
 
+# ====== IMPORT ======
+IMPORT_MAX_BYTES = 20 * 1024 * 1024  # Bot API download limit
+IMPORTS_RUNNING: set[int] = set()
+
+
+def classify_statement_row(
+    row: StatementRow, lang: str, remembered: Optional[Dict[str, str]] = None,
+) -> Optional[tuple]:
+    """Runs in the importer's worker thread: ``remembered`` is a ``CATEGORY_MEMORY.snapshot()``."""
+    amount_val = parse_amount(row.amount_text)
+    if not amount_val:
+        return None
+    text = row.text
+    kind = "income" if row.sign > 0 else "expense" if row.sign < 0 else guess_kind(text)
+    curr_val = row.currency if row.currency in ("UZS", "USD", "EUR") else detect_currency(text)
+    acc_val = detect_account(text)
+    if kind == "debt_mine":
+        return ("income", amount_val, curr_val, acc_val, "💳 Qarz olindi", text, row.ts)
+    if kind == "debt_given":
+        return ("expense", amount_val, curr_val, acc_val, "💳 Qarz berildi", text, row.ts)
+    if kind == "income":
+        title = row.category or ("💪 Mehnat daromadlari" if lang == "uz" else "💪 Доход от труда")
+        return ("income", amount_val, curr_val, acc_val, title, text, row.ts)
+    cat_val = row.category or category_label(
+        (CATEGORY_MEMORY.recall_in(remembered, text) if remembered else None) or category_key(text), lang
+    )
+    return ("expense", amount_val, curr_val, acc_val, cat_val, text, row.ts)
+
+
+@import_router.message(Command("import"))
+async def import_cmd(m: Message):
+    uid = m.from_user.id
+    lang = get_lang(uid)
+    await ensure_subscription_state(uid)
+    if not has_access(uid):
+        await send_expired_notice(uid, lang, m.answer)
+        await m.answer(block_text(uid), reply_markup=get_main_menu(lang))
+        return
+    await m.answer(L(lang)("import_help"))
+
+
+@import_router.message(F.document)
+async def import_document(m: Message):
+    uid = m.from_user.id
+    lang = get_lang(uid); T = L(lang)
+    await ensure_subscription_state(uid)
+    if not has_access(uid):
+        await send_expired_notice(uid, lang, m.answer)
+        await m.answer(block_text(uid), reply_markup=get_main_menu(lang))
+        return
+    filename = (m.document.file_name or "").lower()
+    if not filename.endswith(IMPORT_EXTENSIONS):
+        await m.answer(T("import_bad_file"))
+        return
+    if (m.document.file_size or 0) > IMPORT_MAX_BYTES:
+        await m.answer(T("import_too_big"))
+        return
+    if uid in IMPORTS_RUNNING:
+        await m.answer(T("import_busy"))
+        return
+
+    IMPORTS_RUNNING.add(uid)
+    status = await m.answer(T("import_started"))
+    fd, path = tempfile.mkstemp(suffix=os.path.splitext(filename)[1])
+    os.close(fd)
+
+    async def report(imported: int, skipped: int) -> None:
+        try:
+            await status.edit_text(T("import_progress", imported=imported, skipped=skipped))
+        except Exception:
+            pass
+
+    try:
+        await bot.download(m.document, destination=path)
+        await CATEGORY_MEMORY.load(uid)
+        remembered = CATEGORY_MEMORY.snapshot(uid)
+        result = await import_statement(
+            LEDGER, uid, path, filename, lambda row: classify_statement_row(row, lang, remembered), progress=report
+        )
+    except StatementFormatError:
+        await status.edit_text(T("import_no_header"))
+        return
+    except Exception as exc:
+        logging.getLogger(__name__).warning("statement-import-failed", extra={"user_id": uid, "error": str(exc)})
+        await status.edit_text(T("import_failed"))
+        return
+    finally:
+        IMPORTS_RUNNING.discard(uid)
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+    await status.edit_text(T("import_done", **result))
+
+
+# ====== EXPORT ======
+EXPORTS_RUNNING: set[int] = set()
+
+
+class SpooledInputFile(InputFile):
+    """Upload an open (spooled) file without reading it into memory first."""
+
+    def __init__(self, file, filename: str) -> None:
+        super().__init__(filename=filename)
+        self.file = file
+
+    async def read(self, bot: Bot):
+        self.file.seek(0)
+        while chunk := self.file.read(self.chunk_size):
+            yield chunk
+
+
+def kb_export(lang: str = "uz") -> InlineKeyboardMarkup:
+    T = L(lang)
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [
+                InlineKeyboardButton(text=f"{T(f'export_period_{period}')} · {fmt.upper()}", callback_data=f"exp:{period}:{fmt}")
+                for fmt in EXPORT_FORMATS
+            ]
+            for period in ("month", "year", "all")
+        ]
+    )
+
+
+def export_period(period: str) -> Tuple[Optional[datetime], datetime]:
+    n = now_tk()
+    if period == "month":
+        return n.replace(day=1, hour=0, minute=0, second=0, microsecond=0), n
+    if period == "year":
+        return n.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0), n
+    return None, n
+
+
+async def send_ledger_export(uid: int, lang: str, answer, fmt: str, since: Optional[datetime], until: datetime) -> None:
+    T = L(lang)
+    if uid in EXPORTS_RUNNING:
+        await answer(T("export_busy"))
+        return
+    EXPORTS_RUNNING.add(uid)
+    status = await answer(T("export_started"))
+    kinds = {"income": "Kirim" if lang == "uz" else "Доход", "expense": "Chiqim" if lang == "uz" else "Расход"}
+    try:
+        file, count = await export_ledger(
+            LEDGER, uid, fmt, T("export_headers").split("|"), lambda kind: kinds.get(kind, kind), since, until
+        )
+        with file:
+            if not count:
+                await status.edit_text(T("rep_empty"))
+                return
+            await bot.send_document(
+                uid,
+                SpooledInputFile(file, export_filename(fmt, since, until)),
+                caption=T("export_caption", count=count),
+            )
+        await status.delete()
+    except Exception as exc:
+        logging.getLogger(__name__).warning("ledger-export-failed", extra={"user_id": uid, "error": str(exc)})
+        try:
+            await status.edit_text(T("export_failed"))
+        except Exception:
+            pass
+    finally:
+        EXPORTS_RUNNING.discard(uid)
+
+
+@export_router.message(Command("export"))
+async def export_cmd(m: Message):
+    uid = m.from_user.id
+    lang = get_lang(uid); T = L(lang)
+    await ensure_subscription_state(uid)
+    if not has_access(uid):
+        await send_expired_notice(uid, lang, m.answer)
+        await m.answer(block_text(uid), reply_markup=get_main_menu(lang))
+        return
+    args = (m.text or "").split()[1:]
+    fmt = args[0].lower() if args and args[0].lower() in EXPORT_FORMATS else None
+    dates = [parse_report_range_date(a) for a in args[1 if fmt else 0:]]
+    if fmt is None and not args:
+        await m.answer(T("export_choose"), reply_markup=kb_export(lang))
+        return
+    if len(dates) != 2 or None in dates:
+        if dates:
+            await m.answer(T("rep_range_invalid"))
+            return
+        since, until = export_period("all")
+    else:
+        start_dt, end_dt = sorted(dates)
+        since = datetime(start_dt.year, start_dt.month, start_dt.day, tzinfo=TASHKENT)
+        until = datetime(end_dt.year, end_dt.month, end_dt.day, 23, 59, 59, tzinfo=TASHKENT)
+    await send_ledger_export(uid, lang, m.answer, fmt or "csv", since, until)
+
+
+@export_router.callback_query(F.data.startswith("exp:"))
+async def export_cb(c: CallbackQuery):
+    uid = c.from_user.id
+    lang = get_lang(uid)
+    await ensure_subscription_state(uid)
+    if not has_access(uid):
+        await send_expired_notice(uid, lang, c.message.answer)
+        await c.message.answer(block_text(uid), reply_markup=kb_sub(lang))
+        await c.answer()
+        return
+    _, period, fmt = (c.data.split(":") + ["", ""])[:3]
+    if fmt not in EXPORT_FORMATS:
+        await c.answer()
+        return
+    await c.answer()
+    since, until = export_period(period)
+    await send_ledger_export(uid, lang, c.message.answer, fmt, since, until)
+
+
 # ====== ANALIZ ======
 @rt.message(Command("analiz"))
 async def analiz_cmd(m: Message):
@@ -2964,20 +2916,19 @@ async def analiz_cmd(m: Message):
         await send_expired_notice(uid, lang, m.answer)
         await m.answer(block_text(uid), reply_markup=get_main_menu(lang))
         return
-    since, until = month_period()
-    items = [it for it in MEM_TX.get(uid, []) if since <= it["ts"] <= until]
+    stats = await LEDGER.month_stats(uid, now_tk().strftime("%Y%m"))
 
     income_uzs = 0
     expense_uzs = 0
     cat_map: Dict[str, int] = {}
 
-    for it in items:
-        amt_uzs = to_uzs(it["amount"], it.get("currency", "UZS"))
-        if it["kind"] == "income":
+    for (kind, category, currency), (total, _count) in stats.items():
+        amt_uzs = to_uzs(total, currency)
+        if kind == "income":
             income_uzs += amt_uzs
         else:
             expense_uzs += amt_uzs
-            cat = it.get("category", "🧾 Boshqa xarajatlar" if lang=="uz" else "🧾 Прочие расходы")
+            cat = category or ("🧾 Boshqa xarajatlar" if lang=="uz" else "🧾 Прочие расходы")
             cat_map[cat] = cat_map.get(cat, 0) + amt_uzs
 
     balance_uzs = income_uzs - expense_uzs
@@ -2988,7 +2939,7 @@ async def analiz_cmd(m: Message):
         cat_lines.append(f"• {cat} — {fmt_amount(total)} so'm")
     cats_text = "\n".join(cat_lines) if cat_lines else ("• Hali sarf yozuvlari yo‘q" if lang=="uz" else "• Расходов пока нет")
 
-    has_items = bool(items)
+    has_items = any(count > 0 for _total, count in stats.values())
     gap_uzs = abs(balance_uzs)
     gap_fmt = fmt_amount(gap_uzs)
     jamgarma_abs = abs(jamgarma_percent)
@@ -3193,27 +3144,10 @@ async def paycheck_cb(c:CallbackQuery):
 
 
 async def send_balance(uid:int, m:Message):
-    sums={("cash","UZS"):0,("cash","USD"):0,("card","UZS"):0,("card","USD"):0}
-    for it in MEM_TX.get(uid,[]):
-        sign = 1 if it["kind"]=="income" else -1
-        k=(it["account"], it["currency"])
-        if k not in sums: sums[k]=0
-        sums[k]+= sign*it["amount"]
-    they_uzs=0; i_uzs=0; they_usd=0; i_usd=0
-    for d in MEM_DEBTS.get(uid,[]):
-        if d["status"]!="wait": continue
-        amt = d["amount"]
-        cur = d.get("currency","UZS")
-        if d["direction"]=="given":
-            if cur == "USD":
-                they_usd += amt
-            else:
-                they_uzs += amt
-        else:
-            if cur == "USD":
-                i_usd += amt
-            else:
-                i_uzs += amt
+    bal = await LEDGER.balances(uid)
+    sums = {(account, currency): amount for (scope, account, currency), amount in bal.items() if scope == "account"}
+    they_uzs = bal.get(("debt", "given", "UZS"), 0); they_usd = bal.get(("debt", "given", "USD"), 0)
+    i_uzs = bal.get(("debt", "mine", "UZS"), 0); i_usd = bal.get(("debt", "mine", "USD"), 0)
 
     lang=get_lang(uid); T=L(lang)
     txt=T("balance",
@@ -3231,66 +3165,18 @@ async def send_balance(uid:int, m:Message):
 
 
 # ====== CATEGORY ======
-CATEGORY_HINTS = {
-    "transport": [
-        "taksi","taxi","uber","bolt","yandex","yo‘l","yol","benzin","fuel","авто","машина","такси","метро","автобус",
-        "транспорт","tramvay","marshrut","parking","parkov"
-    ],
-    "food": [
-        "ovqat","kafe","restoran","non","taom","fastfood","osh","shashlik","coffee","lunch","breakfast","dinner",
-        "еда","кафе","ресторан","фастфуд","пицца","бургер","stolovaya","cafeteria"
-    ],
-    "utilities": [
-        "kommunal","komunal","svet","gaz","suv","электр","коммунал","свет","газ","вода","kvitan","квитан",
-        "electric","heating","тепл"
-    ],
-    "communication": [
-        "internet","интернет","wifi","telefon","телефон","связь","uzmobile","beeline","ucell","megafon","mob","sim"
-    ],
-    "housing": [
-        "ijara","kvartira","arenda","ipoteka","аренда","ипотека","квартира","дом","жильё","komnata"
-    ],
-    "health": [
-        "dorixona","shifokor","apteka","dori","аптека","врач","лекар","medicine","hospital","больница","klinika","clinic",
-        "dentist","стомат"
-    ],
-    "shopping": [
-        "magazin","market","supermarket","магазин","маркет","супермаркет","shop","store","bozor","рынок","kiyim","одежда",
-        "sumka","сумка","butik","аксессуар","techno","electronics","электроник"
-    ],
-    "entertainment": [
-        "kino","film","театр","concert","концерт","клуб","game","игра","Netflix","spotify","театр","park","аттракцион",
-        "музей","спортзал","fitness","spa","kinoteatr"
-    ],
-    "education": [
-        "kurs","dars","lesson","университет","школа","лект","training","education","edu","курс","семинар"
-    ],
-    "pets": ["it","dog","собака","mushuk","cat","кот","кошка","pet","живот","корм для"]
-}
-
-CATEGORY_LABELS = {
-    "transport": {"uz": "🚌 Transport", "ru": "🚌 Транспорт"},
-    "food": {"uz": "🍔 Oziq-ovqat", "ru": "🍔 Питание"},
-    "utilities": {"uz": "💡 Kommunal", "ru": "💡 Коммунальные"},
-    "communication": {"uz": "📱 Aloqa", "ru": "📱 Связь"},
-    "housing": {"uz": "🏠 Uy-ijara", "ru": "🏠 Жильё"},
-    "health": {"uz": "💊 Sog‘liq", "ru": "💊 Здоровье"},
-    "shopping": {"uz": "🛍 Savdo", "ru": "🛍 Покупки"},
-    "entertainment": {"uz": "🎉 Ko‘ngilochar", "ru": "🎉 Развлечения"},
-    "education": {"uz": "📚 Ta’lim", "ru": "📚 Обучение"},
-    "pets": {"uz": "🐾 Uy hayvoni", "ru": "🐾 Домашние питомцы"},
-    "other": {"uz": "🧾 Boshqa xarajatlar", "ru": "🧾 Прочие расходы"},
-}
-
-
-def guess_category(text: str, lang: str = "uz") -> str:
-    t = (text or "").lower()
-    for key, hints in CATEGORY_HINTS.items():
-        if any(h in t for h in hints):
-            labels = CATEGORY_LABELS.get(key, CATEGORY_LABELS["other"])
-            return labels.get(lang, labels.get("uz"))
-    labels = CATEGORY_LABELS["other"]
-    return labels.get(lang, labels.get("uz"))
+CATEGORY_MEMORY = CategoryMemory(stopwords=MEMORY_STOPWORDS)
+
+
+def guess_category(
+    text: str, lang: str = "uz", hints: Optional[FrozenSet[str]] = None, uid: Optional[int] = None,
+) -> str:
+    """Category label for an expense: ``uid``'s remembered words first, then ``CATEGORY_HINTS``.
+
+    The user's memory has to be brought in with ``await CATEGORY_MEMORY.load(uid)``.
+    """
+    key = CATEGORY_MEMORY.recall(uid, text) if uid is not None else None
+    return category_label(key or category_key(text, hints), lang)
 
 # ====== Eslatmalar ======
 def _sec_until(h:int,mn:int=0):
@@ -3345,8 +3231,7 @@ async def subscription_reminder_loop():
 
 async def _reminder_users() -> list[dict[str, Any]]:
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
-            db.row_factory = aiosqlite.Row
+        async with POOL.acquire() as db:
             cur = await db.execute(
                 "SELECT user_id, COALESCE(lang, 'uz') AS lang FROM users WHERE reminder_on=1"
             )
@@ -3380,6 +3265,15 @@ async def daily_reminder():
                 pass
         await asyncio.sleep(5)
 
+async def payments_log_maintenance():
+    while True:
+        try:
+            await asyncio.sleep(_sec_until(PAYMENTS_LOG_MAINTENANCE_HOUR, 0))
+            await PAYMENT_LOGS.run()
+        except Exception as exc:
+            logger.warning("payments-logs-maintenance-failed", extra={"error": str(exc)})
+        await asyncio.sleep(5)
+
 async def debt_reminder():
     schedule = ((10, "slot_a"), (16, "slot_b"))
     while True:
@@ -3387,49 +3281,31 @@ async def debt_reminder():
             try:
                 await asyncio.sleep(_sec_until(hour, 0))
                 now = now_tk()
-                today = fmt_date(now)
-                for key in list(DEBT_REMIND_SENT):
-                    if key[3] != today:
-                        DEBT_REMIND_SENT.remove(key)
-
-                for uid, debts in list(MEM_DEBTS.items()):
-                    if not debts:
+                day = now.date().isoformat()
+                await DEBT_REMINDERS.prune(day)
+                sent = await DEBT_REMINDERS.sent(day, slot_key)
+                for uid, it in await DEBTS.due(now.date()):
+                    debt_id = it.id
+                    if (uid, debt_id) in sent:
                         continue
                     lang = get_lang(uid)
                     T = L(lang)
-                    for it in debts:
-                        if it.get("status") != "wait":
-                            continue
-                        due_raw = it.get("due")
-                        if not due_raw:
-                            continue
-                        try:
-                            due_dt = datetime.strptime(due_raw, "%d.%m.%Y").date()
-                        except Exception:
-                            continue
-                        if due_dt > now.date():
-                            continue
-                        debt_id = it.get("id")
-                        if not debt_id:
-                            continue
-                        key = (uid, debt_id, slot_key, today)
-                        if key in DEBT_REMIND_SENT:
-                            continue
-                        amount_text = fmt_amount(it.get("amount", 0))
-                        currency = it.get("currency", "UZS")
-                        who = it.get("counterparty")
-                        if not who:
-                            if it.get("direction") == "given":
-                                who = "qarzdor" if lang == "uz" else "должник"
-                            else:
-                                who = "qarz bergan kishi" if lang == "uz" else "кредитор"
-                        template = "DEBT_REMIND_TO_US" if it.get("direction") == "given" else "DEBT_REMIND_BY_US"
-                        message = T(template, due=due_raw, who=who, amount=amount_text, cur=currency)
-                        try:
-                            await bot.send_message(uid, message)
-                            DEBT_REMIND_SENT.add(key)
-                        except Exception:
-                            pass
+                    due_raw = it.due
+                    amount_text = fmt_amount(it.amount)
+                    currency = it.currency
+                    who = it.counterparty
+                    if not who:
+                        if it.direction == "given":
+                            who = "qarzdor" if lang == "uz" else "должник"
+                        else:
+                            who = "qarz bergan kishi" if lang == "uz" else "кредитор"
+                    template = "DEBT_REMIND_TO_US" if it.direction == "given" else "DEBT_REMIND_BY_US"
+                    message = T(template, due=due_raw, who=who, amount=amount_text, cur=currency)
+                    try:
+                        await bot.send_message(uid, message)
+                        await DEBT_REMINDERS.mark(uid, debt_id, day, slot_key)
+                    except Exception:
+                        pass
             except Exception:
                 pass
         await asyncio.sleep(5)
@@ -3458,16 +3334,19 @@ async def set_cmds():
 
 # ====== MAIN ======
 async def main():
-    await ensure_payment_schema()
+    await run_migrations()
+    await LEDGER.start()
+    await LEDGER.reset_balances("debt", await DEBTS.open_balances())
     load_cards_storage()
-    load_users_storage()
-    load_debts_archive()
     load_analysis_state()
+    await SNAPSHOTS.start()
     await ensure_month_rollover()
     dp.update.middleware(StartGateMiddleware())
     dp.include_router(reports_range_router)
     dp.include_router(cards_entry_router)
     dp.include_router(debts_archive_router)
+    dp.include_router(import_router)
+    dp.include_router(export_router)
     dp.include_router(sub_router)
     dp.include_router(pay_debug_router)
     dp.include_router(subscription_router)
@@ -3489,7 +3368,16 @@ async def main():
     asyncio.create_task(subscription_reminder_loop())
     asyncio.create_task(daily_reminder())
     asyncio.create_task(debt_reminder())
-    print("Bot ishga tushdi."); await dp.start_polling(bot)
+    asyncio.create_task(payments_log_maintenance())
+    print("Bot ishga tushdi.")
+    try:
+        await dp.start_polling(bot)
+    finally:
+        await SNAPSHOTS.close()
+        await CATEGORY_MEMORY.flush()
+        await LEDGER.close()
+        await WRITES.close()
+        await POOL.close()
 
 @cards_entry_router.message(Command("kartalarim"))
 @cards_entry_router.message(Command("kartam"))
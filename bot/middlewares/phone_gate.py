@@ -1,5 +1,3 @@
-import os
-import sqlite3
 import sys
 from typing import Any, Awaitable, Callable, Dict, Optional
 
@@ -7,6 +5,7 @@ from aiogram import BaseMiddleware
 from aiogram.types import Message
 
 from bot.keyboards_phone import get_phone_keyboard
+from services import repository
 
 WHITELIST_TEXTS = {
     "/start",
@@ -19,20 +18,11 @@ WHITELIST_TEXTS = {
 }
 
 
-def _db():
-    return sqlite3.connect(os.getenv("DB_PATH", "moliya.db"))
-
-
-def _user_has_phone(user_id: int) -> bool:
-    conn = _db(); cur = conn.cursor()
+async def _user_has_phone(user_id: int) -> bool:
     try:
-        cur.execute("SELECT phone FROM users WHERE user_id=?", (user_id,))
-        row = cur.fetchone()
+        return await repository.user_has_phone(user_id)
     except Exception:
-        row = None
-    finally:
-        conn.close()
-    return bool(row and row[0])
+        return False
 
 
 def _current_step(user_id: int) -> Optional[str]:
@@ -66,7 +56,7 @@ class PhoneGateMiddleware(BaseMiddleware):
 
         text = (event.text or "").strip()
 
-        if _user_has_phone(user_id):
+        if await _user_has_phone(user_id):
             state = data.get("state")
             if state:
                 try:
@@ -1,7 +1,4 @@
-import datetime
-import os
 import re
-import sqlite3
 import sys
 from typing import Optional
 
@@ -9,6 +6,7 @@ from aiogram import F, Router
 from aiogram.types import Message, ReplyKeyboardRemove
 
 from bot.keyboards import get_main_menu
+from services import repository
 
 try:  # Optional FSM import; safe on projects without FSM enabled
     from aiogram.fsm.context import FSMContext
@@ -19,31 +17,11 @@ except Exception:  # pragma: no cover
 contact_router = Router(name="contact_router")
 
 
-def _db():
-    """Return shared SQLite connection honoring DB_PATH if provided."""
-    return sqlite3.connect(os.getenv("DB_PATH", "moliya.db"))
-
-
 UZ_PHONE_RE = re.compile(r"^\+?998\d{9}$")
 
 
-def _ensure_user_columns(cur: sqlite3.Cursor) -> None:
-    cols = {row[1] for row in cur.execute("PRAGMA table_info(users)").fetchall()}
-    if "phone" not in cols:
-        cur.execute("ALTER TABLE users ADD COLUMN phone TEXT")
-    if "contact_verified_at" not in cols:
-        cur.execute("ALTER TABLE users ADD COLUMN contact_verified_at TIMESTAMP")
-
-
-def _store_phone(user_id: int, phone: str) -> None:
-    conn = _db(); cur = conn.cursor()
-    _ensure_user_columns(cur)
-    cur.execute("INSERT OR IGNORE INTO users(user_id) VALUES(?)", (user_id,))
-    cur.execute(
-        "UPDATE users SET phone=?, contact_verified_at=? WHERE user_id=?",
-        (phone, datetime.datetime.utcnow(), user_id),
-    )
-    conn.commit(); conn.close()
+async def _store_phone(user_id: int, phone: str) -> None:
+    await repository.store_phone(user_id, phone)
 
 
 def _clean_phone_text(text: str) -> Optional[str]:
@@ -122,7 +100,7 @@ async def on_contact(msg: Message, state: Optional["FSMContext"] = None): # type
         return
 
     phone = _clean_phone_text(contact.phone_number) or contact.phone_number.strip()
-    _store_phone(msg.from_user.id, phone)
+    await _store_phone(msg.from_user.id, phone)
     await _finish_ok(msg, state)
 
 
@@ -131,5 +109,5 @@ async def on_phone_text(msg: Message, state: Optional["FSMContext"] = None): # t
     phone = _clean_phone_text(msg.text)
     if not phone:
         return  # Guard, though predicate should filter mismatches
-    _store_phone(msg.from_user.id, phone)
+    await _store_phone(msg.from_user.id, phone)
     await _finish_ok(msg, state)
@@ -1,20 +1,18 @@
-import os, sqlite3
+import os
 from aiogram import Router, F
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from bot.keyboards import get_main_menu
 from bot.services.payments import create_invoice
 from bot.services.http_client import ping_return
 from bot.services.activate import activate_invoice
+from services import repository
 
 sub_router = Router()
 
-def _db():
-    return sqlite3.connect(os.getenv("DB_PATH", "moliya.db"))
-
 MONTH_PRICE = int(os.getenv("MONTH_PRICE", 19900))
 
 async def show_subscription_plans(message: Message):
-    _, url_m = create_invoice(message.from_user.id, MONTH_PRICE, "month")
+    _, url_m = await create_invoice(message.from_user.id, MONTH_PRICE, "month")
     price_display = f"{MONTH_PRICE:,}".replace(",", " ")
     kb = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text=f"⭐ 1 oylik — {price_display} so'm", url=url_m)],
@@ -24,23 +22,16 @@ async def show_subscription_plans(message: Message):
 
 @sub_router.callback_query(F.data == "pay_check")
 async def pay_check(call: CallbackQuery):
-    conn=_db(); c=conn.cursor()
-    row = c.execute("""
-        SELECT invoice_id, status, amount, plan, created_at
-        FROM payments WHERE user_id=?
-        ORDER BY created_at DESC LIMIT 1
-    """, (call.from_user.id,)).fetchone()
+    row = await repository.latest_payment(call.from_user.id)
 
     if not row:
-        conn.close()
         await call.message.answer("Avval tarif tanlang va to‘lovni boshlang.", reply_markup=get_main_menu())
         await call.answer(); return
 
-    invoice_id, status, amount, plan, _ = row
+    invoice_id, status = row["invoice_id"], row["status"]
 
     # Already active
     if status == "paid":
-        conn.close()
         await call.message.answer("Obuna faollashgan ✅", reply_markup=get_main_menu())
         await call.answer(); return
 
@@ -48,20 +39,16 @@ async def pay_check(call: CallbackQuery):
     ok, _msg, code = await ping_return(invoice_id)
 
     # Re-check in DB
-    row2 = c.execute("SELECT status FROM payments WHERE invoice_id=?", (invoice_id,)).fetchone()
-    if row2 and row2[0] == "paid":
-        conn.close()
+    if await repository.payment_status(invoice_id) == "paid":
         await call.message.answer("Obuna faollashgan ✅", reply_markup=get_main_menu())
         await call.answer(); return
 
     # Optional manual confirm via ENV switch (safety off by default)
     if os.getenv("ALLOW_MANUAL_CONFIRM","").lower() == "true":
-        if activate_invoice(invoice_id):
-            conn.close()
+        if await activate_invoice(invoice_id):
             await call.message.answer("Obuna faollashgan ✅", reply_markup=get_main_menu())
             await call.answer(); return
 
-    conn.close()
     text = "To‘lov hali tasdiqlanmagan."
     if code == 404:
         text += " (Invoice topilmadi — Obuna tugmasidan qayta to‘lov yarating.)"
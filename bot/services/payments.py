@@ -1,27 +1,12 @@
-import os, time, sqlite3
+import os, time
 from urllib.parse import urlencode, quote
 
+from services import repository
 
-def _db():
-    return sqlite3.connect(os.getenv("DB_PATH", "moliya.db"))
 
-
-def create_invoice(user_id: int, amount: int, plan: str) -> tuple[str, str]:
+async def create_invoice(user_id: int, amount: int, plan: str) -> tuple[str, str]:
     inv = f"INV-{user_id}-{int(time.time())}"
-    conn=_db(); c=conn.cursor()
-    c.execute("""CREATE TABLE IF NOT EXISTS payments(
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      user_id BIGINT,
-      invoice_id TEXT UNIQUE,
-      amount INTEGER,
-      plan TEXT,
-      status TEXT DEFAULT 'pending',
-      created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-      paid_at TIMESTAMP
-    )""")
-    c.execute("INSERT OR IGNORE INTO payments(user_id,invoice_id,amount,plan,status) VALUES(?,?,?,?, 'pending')",
-              (user_id, inv, int(amount), plan))
-    conn.commit(); conn.close()
+    await repository.create_invoice_record(user_id, inv, amount, plan)
 
     ret = os.getenv('RETURN_URL', '')
     if ret and 'invoice_id=' not in ret:
@@ -1,8 +1,72 @@
+import asyncio
+import json
+import logging
 import os
+import time
+import zlib
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone, tzinfo
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Sequence, Tuple
 
 import aiosqlite
 
+logger = logging.getLogger(__name__)
+
 DB_PATH = os.getenv("DB_PATH", "moliya.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+DB_WRITE_DELAY_MS = float(os.getenv("DB_WRITE_DELAY_MS", "5"))
+DB_WRITE_BATCH = int(os.getenv("DB_WRITE_BATCH", "100"))
+
+# Barcha vaqt ustunlari CURRENT_TIMESTAMP bilan bir xil shaklda (UTC) saqlanadi,
+# shunda oddiy matn taqqoslash xronologik tartibga teng va indeks ishlaydi.
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def to_db_ts(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).strftime(TS_FORMAT)
+
+
+def from_db_ts(value: Any, tz: tzinfo) -> datetime:
+    raw = str(value or "").strip()
+    try:
+        parsed = datetime.fromisoformat(raw)
+    except Exception:
+        parsed = datetime.now(timezone.utc)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(tz)
+
+
+def now_db_ts() -> str:
+    return to_db_ts(datetime.now(timezone.utc))
+
+
+# payments_logs payloadlari zlib bilan siqilgan JSON ko'rinishida (payload_z) saqlanadi;
+# eski qatorlarda raw_payload matni qolgan bo'lishi mumkin.
+def pack_payload(payload: Any) -> bytes:
+    return zlib.compress(json.dumps(payload, default=str, separators=(",", ":")).encode("utf-8"))
+
+
+def unpack_payload(payload_z: Optional[bytes], raw_payload: Optional[str] = None) -> Any:
+    raw = zlib.decompress(payload_z).decode("utf-8") if payload_z else raw_payload
+    try:
+        return json.loads(raw) if raw else None
+    except Exception:
+        return raw
+
+
+CONNECTION_PRAGMAS = (
+    # WAL fayl sarlavhasini yozishidan oldin: faqat yangi faylda ishlaydi,
+    # bo'shagan sahifalarni payments_logs retention incremental_vacuum bilan qaytaradi
+    "PRAGMA auto_vacuum=INCREMENTAL",
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+)
 
 SCHEMA = """
 PRAGMA journal_mode=WAL;
@@ -26,6 +90,8 @@ CREATE TABLE IF NOT EXISTS transactions(
   user_id INTEGER,
   kind TEXT CHECK(kind IN ('income','expense')) NOT NULL,
   amount INTEGER NOT NULL,
+  currency TEXT DEFAULT 'UZS',
+  account TEXT DEFAULT 'cash',
   category TEXT,
   note TEXT,
   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
@@ -83,6 +149,379 @@ CREATE TABLE IF NOT EXISTS config(
 );
 """
 
+PAYMENTS_TABLE = """
+CREATE TABLE IF NOT EXISTS payments(
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id BIGINT,
+    invoice_id TEXT UNIQUE,
+    amount NUMERIC,
+    currency TEXT,
+    status TEXT DEFAULT 'pending',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    paid_at TIMESTAMP,
+    plan TEXT,
+    provider TEXT,
+    raw_payload TEXT,
+    expires_at TIMESTAMP
+);
+"""
+
+PAYMENTS_LOGS_TABLE = """
+CREATE TABLE IF NOT EXISTS payments_logs(
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    event_type TEXT,
+    raw_payload TEXT,
+    verified BOOLEAN,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+# Oylik yig'indilar: har bir tranzaksiya qo'shilganda/bekor qilinganda ledger shu
+# tranzaksiyaning o'zida yangilaydi.  yyyymm foydalanuvchi vaqt zonasida (Toshkent).
+USER_MONTH_STATS_TABLE = """
+CREATE TABLE IF NOT EXISTS user_month_stats(
+    user_id INTEGER NOT NULL,
+    yyyymm TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    category TEXT NOT NULL DEFAULT '',
+    currency TEXT NOT NULL DEFAULT 'UZS',
+    total INTEGER NOT NULL DEFAULT 0,
+    tx_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY(user_id, yyyymm, kind, category, currency)
+) WITHOUT ROWID;
+"""
+
+# Joriy balanslar: scope='account' -> name hisob (cash/card), scope='debt' -> name
+# yo'nalish (given/mine, ochiq qarz qoldig'i).  Ledger tranzaksiya bilan birga yangilaydi.
+USER_BALANCES_TABLE = """
+CREATE TABLE IF NOT EXISTS user_balances(
+    user_id INTEGER NOT NULL,
+    scope TEXT NOT NULL,
+    name TEXT NOT NULL,
+    currency TEXT NOT NULL DEFAULT 'UZS',
+    amount INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY(user_id, scope, name, currency)
+) WITHOUT ROWID;
+"""
+
+# Qarz eslatmalari: qaysi kun/slotda kimga yuborilgani (restartdan keyin takrorlanmasin).
+# day ISO (YYYY-MM-DD, Toshkent), eski kunlar har slotda tozalanadi.
+DEBT_REMINDERS_SENT_TABLE = """
+CREATE TABLE IF NOT EXISTS debt_reminders_sent(
+    day TEXT NOT NULL,
+    slot TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    debt_id INTEGER NOT NULL,
+    PRIMARY KEY(day, slot, user_id, debt_id)
+) WITHOUT ROWID;
+"""
+
+# Foydalanuvchi tanlagan kategoriyalar: tavsif so'zi -> kategoriya kaliti (food, transport...).
+# used_at (epoch) bo'yicha eng eskisi o'chiriladi (har user uchun chegara bor).
+USER_CATEGORY_MEMORY_TABLE = """
+CREATE TABLE IF NOT EXISTS user_category_memory(
+    user_id INTEGER NOT NULL,
+    token TEXT NOT NULL,
+    category TEXT NOT NULL,
+    used_at INTEGER NOT NULL,
+    PRIMARY KEY(user_id, token)
+) WITHOUT ROWID;
+"""
+
+MANUAL_REQUESTS_TABLE = """
+CREATE TABLE IF NOT EXISTS manual_activation_requests(
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id BIGINT NOT NULL,
+    invoice_id TEXT,
+    last_four TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    admin_chat_id BIGINT,
+    admin_message_id BIGINT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    approved_by BIGINT,
+    approved_at TIMESTAMP,
+    notes TEXT
+);
+"""
+
+
+class ConnectionPool:
+    """Fixed set of long-lived aiosqlite connections shared by the process.
+
+    Connections are opened lazily up to ``size`` and handed out through
+    ``acquire()``; a connection returned with an open transaction is rolled
+    back so the next borrower always starts clean.
+    """
+
+    def __init__(self, path: str, size: int = DB_POOL_SIZE) -> None:
+        self.path = path
+        self.size = max(1, size)
+        self._idle: Optional[asyncio.Queue] = None
+        self._all: List[aiosqlite.Connection] = []
+        self._opening = 0
+
+    async def _open(self) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(self.path)
+        conn.row_factory = aiosqlite.Row
+        for pragma in CONNECTION_PRAGMAS:
+            await conn.execute(pragma)
+        return conn
+
+    async def _checkout(self) -> aiosqlite.Connection:
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+        if self._idle.empty() and len(self._all) + self._opening < self.size:
+            self._opening += 1
+            try:
+                conn = await self._open()
+            finally:
+                self._opening -= 1
+            self._all.append(conn)
+            return conn
+        return await self._idle.get()
+
+    async def _checkin(self, conn: aiosqlite.Connection) -> None:
+        try:
+            if conn.in_transaction:
+                await conn.rollback()
+        except Exception:
+            await self._discard(conn)
+            return
+        assert self._idle is not None
+        self._idle.put_nowait(conn)
+
+    async def _discard(self, conn: aiosqlite.Connection) -> None:
+        if conn in self._all:
+            self._all.remove(conn)
+        try:
+            await conn.close()
+        except Exception:
+            pass
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[aiosqlite.Connection]:
+        conn = await self._checkout()
+        try:
+            yield conn
+        finally:
+            await self._checkin(conn)
+
+    @asynccontextmanager
+    async def connect(self) -> AsyncIterator[aiosqlite.Connection]:
+        """A connection outside the pool, closed on exit.
+
+        For work that changes connection state (ATTACH) or would hold a
+        pooled connection for long.
+        """
+        conn = await self._open()
+        try:
+            yield conn
+        finally:
+            await conn.close()
+
+    async def close(self) -> None:
+        conns, self._all = self._all, []
+        self._idle = None
+        for conn in conns:
+            try:
+                await conn.close()
+            except Exception:
+                pass
+
+
+POOL = ConnectionPool(DB_PATH)
+
+Statement = Tuple[str, Sequence[Any]]
+
+
+class WriteCoalescer:
+    """Group commit for small writes coming from concurrent handlers.
+
+    ``execute()`` queues a write and resolves once the transaction holding it
+    has committed.  Writes arriving back to back are collected for at most
+    ``max_delay`` seconds (or until ``max_batch`` statements are waiting) and
+    committed as one transaction.  If any write
+    in a batch fails, the batch is replayed with one SAVEPOINT per caller so
+    only the offending awaitable is rejected and the rest still commits.
+    ``fetch_one()`` is the same for a write whose result is needed (an
+    ``INSERT ... RETURNING id``); it resolves to the first row returned.
+    """
+
+    def __init__(
+        self,
+        pool: ConnectionPool,
+        max_delay: float = DB_WRITE_DELAY_MS / 1000,
+        max_batch: int = DB_WRITE_BATCH,
+        history: int = 1024,
+    ) -> None:
+        self.pool = pool
+        self.max_delay = max_delay
+        self.max_batch = max(1, max_batch)
+        self._pending: List[Tuple[List[Statement], asyncio.Future, bool]] = []
+        self._pending_statements = 0
+        self._task: Optional[asyncio.Task] = None
+        self._full = asyncio.Event()
+        self._batch_sizes: Deque[int] = deque(maxlen=history)
+        self._commit_ms: Deque[float] = deque(maxlen=history)
+        self._batches = 0
+        self._statements = 0
+        self._failed = 0
+
+    async def execute(self, sql: str, params: Sequence[Any] = ()) -> None:
+        await self.execute_many([(sql, params)])
+
+    async def execute_many(self, statements: List[Statement]) -> None:
+        """Queue ``statements`` as one atomic unit and wait for its commit."""
+        if statements:
+            await self._submit(list(statements), False)
+
+    async def fetch_one(self, sql: str, params: Sequence[Any] = ()) -> Optional[aiosqlite.Row]:
+        """Queue a RETURNING write and return its first row once committed."""
+        return await self._submit([(sql, params)], True)
+
+    async def _submit(self, statements: List[Statement], fetch: bool) -> Any:
+        fut = asyncio.get_running_loop().create_future()
+        self._pending.append((statements, fut, fetch))
+        self._pending_statements += len(statements)
+        if self._task is None or self._task.done():
+            self._full = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        elif self._pending_statements >= self.max_batch:
+            self._full.set()
+        return await fut
+
+    async def _gather_window(self) -> None:
+        # Collect writers for up to max_delay after the first one, or until
+        # max_batch statements are waiting.
+        if self._pending_statements >= self.max_batch:
+            return
+        self._full.clear()
+        try:
+            await asyncio.wait_for(self._full.wait(), self.max_delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self) -> None:
+        while self._pending:
+            await self._gather_window()
+            batch, self._pending = self._pending[: self.max_batch], self._pending[self.max_batch:]
+            self._pending_statements = sum(len(stmts) for stmts, _, _ in self._pending)
+            await self._commit(batch)
+
+    @staticmethod
+    async def _run_one(db: aiosqlite.Connection, statements: List[Statement], fetch: bool) -> Any:
+        cur = None
+        for sql, params in statements:
+            cur = await db.execute(sql, params)
+        return await cur.fetchone() if fetch and cur is not None else None
+
+    async def _apply_fast(
+        self, db: aiosqlite.Connection, batch: List[Tuple[List[Statement], asyncio.Future, bool]]
+    ) -> List[Any]:
+        # Consecutive single-statement writes with the same SQL go through one executemany().
+        results: List[Any] = [None] * len(batch)
+        run_sql: Optional[str] = None
+        run_params: List[Sequence[Any]] = []
+        for idx, (statements, _, fetch) in enumerate(batch):
+            if not fetch and len(statements) == 1 and statements[0][0] == run_sql:
+                run_params.append(statements[0][1])
+                continue
+            if run_params:
+                await db.executemany(run_sql, run_params)
+                run_sql, run_params = None, []
+            if not fetch and len(statements) == 1:
+                run_sql, run_params = statements[0][0], [statements[0][1]]
+                continue
+            results[idx] = await self._run_one(db, statements, fetch)
+        if run_params:
+            await db.executemany(run_sql, run_params)
+        return results
+
+    async def _apply_isolated(
+        self, db: aiosqlite.Connection, batch: List[Tuple[List[Statement], asyncio.Future, bool]]
+    ) -> Tuple[List[Any], List[Optional[BaseException]]]:
+        rows: List[Any] = []
+        errors: List[Optional[BaseException]] = []
+        for idx, (statements, _, fetch) in enumerate(batch):
+            await db.execute(f"SAVEPOINT w{idx}")
+            try:
+                rows.append(await self._run_one(db, statements, fetch))
+            except Exception as exc:
+                await db.execute(f"ROLLBACK TO w{idx}")
+                rows.append(None)
+                errors.append(exc)
+            else:
+                errors.append(None)
+            await db.execute(f"RELEASE w{idx}")
+        return rows, errors
+
+    async def _commit(self, batch: List[Tuple[List[Statement], asyncio.Future, bool]]) -> None:
+        started = time.perf_counter()
+        errors: List[Optional[BaseException]] = [None] * len(batch)
+        try:
+            async with self.pool.acquire() as db:
+                await db.execute("BEGIN")
+                try:
+                    rows = await self._apply_fast(db, batch)
+                except Exception:
+                    # Someone's write is bad: redo the batch with a savepoint per
+                    # caller so only that caller sees the error.
+                    await db.rollback()
+                    await db.execute("BEGIN")
+                    rows, errors = await self._apply_isolated(db, batch)
+                await db.commit()
+        except Exception as exc:
+            self._failed += len(batch)
+            logger.warning("write-batch-failed", extra={"size": len(batch), "error": str(exc)})
+            for _, fut, _ in batch:
+                if not fut.done():
+                    fut.set_exception(exc)
+            return
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        size = sum(len(stmts) for stmts, _, _ in batch)
+        self._batches += 1
+        self._statements += size
+        self._batch_sizes.append(size)
+        self._commit_ms.append(elapsed_ms)
+        for (_, fut, _), row, error in zip(batch, rows, errors):
+            if fut.done():
+                continue
+            if error is None:
+                fut.set_result(row)
+            else:
+                self._failed += 1
+                fut.set_exception(error)
+
+    def metrics(self) -> Dict[str, float]:
+        """Batch size and commit latency over the recent ``history`` batches."""
+        sizes = sorted(self._batch_sizes)
+        latencies = sorted(self._commit_ms)
+
+        def pct(values: List[float], q: float) -> float:
+            return float(values[min(len(values) - 1, int(len(values) * q))]) if values else 0.0
+
+        return {
+            "batches": self._batches,
+            "statements": self._statements,
+            "failed": self._failed,
+            "batch_avg": (sum(sizes) / len(sizes)) if sizes else 0.0,
+            "batch_max": float(sizes[-1]) if sizes else 0.0,
+            "commit_ms_p50": pct(latencies, 0.5),
+            "commit_ms_p95": pct(latencies, 0.95),
+            "commit_ms_max": latencies[-1] if latencies else 0.0,
+        }
+
+    async def close(self) -> None:
+        if self._task is not None:
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._batches:
+            logger.info("write-coalescer-stats", extra=self.metrics())
+
+
+WRITES = WriteCoalescer(POOL)
+
+
 async def connect():
     db = await aiosqlite.connect(DB_PATH)
     db.row_factory = aiosqlite.Row
@@ -91,55 +530,331 @@ async def connect():
     await db.commit()
     return db
 
-async def _migrate_add_columns(db):
-    async def ensure_col(table, col, ddl):
-        # PRAGMA bilan mavjud ustunlarni tekshiramiz
-        cur = await db.execute(f"PRAGMA table_info({table})")
-        cols = [r["name"] for r in await cur.fetchall()]
-        if col not in cols:
-            # ✅ MUHIM TUZATISH: ustun nomini ham qo'shamiz
-            await db.execute(f"ALTER TABLE {table} ADD COLUMN {col} {ddl}")
+async def _ensure_col(db, table, col, ddl):
+    # PRAGMA bilan mavjud ustunlarni tekshiramiz
+    cur = await db.execute(f"PRAGMA table_info({table})")
+    cols = [r["name"] for r in await cur.fetchall()]
+    if col not in cols:
+        # ✅ MUHIM TUZATISH: ustun nomini ham qo'shamiz
+        await db.execute(f"ALTER TABLE {table} ADD COLUMN {col} {ddl}")
 
+async def _migrate_add_columns(db):
     # users
-    await ensure_col("users", "seen_example", "INTEGER DEFAULT 0")
-    await ensure_col("users", "trial_used", "INTEGER DEFAULT 0")
-    await ensure_col("users", "remind_time", "TEXT DEFAULT '20:00'")
-    await ensure_col("users", "activated", "INTEGER DEFAULT 0")
-    await ensure_col("users", "sub_started_at", "TIMESTAMP")
-    await ensure_col("users", "sub_until", "TIMESTAMP")
-    await ensure_col("users", "sub_reminder_sent", "INTEGER DEFAULT 0")
+    await _ensure_col(db, "users", "seen_example", "INTEGER DEFAULT 0")
+    await _ensure_col(db, "users", "trial_used", "INTEGER DEFAULT 0")
+    await _ensure_col(db, "users", "remind_time", "TEXT DEFAULT '20:00'")
+    await _ensure_col(db, "users", "activated", "INTEGER DEFAULT 0")
+    await _ensure_col(db, "users", "sub_started_at", "TIMESTAMP")
+    await _ensure_col(db, "users", "sub_until", "TIMESTAMP")
+    await _ensure_col(db, "users", "sub_reminder_sent", "INTEGER DEFAULT 0")
+
+    # transactions
+    await _ensure_col(db, "transactions", "currency", "TEXT DEFAULT 'UZS'")
+    await _ensure_col(db, "transactions", "account", "TEXT DEFAULT 'cash'")
 
     # debts
-    await ensure_col("debts", "due_morning_ping", "INTEGER DEFAULT 0")
-    await ensure_col("debts", "due_evening_ping", "INTEGER DEFAULT 0")
-    await ensure_col("debts", "created_at", "TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
+    await _ensure_col(db, "debts", "due_morning_ping", "INTEGER DEFAULT 0")
+    await _ensure_col(db, "debts", "due_evening_ping", "INTEGER DEFAULT 0")
+    await _ensure_col(db, "debts", "created_at", "TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
+
+# ---- MIGRATIONS ----
+# Har bir migratsiya bir marta, o'z tranzaksiyasida ishlaydi va schema_version
+# jadvaliga yoziladi.  Yangi o'zgarishlar faqat ro'yxat oxiriga qo'shiladi.
+
+def _script_statements(script: str) -> List[str]:
+    # executescript() COMMIT qilib yuboradi, shuning uchun skriptni bo'lib bajaramiz;
+    # journal_mode tranzaksiya ichida o'zgarmaydi (uni pool o'rnatadi).
+    out = []
+    for stmt in script.split(";"):
+        stmt = stmt.strip()
+        if stmt and not stmt.upper().startswith("PRAGMA"):
+            out.append(stmt)
+    return out
+
+async def _m001_base_schema(db):
+    for stmt in _script_statements(SCHEMA):
+        await db.execute(stmt)
+
+async def _m002_legacy_columns(db):
+    await _migrate_add_columns(db)
+
+async def _m003_payments(db):
+    await db.execute(PAYMENTS_TABLE)
+    await db.execute(PAYMENTS_LOGS_TABLE)
+    await db.execute(MANUAL_REQUESTS_TABLE)
+    await _ensure_col(db, "payments", "plan", "TEXT")
+    await _ensure_col(db, "payments", "provider", "TEXT")
+    await _ensure_col(db, "payments", "raw_payload", "TEXT")
+    await _ensure_col(db, "payments", "expires_at", "TIMESTAMP")
+
+# (jadval, ustun) — 004 migratsiyasi TS_FORMAT ga keltiradi
+TIMESTAMP_COLUMNS = (
+    ("transactions", "created_at"),
+    ("debts", "created_at"),
+    ("subs", "start_at"),
+    ("subs", "end_at"),
+    ("payments", "created_at"),
+    ("payments", "paid_at"),
+    ("payments_logs", "created_at"),
+)
+
+INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_transactions_user_created ON transactions(user_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_payments_user_created ON payments(user_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_payments_status_created ON payments(status, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_subs_user_status_end ON subs(user_id, status, end_at)",
+    "CREATE INDEX IF NOT EXISTS idx_debts_done_due ON debts(done, due_date)",
+)
+
+async def _m004_timestamps_and_indexes(db):
+    # ISO qiymatlar (T ajratuvchi, +05:00 kabi offset) SQLite strftime orqali UTC ga o'tadi;
+    # tanib bo'lmaydiganlari o'zgarishsiz qoladi.
+    for table, col in TIMESTAMP_COLUMNS:
+        await db.execute(
+            f"UPDATE {table} SET {col} = strftime('%Y-%m-%d %H:%M:%S', {col}) "
+            f"WHERE {col} IS NOT NULL AND strftime('%Y-%m-%d %H:%M:%S', {col}) IS NOT NULL "
+            f"AND {col} <> strftime('%Y-%m-%d %H:%M:%S', {col})"
+        )
+    await db.execute(
+        "UPDATE debts SET due_date = substr(due_date, 7, 4) || '-' || substr(due_date, 4, 2) || '-' || substr(due_date, 1, 2) "
+        "WHERE due_date GLOB '[0-9][0-9].[0-9][0-9].[0-9][0-9][0-9][0-9]'"
+    )
+    await db.execute(
+        "UPDATE debts SET due_date = date(due_date) "
+        "WHERE due_date IS NOT NULL AND date(due_date) IS NOT NULL AND due_date <> date(due_date)"
+    )
+    for stmt in INDEXES:
+        await db.execute(stmt)
+
+# Eski bot profillarni shu faylda saqlardi; 005 migratsiyasi ularni users jadvaliga ko'chiradi.
+LEGACY_USERS_FILE = os.getenv("USERS_JSON_PATH", "users.json")
+
+PROFILE_COLUMNS = (
+    ("username", "TEXT"),
+    ("first_name", "TEXT"),
+    ("last_name", "TEXT"),
+    ("contact_verified_at", "TEXT"),
+    ("activated_at", "TEXT"),
+    ("expense_limit", "INTEGER"),
+    ("expense_limit_start", "TEXT"),
+    ("expense_limit_notified", "INTEGER DEFAULT 0"),
+    ("created_at", "TIMESTAMP"),
+    ("updated_at", "TIMESTAMP"),
+)
+
+PAYMENTS_LOG_COMPRESS_BATCH = 5000
+LEGACY_DEBTS_ARCHIVE_FILE = os.getenv("DEBTS_ARCHIVE_JSON_PATH", "debts_archive.json")
+
+def _load_legacy_json(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+async def _m005_user_profiles(db):
+    for col, ddl in PROFILE_COLUMNS:
+        await _ensure_col(db, "users", col, ddl)
+    fields = ("name", "phone", "lang") + tuple(col for col, _ in PROFILE_COLUMNS)
+    for key, profile in _load_legacy_json(LEGACY_USERS_FILE).items():
+        try:
+            uid = int(key)
+        except Exception:
+            continue
+        if not isinstance(profile, dict):
+            continue
+        values = {col: profile[col] for col in fields if profile.get(col) is not None}
+        values.setdefault("created_at", now_db_ts())
+        cols = list(values)
+        await db.execute(
+            f"INSERT INTO users(user_id, {', '.join(cols)}) VALUES(?{', ?' * len(cols)}) "
+            f"ON CONFLICT(user_id) DO UPDATE SET "
+            + ", ".join(f"{col}=COALESCE(excluded.{col}, users.{col})" for col in cols),
+            (uid, *values.values()),
+        )
+
+def _legacy_ts(value) -> Optional[str]:
+    try:
+        return to_db_ts(datetime.fromisoformat(str(value)))
+    except Exception:
+        return None
+
+async def _m006_debts_archive(db):
+    await _ensure_col(db, "debts_archive", "paid", "INTEGER DEFAULT 0")
+    await _ensure_col(db, "debts_archive", "created_at", "TIMESTAMP")
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_debts_archive_user_id ON debts_archive(user_id, id)"
+    )
+    data = _load_legacy_json(LEGACY_DEBTS_ARCHIVE_FILE)
+    items = data.get("items") if isinstance(data.get("items"), dict) else {}
+    for key, entries in items.items():
+        try:
+            uid = int(key)
+        except Exception:
+            continue
+        for it in entries if isinstance(entries, list) else []:
+            if not isinstance(it, dict):
+                continue
+            await db.execute(
+                "INSERT INTO debts_archive(debt_id, user_id, direction, amount, paid, currency, "
+                "counterparty, due_date, status, created_at, archived_at) "
+                "VALUES(?,?,?,?,?,?,?,?,?,?,COALESCE(?, CURRENT_TIMESTAMP))",
+                (
+                    it.get("id"), uid, it.get("direction"), it.get("amount"), it.get("paid"),
+                    it.get("currency"), it.get("counterparty"), it.get("due"), it.get("status"),
+                    _legacy_ts(it.get("ts")), _legacy_ts(it.get("archived_at")),
+                ),
+            )
+
+async def _m007_payments_logs_compression(db):
+    await _ensure_col(db, "payments_logs", "payload_z", "BLOB")
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_payments_logs_created ON payments_logs(created_at)"
+    )
+    # id bo'yicha sahifalab: jadval xotiraga to'liq olinmaydi, yozish qulfi har
+    # partiyadan keyin bo'shaydi; to'xtab qolsa keyingi ishga tushishda davom etadi
+    last_id = 0
+    while True:
+        cur = await db.execute(
+            "SELECT id, raw_payload FROM payments_logs "
+            "WHERE id > ? AND raw_payload IS NOT NULL AND payload_z IS NULL ORDER BY id LIMIT ?",
+            (last_id, PAYMENTS_LOG_COMPRESS_BATCH),
+        )
+        rows = await cur.fetchall()
+        if not rows:
+            break
+        last_id = rows[-1]["id"]
+        await db.executemany(
+            "UPDATE payments_logs SET payload_z=?, raw_payload=NULL WHERE id=?",
+            [(zlib.compress(row["raw_payload"].encode("utf-8")), row["id"]) for row in rows],
+        )
+        await db.commit()
+        await db.execute("BEGIN IMMEDIATE")
+
+async def _m008_user_month_stats(db):
+    # to'ldirish Ledger.start() da (vaqt zonasini ledger biladi)
+    await db.execute(USER_MONTH_STATS_TABLE)
+
+async def _m009_user_balances(db):
+    await db.execute(USER_BALANCES_TABLE)
+    # hisob balanslari tarixdan; qarzlar Ledger ishga tushganda qayta yoziladi
+    await db.execute(
+        "INSERT OR IGNORE INTO user_balances(user_id, scope, name, currency, amount) "
+        "SELECT user_id, 'account', COALESCE(account, 'cash'), COALESCE(currency, 'UZS'), "
+        "SUM(CASE WHEN kind='income' THEN amount ELSE -amount END) "
+        "FROM transactions GROUP BY 1, 3, 4"
+    )
+
+async def _m010_debt_reminders_sent(db):
+    await db.execute(DEBT_REMINDERS_SENT_TABLE)
+
+async def _m011_durable_debts(db):
+    # MEM_DEBTS o'rniga: bot qarzlari shu jadvalda (mine -> 'taken')
+    await _ensure_col(db, "debts", "currency", "TEXT DEFAULT 'UZS'")
+    await _ensure_col(db, "debts", "paid", "INTEGER DEFAULT 0")
+    await _ensure_col(db, "debts", "status", "TEXT DEFAULT 'wait'")
+    await db.execute(
+        "UPDATE debts SET status = CASE direction WHEN 'taken' THEN 'paid' ELSE 'received' END "
+        "WHERE done=1 AND status='wait'"
+    )
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_debts_user_direction_status ON debts(user_id, direction, status)"
+    )
+
+async def _m012_user_category_memory(db):
+    await db.execute(USER_CATEGORY_MEMORY_TABLE)
+
+async def _m013_debts_archive_formats(db):
+    # arxiv ham debts kabi: 'mine' -> 'taken', DD.MM.YYYY -> YYYY-MM-DD
+    await db.execute("UPDATE debts_archive SET direction='taken' WHERE direction='mine'")
+    await db.execute(
+        "UPDATE debts_archive SET due_date=substr(due_date, 7, 4)||'-'||substr(due_date, 4, 2)||'-'||substr(due_date, 1, 2) "
+        "WHERE due_date GLOB '[0-9][0-9].[0-9][0-9].[0-9][0-9][0-9][0-9]'"
+    )
+
+MIGRATIONS: List[Tuple[int, str, Callable[[aiosqlite.Connection], Awaitable[None]]]] = [
+    (1, "base_schema", _m001_base_schema),
+    (2, "legacy_columns", _m002_legacy_columns),
+    (3, "payments", _m003_payments),
+    (4, "timestamps_and_indexes", _m004_timestamps_and_indexes),
+    (5, "user_profiles", _m005_user_profiles),
+    (6, "debts_archive", _m006_debts_archive),
+    (7, "payments_logs_compression", _m007_payments_logs_compression),
+    (8, "user_month_stats", _m008_user_month_stats),
+    (9, "user_balances", _m009_user_balances),
+    (10, "debt_reminders_sent", _m010_debt_reminders_sent),
+    (11, "durable_debts", _m011_durable_debts),
+    (12, "user_category_memory", _m012_user_category_memory),
+    (13, "debts_archive_formats", _m013_debts_archive_formats),
+]
+
+async def _schema_version(db) -> int:
+    cur = await db.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    row = await cur.fetchone()
+    return int(row[0] or 0)
+
+async def run_migrations(pool: Optional[ConnectionPool] = None) -> int:
+    """Apply pending MIGRATIONS in order and return the resulting version.
+
+    ``BEGIN IMMEDIATE`` serialises the bot and web processes: whoever gets
+    the write lock first migrates, the other re-reads the version and skips.
+    """
+    pool = pool or POOL
+    async with pool.acquire() as db:
+        await db.execute(
+            "CREATE TABLE IF NOT EXISTS schema_version("
+            "version INTEGER PRIMARY KEY, name TEXT NOT NULL, "
+            "applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+        )
+        await db.commit()
+        current = await _schema_version(db)
+        for version, name, apply in MIGRATIONS:
+            if version <= current:
+                continue
+            await db.execute("BEGIN IMMEDIATE")
+            try:
+                latest = await _schema_version(db)
+                if latest >= version:
+                    await db.rollback()
+                    current = latest
+                    continue
+                await apply(db)
+                await db.execute(
+                    "INSERT INTO schema_version(version, name) VALUES(?, ?)", (version, name)
+                )
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+            current = version
+        return current
 
 # USERS
-async def upsert_user(db, user_id:int, **kw):
-    await db.execute("INSERT INTO users(user_id) VALUES(?) ON CONFLICT(user_id) DO NOTHING", (user_id,))
+async def upsert_user(user_id:int, **kw):
+    statements = [("INSERT INTO users(user_id) VALUES(?) ON CONFLICT(user_id) DO NOTHING", (user_id,))]
     if kw:
         fields = ", ".join([f"{k}=?" for k in kw.keys()])
-        await db.execute(f"UPDATE users SET {fields} WHERE user_id=?", [*kw.values(), user_id])
-    await db.commit()
+        statements.append((f"UPDATE users SET {fields} WHERE user_id=?", [*kw.values(), user_id]))
+    await WRITES.execute_many(statements)
 
 async def get_user(db, user_id:int):
     cur = await db.execute("SELECT * FROM users WHERE user_id=?", (user_id,))
     return await cur.fetchone()
 
 # TX
-async def add_tx(db, user_id:int, kind:str, amount:int, category:str, note:str):
-    await db.execute(
+async def add_tx(user_id:int, kind:str, amount:int, category:str, note:str):
+    await WRITES.execute(
         "INSERT INTO transactions(user_id, kind, amount, category, note) VALUES(?,?,?,?,?)",
         (user_id, kind, amount, category, note)
     )
-    await db.commit()
 
 async def stats(db, user_id:int, since=None):
     q = "SELECT kind, SUM(amount) s FROM transactions WHERE user_id=?"
     params = [user_id]
     if since:
-        q += " AND datetime(created_at) >= datetime(?)"
-        params.append(since)
+        q += " AND created_at >= ?"
+        params.append(to_db_ts(since) if isinstance(since, datetime) else since)
     q += " GROUP BY kind"
     cur = await db.execute(q, params)
     data = {"income":0, "expense":0}
@@ -150,41 +865,40 @@ async def stats(db, user_id:int, since=None):
 async def list_report(db, user_id:int, delta_days:int):
     cur = await db.execute(
         "SELECT date(created_at) d, kind, category, amount FROM transactions "
-        "WHERE user_id=? AND datetime(created_at) >= datetime('now', ? || ' days') "
+        "WHERE user_id=? AND created_at >= datetime('now', ? || ' days') "
         "ORDER BY created_at DESC",
         (user_id, -delta_days)
     )
     return await cur.fetchall()
 
 # DEBTS
-async def add_debt(db, user_id:int, direction:str, amount:int, due_date:str, counterparty:str=None):
-    await db.execute(
+async def add_debt(user_id:int, direction:str, amount:int, due_date:str, counterparty:str=None):
+    await WRITES.execute(
         "INSERT INTO debts(user_id, direction, amount, due_date, counterparty) VALUES(?,?,?,?,?)",
         (user_id, direction, amount, due_date, counterparty)
     )
-    await db.commit()
 
 async def debts_due_today_morning(db):
     cur = await db.execute(
-        "SELECT * FROM debts WHERE done=0 AND date(due_date)=date('now') AND due_morning_ping=0"
+        "SELECT * FROM debts WHERE done=0 AND due_date=date('now') AND due_morning_ping=0"
     )
     return await cur.fetchall()
 
 async def debts_due_today_evening(db):
     cur = await db.execute(
-        "SELECT * FROM debts WHERE done=0 AND date(due_date)=date('now') AND due_evening_ping=0"
+        "SELECT * FROM debts WHERE done=0 AND due_date=date('now') AND due_evening_ping=0"
     )
     return await cur.fetchall()
 
-async def mark_debt_ping(db, debt_id:int, which:str):
+async def mark_debt_ping(debt_id:int, which:str):
     col = "due_morning_ping" if which=="morning" else "due_evening_ping"
-    await db.execute(f"UPDATE debts SET {col}=1 WHERE id=?", (debt_id,))
-    await db.commit()
+    await WRITES.execute(f"UPDATE debts SET {col}=1 WHERE id=?", (debt_id,))
 
 # SUBS
 async def create_sub(db, user_id:int, plan:str, pay_id:str, provider:str, start_at:str, end_at:str):
     await db.execute(
-        "INSERT INTO subs(user_id, plan, status, pay_id, provider, start_at, end_at) VALUES(?,?,?,?,?,?,?)",
+        "INSERT INTO subs(user_id, plan, status, pay_id, provider, start_at, end_at) "
+        "VALUES(?,?,?,?,?,strftime('%Y-%m-%d %H:%M:%S', ?),strftime('%Y-%m-%d %H:%M:%S', ?))",
         (user_id, plan, "pending", pay_id, provider, start_at, end_at)
     )
     await db.commit()
@@ -195,7 +909,7 @@ async def activate_sub(db, pay_id:str):
 
 async def current_sub(db, user_id:int):
     cur = await db.execute(
-        "SELECT * FROM subs WHERE user_id=? AND status='active' AND datetime(end_at) >= datetime('now') ORDER BY end_at DESC LIMIT 1",
+        "SELECT * FROM subs WHERE user_id=? AND status='active' AND end_at >= datetime('now') ORDER BY end_at DESC LIMIT 1",
         (user_id,)
     )
     return await cur.fetchone()
@@ -0,0 +1 @@
+"""MoliyaUz code that runs without the bot: no aiogram, database or environment settings."""
@@ -0,0 +1,70 @@
+"""Parsing of free-text finance messages ("taksi 25k karta", "qarz berdim Aliga 1,5 mln 15.09").
+
+Pure Python on the standard library: importing it does not create a bot,
+read the environment or open the database, so benchmarks, statement
+imports and tests can load it on their own (and in worker processes).
+
+* ``entry`` - ``EntryParser``: amount, currency, account, due date,
+  counterparty and keyword hints in one pass;
+* ``keywords`` - ``KeywordMatcher``, the keyword automaton it uses;
+* ``hints`` - the kind/category keyword tables and category labels;
+* ``classify`` - ``guess_kind``, ``guess_category``, ``parse_amount`` and
+  the other per-entry helpers over one shared parser;
+* ``split`` - cutting a message into entries.
+"""
+from moliya.parsing.classify import (
+    DUE_FORMAT,
+    ENTRY_PARSER,
+    TASHKENT,
+    category_key,
+    category_label,
+    detect_account,
+    detect_currency,
+    entry_hints,
+    guess_category,
+    guess_kind,
+    parse_amount,
+    parse_counterparty,
+    parse_debt,
+    parse_due_date,
+    parse_entry,
+    today_tk,
+)
+from moliya.parsing.entry import MONTHS_UZ, PARSER_HINTS, UNITS, EntryParser, ParsedEntry, parse_number
+from moliya.parsing.hints import CATEGORY_HINTS, CATEGORY_LABELS, KIND_HINTS, MEMORY_STOPWORDS
+from moliya.parsing.keywords import KeywordMatcher
+from moliya.parsing.split import attach_debt_due, extract_due_prefix, message_entries, split_tx_entries
+
+__all__ = [
+    "CATEGORY_HINTS",
+    "CATEGORY_LABELS",
+    "DUE_FORMAT",
+    "ENTRY_PARSER",
+    "KIND_HINTS",
+    "MEMORY_STOPWORDS",
+    "MONTHS_UZ",
+    "PARSER_HINTS",
+    "TASHKENT",
+    "UNITS",
+    "EntryParser",
+    "KeywordMatcher",
+    "ParsedEntry",
+    "attach_debt_due",
+    "category_key",
+    "category_label",
+    "detect_account",
+    "detect_currency",
+    "entry_hints",
+    "extract_due_prefix",
+    "guess_category",
+    "guess_kind",
+    "message_entries",
+    "parse_amount",
+    "parse_counterparty",
+    "parse_debt",
+    "parse_due_date",
+    "parse_entry",
+    "parse_number",
+    "split_tx_entries",
+    "today_tk",
+]
@@ -0,0 +1,120 @@
+"""Entry-level helpers over one shared ``EntryParser``.
+
+Every helper parses through ``ENTRY_PARSER``, so asking a segment for its
+kind, amount, currency and category costs one parse.  Relative dates
+("ertaga", "15.09") resolve against ``today``, which defaults to the
+current date in Tashkent.
+"""
+from datetime import date, datetime
+from typing import FrozenSet, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from moliya.parsing.entry import EntryParser, ParsedEntry
+from moliya.parsing.hints import CATEGORY_HINTS, CATEGORY_LABELS, KIND_HINTS
+
+TASHKENT = ZoneInfo("Asia/Tashkent")
+DUE_FORMAT = "%d.%m.%Y"
+
+# kind, category, currency, account and due-date words in one automaton
+ENTRY_PARSER = EntryParser({**KIND_HINTS, **{f"cat:{key}": hints for key, hints in CATEGORY_HINTS.items()}})
+
+
+def today_tk() -> date:
+    return datetime.now(TASHKENT).date()
+
+
+def parse_entry(text: str, today: Optional[date] = None) -> ParsedEntry:
+    """Amount, currency, account, due date, counterparty and keyword hints in one pass (cached per text)."""
+    return ENTRY_PARSER.parse(text, today or today_tk())
+
+
+def parse_amount(text: str) -> Optional[int]:
+    return parse_entry(text).amount
+
+
+def detect_currency(text: str) -> str:
+    return parse_entry(text).currency
+
+
+def detect_account(text: str) -> str:
+    return parse_entry(text).account
+
+
+def parse_counterparty(text: str) -> str:
+    return parse_entry(text).counterparty
+
+
+def parse_due_date(text: str, today: Optional[date] = None) -> Optional[str]:
+    """Due date as ``DD.MM.YYYY`` ("ertaga", "15.09", "2025-09-15", "15 sentabr")."""
+    due = parse_entry(text, today).due
+    return due.strftime(DUE_FORMAT) if due else None
+
+
+def entry_hints(text: str) -> FrozenSet[str]:
+    """Kind and category keyword groups found in ``text`` (one scan)."""
+    return parse_entry(text).hints
+
+
+def guess_kind(text: str, hints: Optional[FrozenSet[str]] = None) -> str:
+    t = (text or "").lower()
+    h = entry_hints(text) if hints is None else hints
+    if "debt_given" in h:
+        return "debt_given"
+    if "debt_mine" in h:
+        return "debt_mine"
+    if "avans" in h:
+        if "avans_income" in h:
+            return "income"
+        if "avans_expense" in h:
+            return "expense"
+    if "purchase" in h:
+        return "expense"
+    if "expense" in h:
+        return "expense"
+    if "income" in h:
+        return "income"
+    if "oldim" in h and "oldim_income" in h:
+        return "income"
+    if "oldim" in h:
+        return "expense"
+    if t.strip().startswith("+"):
+        return "income"
+    if t.strip().startswith("-"):
+        return "expense"
+    return "expense"
+
+
+def category_key(text: str, hints: Optional[FrozenSet[str]] = None) -> str:
+    """First ``CATEGORY_HINTS`` key with a keyword in ``text``, else ``"other"``."""
+    found = entry_hints(text) if hints is None else hints
+    for key in CATEGORY_HINTS:
+        if f"cat:{key}" in found:
+            return key
+    return "other"
+
+
+def category_label(key: str, lang: str = "uz") -> str:
+    labels = CATEGORY_LABELS.get(key, CATEGORY_LABELS["other"])
+    return labels.get(lang, labels.get("uz"))
+
+
+def guess_category(text: str, lang: str = "uz", hints: Optional[FrozenSet[str]] = None) -> str:
+    return category_label(category_key(text, hints), lang)
+
+
+def parse_debt(text: str, today: Optional[date] = None) -> Optional[Tuple[str, int, str, Optional[str]]]:
+    """``(direction, amount, counterparty, due)`` for a debt entry, ``None`` otherwise.
+
+    "qarz berdim Temurga 150k 15.09" -> ("given", 150000, "Temur", "15.09.2025");
+    direction is ``given`` or ``mine`` as on ``DebtRecord``.
+    """
+    parsed = parse_entry(text, today)
+    kind = guess_kind(text, parsed.hints)
+    if kind not in ("debt_given", "debt_mine") or not parsed.amount:
+        return None
+    return (
+        "given" if kind == "debt_given" else "mine",
+        parsed.amount,
+        parsed.counterparty,
+        parsed.due.strftime(DUE_FORMAT) if parsed.due else None,
+    )
@@ -0,0 +1,168 @@
+"""One-pass parsing of a free-text entry ("taksi 25k karta", "qarz berdim Aliga 1,5 mln 15.09").
+
+The text is lowercased once and then read by two compiled scans:
+
+* ``KeywordMatcher`` finds every keyword group (the caller's kind/category
+  hints plus currency, card and relative-date words);
+* ``TOKEN_RE`` walks the text left to right and yields typed tokens:
+  numbers with a unit (``300k``, ``15 ming``, ``1,5 mln``), dates
+  (``15.09``, ``15.09.2025``, ``2025-09-15``, ``15 sentabr``), plain numbers
+  (``1 200 000``, ``1.200.000``, ``25000``) and counterparty words
+  (``Akadan``, ``Aliga``).
+
+The result is a ``ParsedEntry``; ``EntryParser.parse`` keeps the last few
+hundred results so a segment that is classified, checked for a due date
+and then saved is only parsed once.
+
+Number rules:
+- With a unit, one ``.``/``,`` is a decimal point.
+- Without a unit, separators in front of 3-digit groups are thousands.
+- Otherwise a single separator is a decimal point (the fraction is
+  dropped).
+- When both ``.`` and ``,`` appear, the last one is the decimal point.
+- Amount precedence is the first million-scaled number, then the first
+  thousand-scaled number, then the first plain number, and only then a
+  date-shaped token read as a number ("kofe 3.50 usd").
+"""
+import re
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Dict, FrozenSet, Iterable, List, Mapping, NamedTuple, Optional, Tuple
+
+from moliya.parsing.keywords import KeywordMatcher
+
+MONTHS_UZ = {
+    "yanvar": 1, "fevral": 2, "mart": 3, "aprel": 4, "may": 5, "iyun": 6, "iyul": 7, "avgust": 8,
+    "sentabr": 9, "sentyabr": 9, "oktabr": 10, "noyabr": 11, "dekabr": 12,
+}
+UNITS = {"mln": 1_000_000, "million": 1_000_000, "млн": 1_000_000,
+         "ming": 1_000, "min": 1_000, "тыс": 1_000, "k": 1_000}
+
+PARSER_HINTS: Dict[str, List[str]] = {
+    "cur:USD": ["$", "usd", "dollar", "доллар"],
+    "cur:EUR": ["eur", "€"],
+    "acc:card": ["karta", "plastik", "card", "visa", "master", "uzcard", "humo", "bank", "карта", "карты",
+                 "с карты", "банковская"],
+    "due:tomorrow": ["ertaga", "завтра"],
+    "due:today": ["bugun", "сегодня"],
+}
+
+_LETTERS = "[a-zA-Z\u0400-\u04FF‘'ʼ`-]"
+_GROUPED = r"\d{1,3}(?:[ \u00a0]\d{3})+"
+TOKEN_RE = re.compile(
+    rf"\b(?P<scaled>{_GROUPED}|\d+(?:[.,]\d+)?)\s*(?P<unit>{'|'.join(sorted(UNITS, key=len, reverse=True))})\b"
+    r"|\b(?P<iso>\d{4})-(?P<iso_m>\d{2})-(?P<iso_d>\d{2})\b"
+    r"|\b(?P<d>\d{1,2})[.\-/](?P<m>\d{1,2})(?:[.\-/](?P<y>\d{2,4}))?\b"
+    rf"|\b(?P<md>\d{{1,2}})\s*[- ]\s*(?P<month>{'|'.join(sorted(MONTHS_UZ, key=len, reverse=True))})\b"
+    rf"|\b(?P<number>{_GROUPED}(?!\d)|\d+(?:[.,]\d+)*)"
+    rf"|\b(?P<dan>{_LETTERS}+)dan\b"
+    rf"|\b(?P<to>{_LETTERS}+)(?:\s+(?P<rel>akaga|opaga|ukaga|singlimga|брате|сестре))?\s*(?:ga|qa|га|ке)\b"
+)
+THOUSANDS_RE = re.compile(r"\d{1,3}(?:([.,])\d{3})(?:\1\d{3})*")
+
+
+class ParsedEntry(NamedTuple):
+    amount: Optional[int]
+    currency: str
+    account: str
+    due: Optional[date]
+    counterparty: str
+    hints: FrozenSet[str]
+
+
+def _decimal(raw: str) -> float:
+    last = max(raw.rfind("."), raw.rfind(","))
+    if last < 0:
+        return float(raw)
+    return float(re.sub(r"[.,]", "", raw[:last]) + "." + raw[last + 1:])
+
+
+def parse_number(raw: str, unit: Optional[str] = None) -> int:
+    """Deterministic value of a number token (see the module docstring)."""
+    s = raw.replace(" ", "").replace("\u00a0", "")
+    if unit:
+        return round(_decimal(s) * UNITS[unit])
+    if THOUSANDS_RE.fullmatch(s):
+        return int(re.sub(r"[.,]", "", s))
+    if "." in s and "," in s or s.count(".") + s.count(",") == 1:
+        return int(_decimal(s))
+    return int(re.sub(r"[.,]", "", s))
+
+
+def _date(year: int, month: int, day: int) -> Optional[date]:
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def _name(word: str) -> str:
+    return word.replace("‘", "'").replace("ʼ", "'").capitalize()
+
+
+class EntryParser:
+    def __init__(self, groups: Mapping[str, Iterable[str]] = (), cache_size: int = 512) -> None:
+        self.matcher = KeywordMatcher({**dict(groups), **PARSER_HINTS})
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, date], ParsedEntry]" = OrderedDict()
+
+    def parse(self, text: str, today: date) -> ParsedEntry:
+        key = (text or "", today)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return cached
+        parsed = self._parse(key[0], today)
+        self._cache[key] = parsed
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return parsed
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def _parse(self, text: str, today: date) -> ParsedEntry:
+        t = text.lower().replace("–", "-")
+        hints = self.matcher.hits(t)
+        millions = thousands = plain = date_number = None
+        due = None
+        dan = to = None
+        for m in TOKEN_RE.finditer(t):
+            if m.group("unit"):
+                value = parse_number(m.group("scaled"), m.group("unit"))
+                if UNITS[m.group("unit")] >= 1_000_000:
+                    millions = value if millions is None else millions
+                elif thousands is None:
+                    thousands = value
+            elif m.group("iso"):
+                due = due or _date(int(m.group("iso")), int(m.group("iso_m")), int(m.group("iso_d")))
+            elif m.group("d"):
+                yy = m.group("y")
+                year = (int(yy) + 2000 if int(yy) < 100 else int(yy)) if yy else today.year
+                due = due or _date(year, int(m.group("m")), int(m.group("d")))
+                if date_number is None:
+                    date_number = parse_number(f"{m.group('d')}.{m.group('m')}")
+            elif m.group("md"):
+                due = due or _date(today.year, MONTHS_UZ[m.group("month")], int(m.group("md")))
+            elif m.group("number"):
+                if plain is None:
+                    plain = parse_number(m.group("number"))
+            elif m.group("dan"):
+                dan = dan or _name(m.group("dan"))
+            elif m.group("to") and to is None:
+                rel = m.group("rel")
+                to = (_name(m.group("to")) + (f" {rel}" if rel else "")).strip().capitalize()
+        if "due:tomorrow" in hints:
+            due = today + timedelta(days=1)
+        elif "due:today" in hints:
+            due = today
+        amount = next((v for v in (millions, thousands, plain, date_number) if v is not None), None)
+        currency = "USD" if "cur:USD" in hints else "EUR" if "cur:EUR" in hints else "UZS"
+        return ParsedEntry(
+            amount,
+            currency,
+            "card" if "acc:card" in hints else "cash",
+            due,
+            dan or to or "—",
+            hints,
+        )
@@ -0,0 +1,104 @@
+"""Keyword tables behind ``guess_kind`` and ``guess_category``.
+
+``KIND_HINTS`` groups are checked in ``guess_kind``'s priority order and
+``CATEGORY_HINTS`` in dict order; ``CATEGORY_LABELS`` holds the label shown
+(and stored) for each category key in both languages.
+"""
+from moliya.parsing.entry import MONTHS_UZ, PARSER_HINTS, UNITS
+
+# group order follows guess_kind's priority
+KIND_HINTS = {
+    "debt_given": ["qarz berdim","qarzga berdim","qarz ber"],
+    "debt_mine": ["qarz oldim","qarzga oldim","qarz ol"],
+    "avans": ["avans"],
+    "avans_income": ["oldim","olindi","keldi","tushdi","berishdi","berildi"],
+    "avans_expense": ["to'ladim","tuladim","toladim","berdim","qaytardim","qaytardik"],
+    "purchase": ["sotib oldim","сотиб олдим","kiyim oldim"],
+    "expense": [
+        "chiqim","xarajat","rashod","расход","расходы","трата","траты","potrat","потратил","потратила","потратим",
+        "oplati","оплатил","оплатила","оплата","оплатить","zaplat","заплатил","заплатила","заплатить",
+        "kup","купил","купила","покупк","купить","приобрёл","приобрела","списан","списали","снял","сняла",
+        "taksi","taxi","uber","bolt","yandex taxi","yandextaxi","cab","benzin","ovqat","продукт","еда","пища","корм",
+        "kafe","restoran","ресторан","фастфуд","кафе","кофе","coffee","market","supermarket","магазин","маркет","супермаркет",
+        "kommunal","komunal","коммунал","svet","электр","газ","свет","вода","internet","интернет","wifi",
+        "telefon","телефон","связь","ijara","аренда","arenda","ipoteka","ипотека",
+        "kiyim","одежда","dress","oyoq kiyim","обувь","botinka","sumka","сумка","shop","magazin","bozor","магаз",
+        "dorixona","apteka","lek","лекар","dori","medicine","аптека","врач","больница"
+    ],
+    "income": [
+        "kirim","кирим","oylik","maosh","маош","maosh","keldi","tushdi","келди","тушди","stipendiya","premiya","bonus","dividend",
+        "dohod","доход","доходы","дохода","дoход","daxod","pribil","pribyl","прибыль","zarplata","зарплата","зарплату","зарплаты",
+        "zarabotok","заработок","заработал","заработала","получил","получила","получили","пришло","пришла","пришли",
+        "зачислили","выдали","поступил","поступило","поступили","возврат","вернули","продал","продали","продажа"
+    ],
+    "oldim": ["oldim"],
+    "oldim_income": ["pul","oylik","maosh","bonus","premiya"],
+}
+
+CATEGORY_HINTS = {
+    "transport": [
+        "taksi","taxi","uber","bolt","yandex","yo‘l","yol","benzin","fuel","авто","машина","такси","метро","автобус",
+        "транспорт","tramvay","marshrut","parking","parkov"
+    ],
+    "food": [
+        "ovqat","kafe","restoran","non","taom","fastfood","osh","shashlik","coffee","lunch","breakfast","dinner",
+        "еда","кафе","ресторан","фастфуд","пицца","бургер","stolovaya","cafeteria"
+    ],
+    "utilities": [
+        "kommunal","komunal","svet","gaz","suv","электр","коммунал","свет","газ","вода","kvitan","квитан",
+        "electric","heating","тепл"
+    ],
+    "communication": [
+        "internet","интернет","wifi","telefon","телефон","связь","uzmobile","beeline","ucell","megafon","mob","sim"
+    ],
+    "housing": [
+        "ijara","kvartira","arenda","ipoteka","аренда","ипотека","квартира","дом","жильё","komnata"
+    ],
+    "health": [
+        "dorixona","shifokor","apteka","dori","аптека","врач","лекар","medicine","hospital","больница","klinika","clinic",
+        "dentist","стомат"
+    ],
+    "shopping": [
+        "magazin","market","supermarket","магазин","маркет","супермаркет","shop","store","bozor","рынок","kiyim","одежда",
+        "sumka","сумка","butik","аксессуар","techno","electronics","электроник"
+    ],
+    "entertainment": [
+        "kino","film","театр","concert","концерт","клуб","game","игра","Netflix","spotify","театр","park","аттракцион",
+        "музей","спортзал","fitness","spa","kinoteatr"
+    ],
+    "education": [
+        "kurs","dars","lesson","университет","школа","лект","training","education","edu","курс","семинар"
+    ],
+    "pets": ["it","dog","собака","mushuk","cat","кот","кошка","pet","живот","корм для"]
+}
+
+CATEGORY_LABELS = {
+    "transport": {"uz": "🚌 Transport", "ru": "🚌 Транспорт"},
+    "food": {"uz": "🍔 Oziq-ovqat", "ru": "🍔 Питание"},
+    "utilities": {"uz": "💡 Kommunal", "ru": "💡 Коммунальные"},
+    "communication": {"uz": "📱 Aloqa", "ru": "📱 Связь"},
+    "housing": {"uz": "🏠 Uy-ijara", "ru": "🏠 Жильё"},
+    "health": {"uz": "💊 Sog‘liq", "ru": "💊 Здоровье"},
+    "shopping": {"uz": "🛍 Savdo", "ru": "🛍 Покупки"},
+    "entertainment": {"uz": "🎉 Ko‘ngilochar", "ru": "🎉 Развлечения"},
+    "education": {"uz": "📚 Ta’lim", "ru": "📚 Обучение"},
+    "pets": {"uz": "🐾 Uy hayvoni", "ru": "🐾 Домашние питомцы"},
+    "other": {"uz": "🧾 Boshqa xarajatlar", "ru": "🧾 Прочие расходы"},
+}
+
+# never learned by the per-user category memory: verbs, currency/account/date and filler words
+MEMORY_STOPWORDS = {
+    word
+    for phrases in (
+        *(KIND_HINTS[g] for g in ("debt_given", "debt_mine", "avans", "avans_income", "avans_expense",
+                                   "purchase", "income", "oldim")),
+        *PARSER_HINTS.values(), UNITS, MONTHS_UZ,
+        ["chiqim", "xarajat", "rashod", "расход", "трата", "траты", "потратил", "потратила", "оплатил",
+         "оплатила", "оплата", "заплатил", "заплатила", "купил", "купила", "списали", "снял", "сняла",
+         "potratil", "potratila", "oplatil", "zaplatil", "kupil", "kupila",
+         "uchun", "учун", "kecha", "кеча", "naqd", "naxt", "so'm", "som", "sum", "сум", "сўм", "для",
+         "вчера", "наличные", "pul", "пул"],
+    )
+    for phrase in phrases
+    for word in phrase.lower().split()
+}
@@ -0,0 +1,52 @@
+"""Find which keyword groups occur in a text with one regex scan.
+
+The keywords of all groups are merged into a trie and compiled into a
+single regex, so each text position costs one walk down the trie rather
+than one ``in`` test per keyword.  The regex sits inside a lookahead and
+reports the longest keyword starting at every position, which gives
+overlapping hits.  Each keyword also carries the groups of every shorter
+keyword that is its prefix.  Together these make ``hits()`` return exactly
+the groups for which ``any(k in text for k in group)`` is true.
+"""
+import re
+from typing import Dict, FrozenSet, Iterable, Mapping
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        alts = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        # greedy optional: the longer keyword wins when both end here
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    def __init__(self, groups: Mapping[str, Iterable[str]]) -> None:
+        owners: Dict[str, set] = {}
+        for group, words in groups.items():
+            for word in words:
+                if word:
+                    owners.setdefault(word, set()).add(group)
+        self._groups: Dict[str, FrozenSet[str]] = {
+            word: frozenset().union(*(owners[prefix] for prefix in owners if word.startswith(prefix)))
+            for word in owners
+        }
+        self._re = re.compile(f"(?=({_trie_pattern(owners)}))") if owners else None
+
+    def hits(self, text: str) -> FrozenSet[str]:
+        """Groups with at least one keyword in ``text`` (match case as given)."""
+        if self._re is None or not text:
+            return frozenset()
+        found = {m.group(1) for m in self._re.finditer(text)}
+        return frozenset().union(*(self._groups[word] for word in found))
@@ -0,0 +1,112 @@
+"""Cutting one chat message into transaction entries.
+
+``split_tx_entries`` cuts between amount tokens that have words, a newline
+or one of ``, ; / |`` between them; ``attach_debt_due`` then gives a debt
+entry back the due date that the cut moved to the head of the next entry.
+"""
+import re
+from datetime import date
+from typing import Optional
+
+from moliya.parsing.classify import guess_kind, parse_due_date, parse_entry
+
+MULTI_AMOUNT_TOKEN_RE = re.compile(
+    r"(?:(?:\d+[.,]?\d*)\s*(?:mln|million|млн|ming|min|тыс|k)\b|\b\d+\b)",
+    re.IGNORECASE,
+)
+MULTI_LETTER_RE = re.compile(r"[A-Za-z\u0400-\u04FF]")
+DUE_WORD_PREFIX_RE = re.compile(
+    r"^(?P<due>(?:bugunlik|bugun|ertalikka|ertaga|indin|today|tomorrow|сегодня|завтра|послезавтра))\b[\s,.:;-]*",
+    re.IGNORECASE,
+)
+DUE_DATE_PREFIX_RE = re.compile(
+    r"^(?P<due>(?:\d{1,2}[./-]\d{1,2}(?:[./-]\d{2,4})?|\d{4}-\d{2}-\d{2}))\b[\s,.:;-]*",
+)
+
+
+def split_tx_entries(text: str) -> list[str]:
+    """Split text into transaction-sized chunks using detected amount tokens."""
+    raw = (text or "").strip()
+    if not raw:
+        return [raw]
+
+    matches = list(MULTI_AMOUNT_TOKEN_RE.finditer(raw))
+    if len(matches) <= 1:
+        return [raw]
+
+    segments: list[str] = []
+    segment_start = 0
+    prev_end = matches[0].end()
+    for match in matches[1:]:
+        between = raw[prev_end:match.start()]
+        has_words = bool(MULTI_LETTER_RE.search(between))
+        has_split_char = any(ch in between for ch in ("\n", ",", ";", "/", "|"))
+        if has_words or has_split_char:
+            segment = raw[segment_start:prev_end].strip()
+            if segment:
+                segments.append(segment)
+            segment_start = prev_end
+        prev_end = match.end()
+
+    last_segment = raw[segment_start:prev_end].strip()
+    if last_segment:
+        segments.append(last_segment)
+
+    tail = raw[prev_end:].strip()
+    if tail:
+        if segments:
+            segments[-1] = f"{segments[-1]} {tail}".strip()
+        else:
+            segments.append(tail)
+
+    return segments or [raw]
+
+
+def extract_due_prefix(text: str, today: Optional[date] = None) -> tuple[str, str]:
+    """Leading due date ("ertaga", "15.09") of ``text`` and the rest, or ("", text)."""
+    raw = (text or "").lstrip()
+    if not raw:
+        return "", text
+    for pattern in (DUE_WORD_PREFIX_RE, DUE_DATE_PREFIX_RE):
+        m_pref = pattern.match(raw)
+        if not m_pref:
+            continue
+        candidate = (m_pref.group("due") or "").strip(" ,.;:-")
+        if not candidate:
+            continue
+        if parse_due_date(candidate, today) is None:
+            continue
+        rest = raw[m_pref.end():].lstrip()
+        return candidate, rest
+    return "", text
+
+
+def attach_debt_due(entries: list[str], today: Optional[date] = None) -> list[str]:
+    """Give a debt entry without a due date the date that starts the next entry.
+
+    ``split_tx_entries`` cuts at every number, so "qarz berdim Aliga 100k
+    15.09" arrives as two entries; the second one is folded back in place.
+    """
+    idx = 0
+    while idx < len(entries):
+        entry = entries[idx]
+        parsed = parse_entry(entry, today)
+        if guess_kind(entry, parsed.hints) in ("debt_mine", "debt_given") and parsed.due is None:
+            attach_idx = idx + 1
+            while attach_idx < len(entries):
+                candidate, remainder = extract_due_prefix(entries[attach_idx], today)
+                if not candidate:
+                    break
+                entry = f"{entry} {candidate}".strip()
+                entries[idx] = entry
+                if remainder:
+                    entries[attach_idx] = remainder
+                    break
+                entries.pop(attach_idx)
+        idx += 1
+    return entries
+
+
+def message_entries(text: str, today: Optional[date] = None) -> list[str]:
+    """Entries of a chat message in the order on_text handles them."""
+    return attach_debt_due([entry.strip() for entry in split_tx_entries(text) if entry.strip()], today)
@@ -8,123 +8,22 @@ from typing import Any, Dict, Optional, Tuple
 
 import aiosqlite
 
-from db import DB_PATH as DEFAULT_DB_PATH
+from db import (
+    DB_PATH as DEFAULT_DB_PATH,
+    POOL,
+    WRITES,
+    pack_payload,
+    to_db_ts,
+)
+from services.user_context import USER_CONTEXT
 
 DB_PATH = os.getenv("DB_PATH", DEFAULT_DB_PATH)
 
-PAYMENTS_TABLE = """
-CREATE TABLE IF NOT EXISTS payments(
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    user_id BIGINT,
-    invoice_id TEXT UNIQUE,
-    amount NUMERIC,
-    currency TEXT,
-    status TEXT DEFAULT 'pending',
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    paid_at TIMESTAMP,
-    plan TEXT,
-    provider TEXT,
-    raw_payload TEXT,
-    expires_at TIMESTAMP
-);
-"""
-
-PAYMENTS_LOGS_TABLE = """
-CREATE TABLE IF NOT EXISTS payments_logs(
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    event_type TEXT,
-    raw_payload TEXT,
-    verified BOOLEAN,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
-"""
-
-MANUAL_REQUESTS_TABLE = """
-CREATE TABLE IF NOT EXISTS manual_activation_requests(
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    user_id BIGINT NOT NULL,
-    invoice_id TEXT,
-    last_four TEXT NOT NULL,
-    status TEXT NOT NULL DEFAULT 'pending',
-    admin_chat_id BIGINT,
-    admin_message_id BIGINT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    approved_by BIGINT,
-    approved_at TIMESTAMP,
-    notes TEXT
-);
-"""
-
 PLAN_BY_AMOUNT: Dict[Decimal, Tuple[str, int]] = {
     Decimal("19900"): ("sub_month", 30),
 }
 
-_schema_ready = False
-
-
-async def ensure_schema() -> None:
-    global _schema_ready
-    if _schema_ready:
-        return
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(PAYMENTS_TABLE)
-        await db.execute(PAYMENTS_LOGS_TABLE)
-        await db.execute(MANUAL_REQUESTS_TABLE)
-        await _ensure_polling_columns(db)
-        await _ensure_user_subscription_columns(db)
-        await db.commit()
-    _schema_ready = True
-
-
 # [SUBSCRIPTION-POLLING-BEGIN]
-async def _ensure_polling_columns(db: aiosqlite.Connection) -> None:
-    cur = await db.execute("PRAGMA table_info(payments)")
-    cols = {row[1] for row in await cur.fetchall()}
-    statements = []
-    if "plan" not in cols:
-        statements.append("ALTER TABLE payments ADD COLUMN plan TEXT")
-    if "provider" not in cols:
-        statements.append("ALTER TABLE payments ADD COLUMN provider TEXT")
-    if "raw_payload" not in cols:
-        statements.append("ALTER TABLE payments ADD COLUMN raw_payload TEXT")
-    if "expires_at" not in cols:
-        statements.append("ALTER TABLE payments ADD COLUMN expires_at TIMESTAMP")
-    for stmt in statements:
-        try:
-            await db.execute(stmt)
-        except Exception:
-            pass
-
-
-async def _ensure_polling_columns_autocommit() -> None:
-    async with aiosqlite.connect(DB_PATH) as db:
-        await _ensure_polling_columns(db)
-        await db.commit()
-
-
-async def _ensure_user_subscription_columns(db: aiosqlite.Connection) -> None:
-    cur = await db.execute("PRAGMA table_info(users)")
-    cols = {row[1] for row in await cur.fetchall()}
-    statements = []
-    if "sub_started_at" not in cols:
-        statements.append("ALTER TABLE users ADD COLUMN sub_started_at TIMESTAMP")
-    if "sub_until" not in cols:
-        statements.append("ALTER TABLE users ADD COLUMN sub_until TIMESTAMP")
-    if "sub_reminder_sent" not in cols:
-        statements.append("ALTER TABLE users ADD COLUMN sub_reminder_sent INTEGER DEFAULT 0")
-    for stmt in statements:
-        try:
-            await db.execute(stmt)
-        except Exception:
-            pass
-
-
-async def _ensure_user_subscription_columns_autocommit() -> None:
-    async with aiosqlite.connect(DB_PATH) as db:
-        await _ensure_user_subscription_columns(db)
-        await db.commit()
-
-
 async def create_polling_payment(
     user_id: int,
     merchant_trans_id: str,
@@ -132,9 +31,7 @@ async def create_polling_payment(
     plan: str,
     currency: str = "UZS",
 ) -> Optional[Dict[str, Any]]:
-    await ensure_schema()
-    await _ensure_polling_columns_autocommit()
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with POOL.acquire() as db:
         await db.execute(
             "INSERT INTO payments(user_id, invoice_id, amount, currency, status, plan, provider, created_at) "
             "VALUES(?,?,?,?, 'pending', ?, 'click', CURRENT_TIMESTAMP)",
@@ -145,13 +42,11 @@ async def create_polling_payment(
 
 
 async def get_recent_pending_payment(user_id: int) -> Optional[Dict[str, Any]]:
-    await ensure_schema()
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with POOL.acquire() as db:
         cur = await db.execute(
             "SELECT * FROM payments WHERE user_id=? AND status='pending' "
-            "AND datetime(created_at) >= datetime('now', '-1 day') "
-            "ORDER BY datetime(created_at) DESC LIMIT 1",
+            "AND created_at >= datetime('now', '-1 day') "
+            "ORDER BY created_at DESC LIMIT 1",
             (user_id,),
         )
         row = await cur.fetchone()
@@ -163,44 +58,50 @@ async def mark_polling_payment_paid(
     payload: Dict[str, Any],
     expires_at_iso: str,
 ) -> Optional[Dict[str, Any]]:
-    await ensure_schema()
-    await _ensure_polling_columns_autocommit()
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    """Move the polled invoice from pending to paid in one conditional UPDATE.
+
+    Concurrent pollers race on ``status='pending'``, as in
+    ``mark_payment_paid``: only the one that gets the row back logs
+    ``click_polling_paid``; the rest read the stored row.
+    """
+    paid_at_dt = datetime.now(timezone.utc)
+    paid_at_iso = paid_at_dt.isoformat()
+    async with POOL.acquire() as db:
         cur = await db.execute(
-            "SELECT * FROM payments WHERE invoice_id=?",
-            (merchant_trans_id,),
-        )
-        row = await cur.fetchone()
-    if not row:
-        await log_callback("click_polling_missing", {"merchant_trans_id": merchant_trans_id}, False)
-        return None
-
-    if row["status"] == "paid":
-        await log_callback("click_polling_already_paid", {"merchant_trans_id": merchant_trans_id}, True)
-        return dict(row)
-
-    paid_at_iso = datetime.now(timezone.utc).isoformat()
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            "UPDATE payments SET status='paid', paid_at=?, provider='click', raw_payload=?, expires_at=? WHERE invoice_id=?",
+            "UPDATE payments SET status='paid', paid_at=?, provider='click', raw_payload=?, expires_at=? "
+            "WHERE invoice_id=? AND status='pending' RETURNING *",
             (
-                paid_at_iso,
+                to_db_ts(paid_at_dt),
                 json.dumps(payload, default=str),
                 expires_at_iso,
                 merchant_trans_id,
             ),
         )
+        row = await cur.fetchone()
         await db.commit()
+        if not row:
+            cur = await db.execute("SELECT * FROM payments WHERE invoice_id=?", (merchant_trans_id,))
+            existing = await cur.fetchone()
+    if not row:
+        if existing is None:
+            await log_callback("click_polling_missing", {"merchant_trans_id": merchant_trans_id}, False)
+        elif existing["status"] == "paid":
+            await log_callback("click_polling_already_paid", {"merchant_trans_id": merchant_trans_id}, True)
+        else:
+            await log_callback(
+                "click_polling_not_pending",
+                {"merchant_trans_id": merchant_trans_id, "status": existing["status"]},
+                False,
+            )
+        return dict(existing) if existing else None
     await log_callback(
         "click_polling_paid",
         {"merchant_trans_id": merchant_trans_id, "payload": payload},
         True,
     )
-    updated = await get_payment_by_invoice(merchant_trans_id)
-    if updated:
-        updated["paid_at"] = paid_at_iso
-        updated["expires_at"] = expires_at_iso
+    updated = dict(row)
+    updated["paid_at"] = paid_at_iso
+    updated["expires_at"] = expires_at_iso
     return updated
 
 
@@ -209,15 +110,13 @@ async def create_manual_activation_request(
     invoice_id: Optional[str],
     last_four: str,
 ) -> Optional[Dict[str, Any]]:
-    await ensure_schema()
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with POOL.acquire() as db:
         await db.execute(
             "INSERT INTO manual_activation_requests(user_id, invoice_id, last_four, status) "
             "VALUES(?, ?, ?, 'pending')",
             (user_id, invoice_id, last_four),
         )
         await db.commit()
-        db.row_factory = aiosqlite.Row
         cur = await db.execute(
             "SELECT * FROM manual_activation_requests WHERE id = last_insert_rowid()"
         )
@@ -230,8 +129,7 @@ async def attach_manual_request_message(
     admin_chat_id: int,
     admin_message_id: int,
 ) -> None:
-    await ensure_schema()
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with POOL.acquire() as db:
         await db.execute(
             "UPDATE manual_activation_requests SET admin_chat_id=?, admin_message_id=? WHERE id=?",
             (admin_chat_id, admin_message_id, request_id),
@@ -240,9 +138,7 @@ async def attach_manual_request_message(
 
 
 async def get_manual_activation_request(request_id: int) -> Optional[Dict[str, Any]]:
-    await ensure_schema()
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with POOL.acquire() as db:
         cur = await db.execute(
             "SELECT * FROM manual_activation_requests WHERE id=?",
             (request_id,),
@@ -258,7 +154,6 @@ async def update_manual_request_status(
     approved_at_iso: Optional[str] = None,
     notification_sent: Optional[bool] = None,
 ) -> Optional[Dict[str, Any]]:
-    await ensure_schema()
     updates = ["status=?"]
     params: list[Any] = [status]
     if approved_by is not None:
@@ -271,13 +166,12 @@ async def update_manual_request_status(
         updates.append("notes=?")
         params.append("notified" if notification_sent else "")
     params.append(request_id)
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with POOL.acquire() as db:
         await db.execute(
             f"UPDATE manual_activation_requests SET {', '.join(updates)} WHERE id=?",
             params,
         )
         await db.commit()
-        db.row_factory = aiosqlite.Row
         cur = await db.execute(
             "SELECT * FROM manual_activation_requests WHERE id=?",
             (request_id,),
@@ -294,7 +188,6 @@ async def create_invoice(
     currency: str,
     plan_key: Optional[str] = None,
 ) -> str:
-    await ensure_schema()
     base = f"INV-{user_id}-{int(time.time())}"
     invoice_id = base
     attempt = 0
@@ -305,7 +198,7 @@ async def create_invoice(
             plan_code = plan[0]
     while True:
         try:
-            async with aiosqlite.connect(DB_PATH) as db:
+            async with POOL.acquire() as db:
                 await db.execute(
                     "INSERT INTO payments(user_id, invoice_id, amount, currency, status, created_at, plan) "
                     "VALUES(?,?,?,?, 'pending', CURRENT_TIMESTAMP, ?)",
@@ -323,19 +216,14 @@ async def create_invoice(
 
 
 async def log_callback(event_type: str, payload: Dict[str, Any], verified: bool=False) -> None:
-    await ensure_schema()
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            "INSERT INTO payments_logs(event_type, raw_payload, verified) VALUES(?, ?, ?)",
-            (event_type, json.dumps(payload, default=str), int(verified)),
-        )
-        await db.commit()
+    await WRITES.execute(
+        "INSERT INTO payments_logs(event_type, payload_z, verified) VALUES(?, ?, ?)",
+        (event_type, pack_payload(payload), int(verified)),
+    )
 
 
 async def get_payment_by_invoice(invoice_id: str) -> Optional[Dict[str, Any]]:
-    await ensure_schema()
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with POOL.acquire() as db:
         cur = await db.execute(
             "SELECT * FROM payments WHERE invoice_id=?", (invoice_id,)
         )
@@ -346,12 +234,10 @@ async def get_payment_by_invoice(invoice_id: str) -> Optional[Dict[str, Any]]:
 
 
 async def get_latest_payment(user_id: int) -> Optional[Dict[str, Any]]:
-    await ensure_schema()
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with POOL.acquire() as db:
         cur = await db.execute(
             "SELECT * FROM payments WHERE user_id=? AND status IN ('pending','paid') "
-            "ORDER BY datetime(created_at) DESC LIMIT 1",
+            "ORDER BY created_at DESC LIMIT 1",
             (user_id,),
         )
         row = await cur.fetchone()
@@ -361,119 +247,120 @@ async def get_latest_payment(user_id: int) -> Optional[Dict[str, Any]]:
 
 
 async def mark_payment_paid(invoice_id: str) -> Optional[Dict[str, Any]]:
-    await ensure_schema()
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    """Move ``invoice_id`` from pending to paid and activate its subscription.
+
+    The conditional UPDATE is the state transition: of several concurrent
+    callers (Click complete, /payments/return, the bot's ping) exactly one
+    gets the row back and activates, in the same transaction, with
+    ``activated=True`` in the result.  The others, and calls for an invoice
+    that is already paid, get the stored record with ``activated=False``.
+    """
+    paid_at_dt = datetime.now(timezone.utc)
+    paid_at = paid_at_dt.isoformat()
+    async with POOL.acquire() as db:
+        await db.execute("BEGIN IMMEDIATE")
+        try:
+            cur = await db.execute(
+                "UPDATE payments SET status='paid', paid_at=? "
+                "WHERE invoice_id=? AND status='pending' RETURNING *",
+                (to_db_ts(paid_at_dt), invoice_id),
+            )
+            row = await cur.fetchone()
+            if not row:
+                await db.rollback()
+                return await _paid_record(db, invoice_id)
+            record = dict(row)
+            plan = PLAN_BY_AMOUNT.get(Decimal(str(record.get("amount", "0"))))
+            if plan:
+                start_iso, end_iso = await _record_subscription(
+                    db, record["user_id"], invoice_id, plan[0], plan[1], paid_at
+                )
+                await _apply_user_subscription(db, record["user_id"], start_iso, end_iso)
+                record["sub_start"] = start_iso
+                record["sub_end"] = end_iso
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+    if plan:
+        USER_CONTEXT.invalidate(record["user_id"])
+    record["paid_at"] = paid_at
+    record["activated"] = True
+    return record
+
+
+async def _paid_record(db: aiosqlite.Connection, invoice_id: str) -> Optional[Dict[str, Any]]:
+    cur = await db.execute("SELECT * FROM payments WHERE invoice_id=?", (invoice_id,))
+    row = await cur.fetchone()
+    if not row:
+        return None
+    record = dict(row)
+    record["activated"] = False
+    if record.get("status") == "paid":
         cur = await db.execute(
-            "SELECT * FROM payments WHERE invoice_id=?",
-            (invoice_id,),
-        )
-        row = await cur.fetchone()
-        if not row:
-            return None
-        if row["status"] == "paid":
-            return dict(row)
-        paid_at = datetime.now(timezone.utc).isoformat()
-        await db.execute(
-            "UPDATE payments SET status='paid', paid_at=? WHERE invoice_id=?",
-            (paid_at, invoice_id),
+            "SELECT start_at, end_at FROM subs WHERE pay_id=? AND status='active'", (invoice_id,)
         )
-        await db.commit()
-    updated = await get_payment_by_invoice(invoice_id)
-    if updated:
-        amount = Decimal(str(updated.get("amount", "0")))
-        plan = PLAN_BY_AMOUNT.get(amount)
-        if plan:
-            start_iso, end_iso = await _record_subscription(
-                updated["user_id"], invoice_id, plan[0], plan[1], paid_at
-            )
-            await update_user_subscription_fields(updated["user_id"], start_iso, end_iso)
-            updated["sub_start"] = start_iso
-            updated["sub_end"] = end_iso
-    return updated
+        sub = await cur.fetchone()
+        if sub:
+            record["sub_start"] = datetime.fromisoformat(sub["start_at"]).replace(tzinfo=timezone.utc).isoformat()
+            record["sub_end"] = datetime.fromisoformat(sub["end_at"]).replace(tzinfo=timezone.utc).isoformat()
+    return record
 
 
-async def _record_subscription(user_id: int, invoice_id: str, plan_key: str, days: int, paid_at_iso: str) -> Tuple[str, str]:
+async def _record_subscription(
+    db: aiosqlite.Connection, user_id: int, invoice_id: str, plan_key: str, days: int, paid_at_iso: str
+) -> Tuple[str, str]:
     start_dt = datetime.fromisoformat(paid_at_iso)
     if start_dt.tzinfo is None:
         start_dt = start_dt.replace(tzinfo=timezone.utc)
     else:
         start_dt = start_dt.astimezone(timezone.utc)
     end_dt = start_dt + timedelta(days=days)
-    start_iso = start_dt.isoformat()
-    end_iso = end_dt.isoformat()
-    async with aiosqlite.connect(DB_PATH) as db:
+    cur = await db.execute(
+        "UPDATE subs SET plan=?, status='active', provider=?, start_at=?, end_at=? WHERE pay_id=?",
+        (plan_key, "click", to_db_ts(start_dt), to_db_ts(end_dt), invoice_id),
+    )
+    if not cur.rowcount:
         await db.execute(
-            "UPDATE subs SET plan=?, status='active', provider=?, start_at=?, end_at=? WHERE pay_id=?",
-            (plan_key, "click", start_iso, end_iso, invoice_id),
+            "INSERT INTO subs(user_id, plan, status, pay_id, provider, start_at, end_at) VALUES(?,?,?,?,?,?,?)",
+            (user_id, plan_key, "active", invoice_id, "click", to_db_ts(start_dt), to_db_ts(end_dt)),
         )
-        cur = await db.execute("SELECT id FROM subs WHERE pay_id=?", (invoice_id,))
-        row = await cur.fetchone()
-        if not row:
-            await db.execute(
-                "INSERT INTO subs(user_id, plan, status, pay_id, provider, start_at, end_at) VALUES(?,?,?,?,?,?,?)",
-                (
-                    user_id,
-                    plan_key,
-                    "active",
-                    invoice_id,
-                    "click",
-                    start_iso,
-                    end_iso,
-                ),
-            )
-        await db.commit()
-    return start_iso, end_iso
+    return start_dt.isoformat(), end_dt.isoformat()
 
 
 def detect_plan(amount: Decimal) -> Optional[Tuple[str, int]]:
     return PLAN_BY_AMOUNT.get(amount)
 
 
+async def _apply_user_subscription(db: aiosqlite.Connection, user_id: int, start_iso: str, end_iso: str) -> None:
+    await db.execute(
+        "INSERT INTO users(user_id, sub_started_at, sub_until, sub_reminder_sent, activated, trial_used) "
+        "VALUES(?, ?, ?, 0, 1, 1) ON CONFLICT(user_id) DO UPDATE SET "
+        "sub_started_at=excluded.sub_started_at, sub_until=excluded.sub_until, "
+        "sub_reminder_sent=0, activated=1, trial_used=1",
+        (user_id, start_iso, end_iso),
+    )
+
+
 async def update_user_subscription_fields(user_id: int, start_iso: str, end_iso: str) -> None:
-    await _ensure_user_subscription_columns_autocommit()
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            "INSERT INTO users(user_id) VALUES(?) ON CONFLICT(user_id) DO NOTHING",
-            (user_id,),
-        )
-        cur = await db.execute("PRAGMA table_info(users)")
-        cols = {row[1] for row in await cur.fetchall()}
-        if "sub_reminder_sent" in cols:
-            reminder_sql = "sub_reminder_sent=0"
-        elif "sub_reminder_sent_date" in cols:
-            reminder_sql = "sub_reminder_sent_date=NULL"
-        else:
-            reminder_sql = None
-        set_parts = ["sub_started_at=?", "sub_until=?"]
-        params = [start_iso, end_iso]
-        if reminder_sql:
-            set_parts.append(reminder_sql)
-        if "activated" in cols:
-            set_parts.append("activated=1")
-        if "trial_used" in cols:
-            set_parts.append("trial_used=1")
-        sql = f"UPDATE users SET {', '.join(set_parts)} WHERE user_id=?"
-        params.append(user_id)
-        await db.execute(sql, params)
+    async with POOL.acquire() as db:
+        await _apply_user_subscription(db, user_id, start_iso, end_iso)
         await db.commit()
+    USER_CONTEXT.invalidate(user_id)
 
 
 async def mark_user_reminder_sent(user_id: int) -> None:
-    await _ensure_user_subscription_columns_autocommit()
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with POOL.acquire() as db:
         await db.execute(
             "UPDATE users SET sub_reminder_sent=1 WHERE user_id=?",
             (user_id,),
         )
         await db.commit()
+    USER_CONTEXT.invalidate(user_id)
 
 
 async def users_for_expiry_reminder(cutoff_iso: str) -> list[Dict[str, Any]]:
-    await ensure_schema()
-    await _ensure_user_subscription_columns_autocommit()
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with POOL.acquire() as db:
         cur = await db.execute(
             "SELECT user_id, sub_until FROM users "
             "WHERE sub_until IS NOT NULL AND (sub_reminder_sent IS NULL OR sub_reminder_sent=0)",
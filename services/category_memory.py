@@ -0,0 +1,160 @@
+"""Per-user memory of the categories a user gives their expenses.
+
+When a user picks (or confirms) a category for an expense, the words of
+its description ("Korzinka 85 000" -> ``korzinka``) are remembered for that
+user in ``user_category_memory``.  ``recall()`` checks the words of a new
+description against the user's map (one dict lookup per word) before the
+keyword heuristics run, so a merchant the user has already filed lands in
+the same category next time.
+
+Each user keeps at most ``per_user`` words and the least recently used one
+is evicted first.  A user's map is loaded once into an LRU of users;
+recency from hits is written back in batches on later ``load()`` calls.
+Writes are group-committed through ``db.WRITES``.
+"""
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+import db as db_module
+from db import ConnectionPool, WriteCoalescer
+
+logger = logging.getLogger(__name__)
+
+WORD_RE = re.compile(r"[^\W\d_]+(?:['‘ʼ`][^\W\d_]+)*")
+# "korzinkada", "aptekaga" -> "korzinka", "apteka"
+SUFFIXES = ("ning", "dagi", "dan", "ga", "da", "ni", "нинг", "даги", "дан", "га", "да", "ни")
+
+
+def _stem(word: str) -> str:
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[: -len(suffix)]
+    return word
+
+
+class CategoryMemory:
+    def __init__(
+        self,
+        pool: Optional[ConnectionPool] = None,
+        stopwords: Iterable[str] = (),
+        per_user: int = 200,
+        cache_users: int = 1024,
+        words_per_entry: int = 3,
+        touch_batch: int = 64,
+        writes: Optional[WriteCoalescer] = None,
+    ) -> None:
+        self.pool = pool or db_module.POOL
+        self.writes = writes or db_module.WRITES
+        self.stopwords = frozenset(w.lower() for w in stopwords)
+        self.per_user = per_user
+        self.cache_users = cache_users
+        self.words_per_entry = words_per_entry
+        self.touch_batch = touch_batch
+        self._cache: "OrderedDict[int, OrderedDict[str, str]]" = OrderedDict()
+        self._touched: Dict[Tuple[int, str], int] = {}
+
+    def tokens(self, text: str) -> List[str]:
+        """Description words worth remembering, in order and without case endings."""
+        out: List[str] = []
+        for word in WORD_RE.findall((text or "").lower()):
+            word = word.replace("‘", "'").replace("ʼ", "'").replace("`", "'")
+            if len(word) < 3 or word in self.stopwords:
+                continue
+            word = _stem(word)
+            if word in out:
+                continue
+            out.append(word)
+            if len(out) >= self.words_per_entry:
+                break
+        return out
+
+    async def load(self, uid: int) -> None:
+        """Make ``uid``'s map available to ``recall()``."""
+        if len(self._touched) >= self.touch_batch:
+            await self.flush()
+        if uid in self._cache:
+            self._cache.move_to_end(uid)
+            return
+        async with self.pool.acquire() as db:
+            cur = await db.execute(
+                "SELECT token, category FROM user_category_memory WHERE user_id=? ORDER BY used_at",
+                (uid,),
+            )
+            rows = await cur.fetchall()
+        self._cache[uid] = OrderedDict((row["token"], row["category"]) for row in rows)
+        while len(self._cache) > self.cache_users:
+            self._cache.popitem(last=False)
+
+    def _match(self, words: Mapping[str, str], text: str) -> Optional[Tuple[str, str]]:
+        for word in self.tokens(text):
+            category = words.get(word)
+            if category is not None:
+                return word, category
+        return None
+
+    def recall(self, uid: int, text: str) -> Optional[str]:
+        """Category key remembered for the first known word of ``text``, if any.
+
+        Only consults maps already brought in by ``load()``.  Event loop only:
+        a hit updates the shared LRU.
+        """
+        words = self._cache.get(uid)
+        if not words:
+            return None
+        hit = self._match(words, text)
+        if hit is None:
+            return None
+        words.move_to_end(hit[0])
+        self._touched[(uid, hit[0])] = int(time.time())
+        return hit[1]
+
+    def snapshot(self, uid: int) -> Dict[str, str]:
+        """Copy of ``uid``'s loaded map for ``recall_in()`` off the event loop."""
+        return dict(self._cache.get(uid) or {})
+
+    def recall_in(self, words: Mapping[str, str], text: str) -> Optional[str]:
+        """``recall()`` against a ``snapshot()``; safe in worker threads, records no recency."""
+        hit = self._match(words, text) if words else None
+        return hit[1] if hit else None
+
+    async def learn(self, uid: int, text: str, category: str) -> None:
+        """Remember ``category`` for the words of ``text``."""
+        words_in = self.tokens(text)
+        if not words_in:
+            return
+        await self.load(uid)
+        words = self._cache[uid]
+        now = int(time.time())
+        for word in words_in:
+            words[word] = category
+            words.move_to_end(word)
+            self._touched.pop((uid, word), None)
+        evicted = []
+        while len(words) > self.per_user:
+            evicted.append(words.popitem(last=False)[0])
+            self._touched.pop((uid, evicted[-1]), None)
+        await self.writes.execute_many(
+            [
+                ("INSERT INTO user_category_memory(user_id, token, category, used_at) VALUES(?,?,?,?) "
+                 "ON CONFLICT(user_id, token) DO UPDATE SET category=excluded.category, used_at=excluded.used_at",
+                 (uid, word, category, now))
+                for word in words_in
+            ]
+            + [("DELETE FROM user_category_memory WHERE user_id=? AND token=?", (uid, word)) for word in evicted]
+        )
+
+    async def flush(self) -> None:
+        """Write back when remembered words were last used."""
+        if not self._touched:
+            return
+        touched, self._touched = self._touched, {}
+        try:
+            await self.writes.execute_many([
+                ("UPDATE user_category_memory SET used_at=? WHERE user_id=? AND token=?", (used_at, uid, word))
+                for (uid, word), used_at in touched.items()
+            ])
+        except Exception as exc:
+            logger.warning("category-memory-flush-failed", extra={"words": len(touched), "error": str(exc)})
@@ -0,0 +1,93 @@
+"""Settled debts, stored in the ``debts_archive`` table.
+
+Archiving is a single INSERT, group-committed through ``db.WRITES`` in the
+same transaction as the caller's status update; listing reads one page newest-first with
+keyset pagination (``id < before_id``) so neither cost depends on how large
+a user's archive has grown.  Directions and due dates are stored the way
+``debts`` stores them (``taken``, ISO dates).
+"""
+from datetime import datetime, timezone, tzinfo
+from typing import Any, List, Optional, Sequence, Tuple
+
+import db as db_module
+from db import ConnectionPool, Statement, WriteCoalescer, from_db_ts, to_db_ts
+from services.debts import BOT_DIRECTION, DB_DIRECTION, due_from_db, due_to_db
+from services.records import ArchivedDebt, DebtRecord, to_epoch
+
+ARCHIVE_COLUMNS = (
+    "id, debt_id, user_id, direction, amount, paid, currency, counterparty, "
+    "due_date, status, created_at, archived_at"
+)
+
+
+class DebtArchive:
+    def __init__(
+        self,
+        pool: Optional[ConnectionPool] = None,
+        tz: tzinfo = timezone.utc,
+        writes: Optional[WriteCoalescer] = None,
+    ) -> None:
+        self.pool = pool or db_module.POOL
+        self.writes = writes or db_module.WRITES
+        self.tz = tz
+
+    def _row_to_item(self, row: Any) -> ArchivedDebt:
+        archived_at = to_epoch(from_db_ts(row["archived_at"], self.tz))
+        return ArchivedDebt(
+            row["id"],
+            archived_at,
+            row["debt_id"],
+            to_epoch(from_db_ts(row["created_at"], self.tz)) if row["created_at"] else archived_at,
+            BOT_DIRECTION.get(row["direction"], row["direction"]),
+            int(row["amount"] or 0),
+            row["currency"],
+            row["counterparty"],
+            due_from_db(row["due_date"]),
+            row["status"],
+            int(row["paid"] or 0),
+        )
+
+    async def add(self, uid: int, debt: DebtRecord, with_statements: Sequence[Statement] = ()) -> datetime:
+        """Archive ``debt`` and return its archive time.
+
+        ``with_statements`` (e.g. ``DebtStore.save_statement(debt)``) commit in
+        the same transaction, so the debt is never settled without its copy.
+        """
+        archived_at = datetime.now(self.tz).replace(microsecond=0)
+        insert = (
+            "INSERT INTO debts_archive(debt_id, user_id, direction, amount, paid, currency, "
+            "counterparty, due_date, status, created_at, archived_at) VALUES(?,?,?,?,?,?,?,?,?,?,?)",
+            (
+                debt.id,
+                uid,
+                DB_DIRECTION.get(debt.direction, debt.direction),
+                debt.amount,
+                debt.paid,
+                debt.currency,
+                debt.counterparty,
+                due_to_db(debt.due),
+                debt.status,
+                to_db_ts(debt.when(timezone.utc)),
+                to_db_ts(archived_at),
+            ),
+        )
+        await self.writes.execute_many([*with_statements, insert])
+        return archived_at
+
+    async def page(
+        self, uid: int, limit: int = 10, before_id: Optional[int] = None
+    ) -> Tuple[List[ArchivedDebt], Optional[int]]:
+        """Newest ``limit`` entries older than ``before_id`` plus the next cursor."""
+        sql = f"SELECT {ARCHIVE_COLUMNS} FROM debts_archive WHERE user_id=?"
+        params: List[Any] = [uid]
+        if before_id is not None:
+            sql += " AND id < ?"
+            params.append(before_id)
+        sql += " ORDER BY id DESC LIMIT ?"
+        params.append(limit + 1)
+        async with self.pool.acquire() as db:
+            cur = await db.execute(sql, params)
+            rows = await cur.fetchall()
+        items = [self._row_to_item(row) for row in rows[:limit]]
+        next_cursor = items[-1].archive_id if len(rows) > limit else None
+        return items, next_cursor
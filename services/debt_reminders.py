@@ -0,0 +1,58 @@
+"""Delivery log for debt reminders.
+
+Which debts are due comes from ``DebtStore.due()`` (an indexed
+``debts(done, due_date)`` range), so each slot only touches debts due
+today or overdue.  ``DebtReminderLog`` persists which (user, debt) pairs
+were already reminded in a given day/slot in ``debt_reminders_sent``, so a
+restart in the middle of the day does not send the same reminder twice.
+Its writes are group-committed through ``db.WRITES``.
+"""
+from datetime import date, datetime
+from typing import Optional, Set, Tuple
+
+import db as db_module
+from db import ConnectionPool, WriteCoalescer
+
+DUE_FORMAT = "%d.%m.%Y"
+
+
+def parse_due(value: Optional[str]) -> Optional[date]:
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, DUE_FORMAT).date()
+    except ValueError:
+        return None
+
+
+class DebtReminderLog:
+    def __init__(
+        self,
+        pool: Optional[ConnectionPool] = None,
+        writes: Optional[WriteCoalescer] = None,
+    ) -> None:
+        self.pool = pool or db_module.POOL
+        self.writes = writes or db_module.WRITES
+
+    async def sent(self, day: str, slot: str) -> Set[Tuple[int, int]]:
+        async with self.pool.acquire() as db:
+            cur = await db.execute(
+                "SELECT user_id, debt_id FROM debt_reminders_sent WHERE day=? AND slot=?",
+                (day, slot),
+            )
+            rows = await cur.fetchall()
+        return {(row["user_id"], row["debt_id"]) for row in rows}
+
+    async def mark(self, uid: int, debt_id: int, day: str, slot: str) -> None:
+        await self.writes.execute(
+            "INSERT OR IGNORE INTO debt_reminders_sent(day, slot, user_id, debt_id) VALUES(?,?,?,?)",
+            (day, slot, uid, debt_id),
+        )
+
+    async def forget(self, uid: int, debt_id: int) -> None:
+        await self.writes.execute(
+            "DELETE FROM debt_reminders_sent WHERE user_id=? AND debt_id=?", (uid, debt_id)
+        )
+
+    async def prune(self, before_day: str) -> None:
+        await self.writes.execute("DELETE FROM debt_reminders_sent WHERE day < ?", (before_day,))
@@ -0,0 +1,144 @@
+"""Open debts, stored in the ``debts`` table.
+
+Every change is group-committed through ``db.WRITES``; reads go through
+``idx_debts_user_direction_status`` (lists) and ``idx_debts_done_due``
+(reminders), so neither depends on how many debts a user has settled.
+Settled debts stay in the table with ``done=1`` next to their
+``debts_archive`` copy; cancelled ones are deleted.
+
+The table only allows ``given``/``taken``; the bot's ``mine`` direction is
+stored as ``taken``.  ``due_date`` is an ISO date in the table and
+``DD.MM.YYYY`` on ``DebtRecord``.
+"""
+from datetime import date, datetime, timezone, tzinfo
+from typing import Any, List, Optional, Tuple
+
+import db as db_module
+from db import ConnectionPool, Statement, WriteCoalescer, from_db_ts, to_db_ts
+from services.debt_reminders import DUE_FORMAT, parse_due
+from services.records import DebtRecord, to_epoch
+
+DEBT_COLUMNS = "id, user_id, direction, amount, paid, currency, counterparty, due_date, status, created_at"
+DB_DIRECTION = {"mine": "taken", "given": "given"}
+BOT_DIRECTION = {"taken": "mine", "given": "given"}
+
+
+def due_to_db(due: Optional[str]) -> Optional[str]:
+    parsed = parse_due(due)
+    return parsed.isoformat() if parsed else (due or None)
+
+
+def due_from_db(value: Optional[str]) -> str:
+    if not value:
+        return ""
+    try:
+        return date.fromisoformat(value).strftime(DUE_FORMAT)
+    except ValueError:
+        return value
+
+
+class DebtStore:
+    def __init__(
+        self,
+        pool: Optional[ConnectionPool] = None,
+        tz: tzinfo = timezone.utc,
+        writes: Optional[WriteCoalescer] = None,
+    ) -> None:
+        self.pool = pool or db_module.POOL
+        self.writes = writes or db_module.WRITES
+        self.tz = tz
+
+    def _row_to_item(self, row: Any) -> DebtRecord:
+        return DebtRecord(
+            row["id"],
+            to_epoch(from_db_ts(row["created_at"], self.tz)) if row["created_at"] else 0,
+            BOT_DIRECTION.get(row["direction"], row["direction"]),
+            int(row["amount"] or 0),
+            row["currency"],
+            row["counterparty"],
+            due_from_db(row["due_date"]),
+            row["status"],
+            int(row["paid"] or 0),
+        )
+
+    async def add(
+        self, uid: int, direction: str, amount: int, currency: str, counterparty: str, due: str,
+    ) -> DebtRecord:
+        created_at = datetime.now(self.tz).replace(microsecond=0)
+        row = await self.writes.fetch_one(
+            "INSERT INTO debts(user_id, direction, amount, paid, currency, counterparty, due_date, "
+            "status, done, created_at) VALUES(?,?,?,0,?,?,?,'wait',0,?) RETURNING id",
+            (uid, DB_DIRECTION[direction], int(amount), currency, counterparty, due_to_db(due),
+             to_db_ts(created_at)),
+        )
+        return DebtRecord(row["id"], to_epoch(created_at), direction, int(amount), currency, counterparty, due)
+
+    async def get(self, uid: int, debt_id: int) -> Optional[DebtRecord]:
+        async with self.pool.acquire() as db:
+            cur = await db.execute(
+                f"SELECT {DEBT_COLUMNS} FROM debts WHERE id=? AND user_id=?", (debt_id, uid)
+            )
+            row = await cur.fetchone()
+        return self._row_to_item(row) if row else None
+
+    async def open(
+        self, uid: int, direction: Optional[str] = None, limit: Optional[int] = None,
+    ) -> List[DebtRecord]:
+        """Unsettled debts, newest first."""
+        sql = f"SELECT {DEBT_COLUMNS} FROM debts WHERE user_id=?"
+        params: List[Any] = [uid]
+        if direction is not None:
+            sql += " AND direction=?"
+            params.append(DB_DIRECTION[direction])
+        sql += " AND status='wait' ORDER BY id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        async with self.pool.acquire() as db:
+            cur = await db.execute(sql, params)
+            rows = await cur.fetchall()
+        return [self._row_to_item(row) for row in rows]
+
+    def save_statement(self, debt: DebtRecord) -> Statement:
+        """The UPDATE behind ``save()``, for callers committing it with other writes."""
+        return (
+            "UPDATE debts SET amount=?, paid=?, status=?, done=? WHERE id=?",
+            (debt.amount, debt.paid, debt.status, int(debt.status != "wait"), debt.id),
+        )
+
+    async def save(self, debt: DebtRecord) -> None:
+        """Write back amount/paid/status; a settled status also sets ``done``."""
+        await self.writes.execute(*self.save_statement(debt))
+
+    async def delete(self, uid: int, debt_id: int) -> Optional[DebtRecord]:
+        row = await self.writes.fetch_one(
+            f"DELETE FROM debts WHERE id=? AND user_id=? AND status='wait' RETURNING {DEBT_COLUMNS}",
+            (debt_id, uid),
+        )
+        return self._row_to_item(row) if row else None
+
+    async def due(self, today: date) -> List[Tuple[int, DebtRecord]]:
+        """(user_id, debt) for open debts due on or before ``today``."""
+        async with self.pool.acquire() as db:
+            cur = await db.execute(
+                f"SELECT {DEBT_COLUMNS} FROM debts WHERE done=0 AND due_date <= ? AND status='wait' "
+                "ORDER BY due_date, id",
+                (today.isoformat(),),
+            )
+            rows = await cur.fetchall()
+        return [(row["user_id"], self._row_to_item(row)) for row in rows]
+
+    async def open_balances(self) -> List[Tuple[int, str, str, int]]:
+        """Outstanding amounts as ``(user_id, direction, currency, amount)`` rows."""
+        async with self.pool.acquire() as db:
+            cur = await db.execute(
+                "SELECT user_id, direction, COALESCE(currency, 'UZS') AS currency, "
+                "SUM(MAX(amount - COALESCE(paid, 0), 0)) AS amount FROM debts "
+                "WHERE done=0 AND status='wait' GROUP BY 1, 2, 3"
+            )
+            rows = await cur.fetchall()
+        return [
+            (row["user_id"], BOT_DIRECTION.get(row["direction"], row["direction"]), row["currency"],
+             int(row["amount"] or 0))
+            for row in rows
+        ]
@@ -0,0 +1,89 @@
+"""Export a user's ledger as CSV or XLSX.
+
+Rows are pulled from ``Ledger.iter_range`` a batch at a time and written
+straight into a ``SpooledTemporaryFile``: small exports stay in memory,
+anything above ``EXPORT_SPOOL_BYTES`` rolls over to disk, so memory use does
+not depend on how much history the user has.  Column names and values match
+what ``services.importer`` recognises, so an exported file can be imported
+back.
+"""
+import csv
+import io
+import os
+import tempfile
+from contextlib import aclosing
+from datetime import datetime, tzinfo
+from typing import Callable, Optional, Sequence, Tuple
+
+from services.ledger import Ledger
+from services.records import TxRecord
+from services.xlsx import XlsxWriter
+
+EXPORT_BATCH = int(os.getenv("EXPORT_BATCH", "500"))
+EXPORT_SPOOL_BYTES = int(os.getenv("EXPORT_SPOOL_BYTES", str(1024 * 1024)))
+EXPORT_FORMATS = ("csv", "xlsx")
+
+
+def _row(item: TxRecord, tz: tzinfo, kind_label: Callable[[str], str]) -> list:
+    return [
+        item.when(tz).strftime("%Y-%m-%d %H:%M:%S"),
+        kind_label(item.kind),
+        item.category,
+        item.amount,
+        item.currency,
+        item.account,
+        item.desc,
+    ]
+
+
+async def export_ledger(
+    ledger: Ledger,
+    uid: int,
+    fmt: str,
+    headers: Sequence[str],
+    kind_label: Callable[[str], str],
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    batch: int = EXPORT_BATCH,
+) -> Tuple["tempfile.SpooledTemporaryFile", int]:
+    """(file rewound to the start, row count); the caller closes the file.
+
+    ``headers`` name the seven columns: date, kind, category, amount,
+    currency, account, note.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"unknown export format: {fmt}")
+    spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES, mode="w+b")
+    count = 0
+    try:
+        if fmt == "csv":
+            # utf-8-sig so Excel opens Cyrillic/Uzbek text correctly
+            text = io.TextIOWrapper(spool, encoding="utf-8-sig", newline="")
+            writer = csv.writer(text)
+            writer.writerow(headers)
+            async with aclosing(ledger.iter_range(uid, since, until, batch)) as batches:
+                async for items in batches:
+                    writer.writerows(_row(item, ledger.tz, kind_label) for item in items)
+                    count += len(items)
+            text.flush()
+            text.detach()
+        else:
+            sheet = XlsxWriter(spool, sheet_name="MoliyaUz")
+            sheet.write_row(headers)
+            async with aclosing(ledger.iter_range(uid, since, until, batch)) as batches:
+                async for items in batches:
+                    for item in items:
+                        sheet.write_row(_row(item, ledger.tz, kind_label))
+                    count += len(items)
+            sheet.close()
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool, count
+
+
+def export_filename(fmt: str, since: Optional[datetime], until: Optional[datetime]) -> str:
+    start = since.strftime("%Y%m%d") if since else "all"
+    end = until.strftime("%Y%m%d") if until else "now"
+    return f"moliyauz_{start}-{end}.{fmt}"
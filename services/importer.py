@@ -0,0 +1,228 @@
+"""Bulk import of transaction history from CSV/XLSX statements.
+
+The file is read one row at a time in a worker thread: the header row is
+located, each data row becomes a ``StatementRow`` and is handed to the
+caller's ``classify`` (the bot passes its amount/kind/category parsers).
+Classified rows are written ``chunk_size`` at a time through
+``Ledger.import_history`` (one transaction per chunk), so neither the file
+nor the result is ever held in memory as a whole and the event loop keeps
+serving other users between chunks.
+"""
+import asyncio
+import csv
+import os
+import re
+import time
+from datetime import datetime, tzinfo
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from services.ledger import Ledger
+from services.xlsx import iter_xlsx_rows
+
+IMPORT_CHUNK = int(os.getenv("IMPORT_CHUNK", "2000"))
+IMPORT_PROGRESS_INTERVAL = float(os.getenv("IMPORT_PROGRESS_INTERVAL", "2.0"))
+IMPORT_EXTENSIONS = (".csv", ".xlsx")
+# rows scanned for a header before giving up
+HEADER_SCAN_ROWS = 30
+
+HEADER_ALIASES: Dict[str, Tuple[str, ...]] = {
+    "date": ("date", "sana", "дата", "datetime", "time", "vaqt", "дата операции", "operation date", "sana/vaqt"),
+    "amount": ("amount", "summa", "sum", "сумма", "miqdor", "сумма операции"),
+    "debit": ("debit", "дебет", "chiqim", "расход", "expense", "списание"),
+    "credit": ("credit", "кредит", "kirim", "приход", "income", "поступление", "зачисление"),
+    "description": (
+        "description", "details", "izoh", "tavsif", "comment", "note", "назначение",
+        "назначение платежа", "описание", "комментарий", "merchant", "payee",
+    ),
+    "currency": ("currency", "valyuta", "валюта", "cur"),
+    "kind": ("type", "kind", "turi", "тип", "вид"),
+    "category": ("category", "kategoriya", "категория"),
+}
+INCOME_WORDS = ("income", "kirim", "приход", "доход", "credit", "кредит", "+")
+EXPENSE_WORDS = ("expense", "chiqim", "расход", "debit", "дебет", "-")
+# 2024-05-01[ 13:45[:10]] or 01.05.2024 / 01/05/24 / 01-05-2024[ 13:45[:10]]
+ISO_DATE_RE = re.compile(r"(\d{4})-(\d{1,2})-(\d{1,2})(?:[ T](\d{1,2}):(\d{2})(?::(\d{2}))?)?")
+DMY_DATE_RE = re.compile(r"(\d{1,2})[./-](\d{1,2})[./-](\d{4}|\d{2})(?:[ ,]+(\d{1,2}):(\d{2})(?::(\d{2}))?)?")
+NUMERIC_CELL_RE = re.compile(r"\(?([+-]?)\s*([\d\s .,]*\d)\s*([+-]?)\)?")
+FRACTION_RE = re.compile(r"[.,]\d{1,2}$")
+
+
+class StatementFormatError(ValueError):
+    """The file has no recognisable header row."""
+
+
+class StatementRow(NamedTuple):
+    ts: datetime
+    text: str
+    amount_text: str
+    # -1 money out, +1 money in, 0 unknown (let the text decide)
+    sign: int
+    currency: str
+    category: str
+
+
+# classify(row) -> (kind, amount, currency, account, category, note, ts) or None to skip
+Classifier = Callable[[StatementRow], Optional[tuple]]
+ProgressCallback = Callable[[int, int], Awaitable[None]]
+
+
+def iter_table(path: str, filename: str) -> Iterator[List[Any]]:
+    if filename.lower().endswith(".xlsx"):
+        yield from iter_xlsx_rows(path)
+        return
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        sample = f.read(64 * 1024)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t|")
+        except csv.Error:
+            dialect = csv.excel
+        yield from csv.reader(f, dialect)
+
+
+def _header_map(cells: List[Any]) -> Dict[str, int]:
+    found: Dict[str, int] = {}
+    for idx, cell in enumerate(cells):
+        name = str(cell or "").strip().lower()
+        for field, aliases in HEADER_ALIASES.items():
+            if field not in found and name in aliases:
+                found[field] = idx
+    return found
+
+
+def _parse_ts(value: Any, tz: tzinfo) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        ts = value
+    else:
+        # one regex instead of trying strptime formats: this runs once per row
+        raw = str(value or "").strip()
+        m = ISO_DATE_RE.match(raw)
+        if m:
+            year, month, day = m.group(1, 2, 3)
+        else:
+            m = DMY_DATE_RE.match(raw)
+            if not m:
+                return None
+            day, month, year = m.group(1, 2, 3)
+            if len(year) == 2:
+                year = f"20{year}"
+        try:
+            ts = datetime(
+                int(year), int(month), int(day),
+                int(m.group(4) or 0), int(m.group(5) or 0), int(m.group(6) or 0),
+            )
+        except ValueError:
+            return None
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=tz)
+    return ts.replace(microsecond=0)
+
+
+def _amount_text(value: Any) -> Tuple[str, int]:
+    """Amount cell -> (text for ``parse_amount``, sign)."""
+    if value is None or value == "":
+        return "", 0
+    if isinstance(value, (int, float)):
+        return str(abs(int(round(value)))), (value > 0) - (value < 0)
+    raw = str(value).strip()
+    m = NUMERIC_CELL_RE.fullmatch(raw)
+    if not m:
+        return raw, 0
+    digits = FRACTION_RE.sub("", m.group(2))
+    negative = "-" in (m.group(1), m.group(3)) or (raw.startswith("(") and raw.endswith(")"))
+    return digits, -1 if negative else (1 if "+" in (m.group(1), m.group(3)) else 0)
+
+
+def _cell(cells: List[Any], columns: Dict[str, int], field: str) -> Any:
+    idx = columns.get(field)
+    return cells[idx] if idx is not None and idx < len(cells) else None
+
+
+def _to_row(cells: List[Any], columns: Dict[str, int], tz: tzinfo) -> Optional[StatementRow]:
+    ts = _parse_ts(_cell(cells, columns, "date"), tz)
+    if ts is None:
+        return None
+    amount_text, sign = _amount_text(_cell(cells, columns, "amount"))
+    if not amount_text:
+        debit_text, _ = _amount_text(_cell(cells, columns, "debit"))
+        credit_text, _ = _amount_text(_cell(cells, columns, "credit"))
+        if debit_text.strip("0"):
+            amount_text, sign = debit_text, -1
+        elif credit_text.strip("0"):
+            amount_text, sign = credit_text, 1
+    if not amount_text:
+        return None
+    kind = str(_cell(cells, columns, "kind") or "").strip().lower()
+    if kind in INCOME_WORDS:
+        sign = 1
+    elif kind in EXPENSE_WORDS:
+        sign = -1
+    return StatementRow(
+        ts=ts,
+        text=str(_cell(cells, columns, "description") or "").strip(),
+        amount_text=amount_text,
+        sign=sign,
+        currency=str(_cell(cells, columns, "currency") or "").strip().upper(),
+        category=str(_cell(cells, columns, "category") or "").strip(),
+    )
+
+
+def iter_statement(path: str, filename: str, tz: tzinfo) -> Iterator[Optional[StatementRow]]:
+    """Statement rows after the header; ``None`` for rows that cannot be read."""
+    rows = iter_table(path, filename)
+    columns: Dict[str, int] = {}
+    for _ in range(HEADER_SCAN_ROWS):
+        cells = next(rows, None)
+        if cells is None:
+            break
+        found = _header_map(cells)
+        if "date" in found and ("amount" in found or "debit" in found or "credit" in found):
+            columns = found
+            break
+    if not columns:
+        raise StatementFormatError("statement header not found")
+    for cells in rows:
+        if not any(cell not in (None, "") for cell in cells):
+            continue
+        yield _to_row(cells, columns, tz)
+
+
+def _take(rows: Iterator[Optional[StatementRow]], classify: Classifier, size: int) -> Tuple[List[tuple], int, bool]:
+    """Read up to ``size`` rows -> (classified, skipped, exhausted)."""
+    batch: List[tuple] = []
+    skipped = 0
+    for _ in range(size):
+        row = next(rows, StopIteration)
+        if row is StopIteration:
+            return batch, skipped, True
+        item = classify(row) if row is not None else None
+        if item is None:
+            skipped += 1
+        else:
+            batch.append(item)
+    return batch, skipped, False
+
+
+async def import_statement(
+    ledger: Ledger,
+    uid: int,
+    path: str,
+    filename: str,
+    classify: Classifier,
+    progress: Optional[ProgressCallback] = None,
+    chunk_size: int = IMPORT_CHUNK,
+    progress_interval: float = IMPORT_PROGRESS_INTERVAL,
+) -> Dict[str, int]:
+    rows = iter_statement(path, filename, ledger.tz)
+    imported = skipped = 0
+    last_report = time.monotonic()
+    while True:
+        batch, missed, exhausted = await asyncio.to_thread(_take, rows, classify, chunk_size)
+        imported += await ledger.import_history(uid, batch)
+        skipped += missed
+        if exhausted:
+            break
+        if progress is not None and time.monotonic() - last_report >= progress_interval:
+            last_report = time.monotonic()
+            await progress(imported, skipped)
+    return {"imported": imported, "skipped": skipped}
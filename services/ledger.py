@@ -0,0 +1,610 @@
+"""Durable transaction ledger backed by the ``transactions`` table.
+
+Writes are acknowledged immediately and committed in batches by a background
+flusher (write-behind).  Every user that was touched recently keeps a small
+window of their latest transactions in memory (as ``TxRecord``) so day/week
+reports and the cancel button do not need a round-trip.
+
+``user_month_stats`` holds per (user, month, kind, category, currency) sums
+and counts.  It is updated in the same transaction that inserts, deletes or
+re-categorizes the transactions, so monthly analysis reads a handful of rows
+instead of the month's history.  Months are calendar months in the ledger's ``tz``.
+
+``user_balances`` holds running balances the same way: per (account,
+currency) from every insert/delete, and per open-debt direction from
+``adjust_balance()`` calls queued in order with the transactions.  The
+balance screen reads those few rows instead of summing the history.
+"""
+import asyncio
+import logging
+import sqlite3
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone, tzinfo
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import aiosqlite
+
+import db as db_module
+from db import ConnectionPool, from_db_ts, to_db_ts
+from services.records import TxRecord, intern_str, to_epoch
+
+logger = logging.getLogger(__name__)
+
+TX_COLUMNS = "id, user_id, kind, amount, currency, account, category, note, created_at"
+
+# errors that retrying cannot fix for the op that raised them; anything else
+# (locked database, disk full, I/O) keeps the ops queued
+PERMANENT_ERRORS = (sqlite3.IntegrityError, sqlite3.ProgrammingError, sqlite3.InterfaceError, sqlite3.DataError)
+
+# (user_id, yyyymm, kind, category, currency) -> [total, tx_count]
+StatsDelta = Dict[Tuple[int, str, str, str, str], List[int]]
+# (user_id, scope, name, currency) -> amount
+BalanceDelta = Dict[Tuple[int, str, str, str], int]
+
+
+class _UserWindow:
+    """Newest transactions of one user, ordered by ``(ts, id)``.
+
+    ``stamps`` mirrors ``items[i].ts`` so ranges are answered with ``bisect``
+    in O(log n + k).  ``complete`` means the window holds the user's entire
+    history; otherwise only ranges starting strictly after ``items[0].ts``
+    can be served.
+    """
+
+    __slots__ = ("items", "stamps", "complete")
+
+    def __init__(self, items: List[TxRecord], complete: bool) -> None:
+        self.items = items
+        self.stamps = [it.ts for it in items]
+        self.complete = complete
+
+    def covers(self, since: Optional[int]) -> bool:
+        if self.complete:
+            return True
+        if since is None or not self.items:
+            return False
+        return since > self.stamps[0]
+
+    def add(self, item: TxRecord, limit: int) -> None:
+        # the clock may step back; keep the order instead of trusting append
+        if not self.stamps or item.ts >= self.stamps[-1]:
+            self.items.append(item)
+            self.stamps.append(item.ts)
+        else:
+            idx = bisect_right(self.stamps, item.ts)
+            self.items.insert(idx, item)
+            self.stamps.insert(idx, item.ts)
+        if len(self.items) > limit:
+            del self.items[0]
+            del self.stamps[0]
+            self.complete = False
+
+    def get(self, tx_id: int) -> Optional[TxRecord]:
+        for idx in range(len(self.items) - 1, -1, -1):
+            if self.items[idx].id == tx_id:
+                return self.items[idx]
+        return None
+
+    def pop(self, tx_id: int) -> Optional[TxRecord]:
+        for idx in range(len(self.items) - 1, -1, -1):
+            if self.items[idx].id == tx_id:
+                del self.stamps[idx]
+                return self.items.pop(idx)
+        return None
+
+    def slice(self, lo: Optional[int], hi: Optional[int]) -> List[TxRecord]:
+        start = 0 if lo is None else bisect_left(self.stamps, lo)
+        end = len(self.stamps) if hi is None else bisect_right(self.stamps, hi)
+        return self.items[start:end]
+
+
+class Ledger:
+    def __init__(
+        self,
+        pool: Optional[ConnectionPool] = None,
+        tz: tzinfo = timezone.utc,
+        flush_interval: float = 0.5,
+        batch_size: int = 200,
+        cache_users: int = 512,
+        cache_per_user: int = 200,
+        max_retry_delay: float = 30.0,
+    ) -> None:
+        self.pool = pool or db_module.POOL
+        self.tz = tz
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.cache_users = cache_users
+        self.cache_per_user = cache_per_user
+        self.max_retry_delay = max_retry_delay
+        self._next_id = 0
+        self._pending: List[Tuple[str, Any]] = []
+        self._cache: "OrderedDict[int, _UserWindow]" = OrderedDict()
+        self._flush_lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._retry_delay = 0.0
+        self._retry_at = 0.0
+
+    # ---- lifecycle ----
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        async with self.pool.acquire() as db:
+            cur = await db.execute(
+                "SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name='transactions'), 0), "
+                "COALESCE((SELECT MAX(id) FROM transactions), 0))"
+            )
+            row = await cur.fetchone()
+        self._next_id = int(row[0] or 0) if row else 0
+        await self._backfill_month_stats()
+        self._task = asyncio.create_task(self._flusher())
+
+    async def _backfill_month_stats(self) -> None:
+        """Build ``user_month_stats`` from history the first time it is empty."""
+        async with self.pool.acquire() as db:
+            cur = await db.execute(
+                "SELECT EXISTS(SELECT 1 FROM user_month_stats), EXISTS(SELECT 1 FROM transactions)"
+            )
+            has_stats, has_tx = await cur.fetchone()
+            if has_stats or not has_tx:
+                return
+            deltas: StatsDelta = {}
+            cur = await db.execute(
+                "SELECT user_id, kind, amount, currency, category, created_at FROM transactions"
+            )
+            while True:
+                rows = await cur.fetchmany(5000)
+                if not rows:
+                    break
+                for row in rows:
+                    self._add_delta(deltas, row["user_id"], row["kind"], row["amount"],
+                                    row["currency"], row["category"], row["created_at"], 1)
+            await self._apply_stats(db, deltas)
+            await db.commit()
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _flusher(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self._pending and loop.time() >= self._retry_at:
+                await self.flush()
+
+    def _requeue(self, ops: List[Tuple[str, Any]], exc: BaseException) -> None:
+        """Put ``ops`` back in front of newer writes and back off the flusher."""
+        self._pending[:0] = ops
+        self._retry_delay = min(self._retry_delay * 2 if self._retry_delay else self.flush_interval,
+                                self.max_retry_delay)
+        self._retry_at = asyncio.get_running_loop().time() + self._retry_delay
+        logger.warning("ledger-flush-retry", extra={
+            "ops": len(ops), "retry_in": round(self._retry_delay, 3), "error": str(exc),
+        })
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            ops, self._pending = self._pending, []
+            dropped = 0
+            try:
+                async with self.pool.acquire() as db:
+                    try:
+                        await self._apply(db, ops)
+                        await db.commit()
+                        ops = []
+                    except PERMANENT_ERRORS as exc:
+                        await db.rollback()
+                        logger.warning("ledger-flush-failed", extra={"ops": len(ops), "error": str(exc)})
+                    except Exception:
+                        await db.rollback()
+                        raise
+                    # one op per transaction so only the ops that can never be
+                    # written are dropped; the rest still land in order
+                    while ops:
+                        try:
+                            await self._apply(db, ops[:1])
+                            await db.commit()
+                        except PERMANENT_ERRORS as exc:
+                            await db.rollback()
+                            dropped += 1
+                            logger.error("ledger-op-dropped", extra={
+                                "op": ops[0][0], "arg": repr(ops[0][1]), "error": str(exc),
+                            })
+                        except Exception:
+                            await db.rollback()
+                            raise
+                        ops = ops[1:]
+            except Exception as exc:
+                # locked, disk full, I/O: nothing was lost, try again later
+                self._requeue(ops, exc)
+            else:
+                self._retry_delay = 0.0
+                self._retry_at = 0.0
+            if dropped:
+                # cached windows already show the dropped ops; reload from the table
+                self._cache.clear()
+
+    async def _apply(self, db: aiosqlite.Connection, ops: List[Tuple[str, Any]]) -> None:
+        inserts: List[tuple] = []
+        deltas: StatsDelta = {}
+        balances: BalanceDelta = {}
+        for op, arg in ops:
+            if op == "insert":
+                inserts.append(arg)
+                continue
+            if inserts:
+                await self._insert_many(db, inserts, deltas, balances)
+                inserts = []
+            if op == "delete":
+                cur = await db.execute(
+                    "DELETE FROM transactions WHERE id=? "
+                    "RETURNING user_id, kind, amount, currency, account, category, created_at",
+                    (arg,),
+                )
+                row = await cur.fetchone()
+                if row:
+                    self._add_delta(deltas, row["user_id"], row["kind"], row["amount"],
+                                    row["currency"], row["category"], row["created_at"], -1)
+                    self._add_balance(balances, row["user_id"], row["kind"], row["amount"],
+                                      row["currency"], row["account"], -1)
+            elif op == "category":
+                tx_id, category = arg
+                cur = await db.execute(
+                    "SELECT user_id, kind, amount, currency, category, created_at FROM transactions WHERE id=?",
+                    (tx_id,),
+                )
+                row = await cur.fetchone()
+                if row and row["category"] != category:
+                    await db.execute("UPDATE transactions SET category=? WHERE id=?", (category, tx_id))
+                    self._add_delta(deltas, row["user_id"], row["kind"], row["amount"],
+                                    row["currency"], row["category"], row["created_at"], -1)
+                    self._add_delta(deltas, row["user_id"], row["kind"], row["amount"],
+                                    row["currency"], category, row["created_at"], 1)
+            elif op == "balance":
+                uid, scope, name, currency, amount = arg
+                key = (uid, scope, name, currency)
+                balances[key] = balances.get(key, 0) + amount
+            elif op == "clear":
+                await self._apply_stats(db, deltas)
+                await self._apply_balances(db, balances)
+                deltas, balances = {}, {}
+                await db.execute("DELETE FROM transactions WHERE user_id=?", (arg,))
+                await db.execute("DELETE FROM user_month_stats WHERE user_id=?", (arg,))
+                await db.execute(
+                    "DELETE FROM user_balances WHERE user_id=? AND scope='account'", (arg,)
+                )
+        if inserts:
+            await self._insert_many(db, inserts, deltas, balances)
+        await self._apply_stats(db, deltas)
+        await self._apply_balances(db, balances)
+
+    async def _insert_many(
+        self, db: aiosqlite.Connection, rows: List[tuple], deltas: StatsDelta, balances: BalanceDelta,
+    ) -> None:
+        await db.executemany(
+            f"INSERT INTO transactions({TX_COLUMNS}) VALUES(?,?,?,?,?,?,?,?,?)",
+            rows,
+        )
+        for _id, uid, kind, amount, currency, account, category, _note, created_at in rows:
+            self._add_delta(deltas, uid, kind, amount, currency, category, created_at, 1)
+            self._add_balance(balances, uid, kind, amount, currency, account, 1)
+
+    # ---- monthly stats ----
+    def _add_delta(
+        self, deltas: StatsDelta, uid: int, kind: str, amount: Any,
+        currency: Optional[str], category: Optional[str], created_at: str, sign: int,
+    ) -> None:
+        month = from_db_ts(created_at, self.tz).strftime("%Y%m")
+        entry = deltas.setdefault((uid, month, kind, category or "", currency or "UZS"), [0, 0])
+        entry[0] += sign * int(amount or 0)
+        entry[1] += sign
+
+    async def _apply_stats(self, db: aiosqlite.Connection, deltas: StatsDelta) -> None:
+        if not deltas:
+            return
+        await db.executemany(
+            "INSERT INTO user_month_stats(user_id, yyyymm, kind, category, currency, total, tx_count) "
+            "VALUES(?,?,?,?,?,?,?) ON CONFLICT(user_id, yyyymm, kind, category, currency) DO UPDATE SET "
+            "total=total+excluded.total, tx_count=tx_count+excluded.tx_count",
+            [(*key, total, count) for key, (total, count) in deltas.items()],
+        )
+        emptied = [key for key, (_total, count) in deltas.items() if count < 0]
+        if emptied:
+            await db.executemany(
+                "DELETE FROM user_month_stats WHERE user_id=? AND yyyymm=? AND kind=? "
+                "AND category=? AND currency=? AND tx_count<=0",
+                emptied,
+            )
+
+    # ---- running balances ----
+    @staticmethod
+    def _add_balance(
+        balances: BalanceDelta, uid: int, kind: str, amount: Any,
+        currency: Optional[str], account: Optional[str], sign: int,
+    ) -> None:
+        key = (uid, "account", account or "cash", currency or "UZS")
+        value = int(amount or 0) if kind == "income" else -int(amount or 0)
+        balances[key] = balances.get(key, 0) + sign * value
+
+    async def _apply_balances(self, db: aiosqlite.Connection, balances: BalanceDelta) -> None:
+        changed = [(*key, amount) for key, amount in balances.items() if amount]
+        if not changed:
+            return
+        await db.executemany(
+            "INSERT INTO user_balances(user_id, scope, name, currency, amount) VALUES(?,?,?,?,?) "
+            "ON CONFLICT(user_id, scope, name, currency) DO UPDATE SET amount=amount+excluded.amount",
+            changed,
+        )
+
+    def _queue(self, op: str, arg: Any) -> None:
+        self._pending.append((op, arg))
+        if len(self._pending) >= self.batch_size:
+            self._wake.set()
+
+    # ---- cache ----
+    def _row_to_item(self, row: Any) -> TxRecord:
+        return TxRecord(
+            row["id"],
+            to_epoch(from_db_ts(row["created_at"], self.tz)),
+            row["kind"],
+            int(row["amount"] or 0),
+            row["currency"],
+            row["account"],
+            row["category"],
+            row["note"],
+        )
+
+    def _remember(self, uid: int, window: _UserWindow) -> _UserWindow:
+        self._cache[uid] = window
+        self._cache.move_to_end(uid)
+        while len(self._cache) > self.cache_users:
+            self._cache.popitem(last=False)
+        return window
+
+    async def _window(self, uid: int) -> _UserWindow:
+        window = self._cache.get(uid)
+        if window is not None:
+            self._cache.move_to_end(uid)
+            return window
+        await self.flush()
+        async with self.pool.acquire() as db:
+            cur = await db.execute(
+                f"SELECT {TX_COLUMNS} FROM transactions WHERE user_id=? "
+                "ORDER BY created_at DESC, id DESC LIMIT ?",
+                (uid, self.cache_per_user),
+            )
+            rows = await cur.fetchall()
+        items = [self._row_to_item(row) for row in reversed(rows)]
+        return self._remember(uid, _UserWindow(items, len(rows) < self.cache_per_user))
+
+    # ---- writes ----
+    async def add(
+        self,
+        uid: int,
+        kind: str,
+        amount: int,
+        currency: str,
+        account: str,
+        category: str,
+        desc: str,
+    ) -> TxRecord:
+        self._next_id += 1
+        now = datetime.now(self.tz).replace(microsecond=0)
+        item = TxRecord(self._next_id, to_epoch(now), kind, int(amount), currency, account, category, desc)
+        self._queue(
+            "insert",
+            (
+                item.id, uid, kind, item.amount, currency, account,
+                category, desc, to_db_ts(now),
+            ),
+        )
+        window = self._cache.get(uid)
+        if window is not None:
+            window.add(item, self.cache_per_user)
+        return item
+
+    async def remove(self, uid: int, tx_id: int) -> Optional[TxRecord]:
+        window = await self._window(uid)
+        item = window.pop(tx_id)
+        if item is not None:
+            self._queue("delete", tx_id)
+            return item
+        if window.complete:
+            return None
+        await self.flush()
+        async with self.pool.acquire() as db:
+            cur = await db.execute(
+                f"SELECT {TX_COLUMNS} FROM transactions WHERE id=? AND user_id=?",
+                (tx_id, uid),
+            )
+            row = await cur.fetchone()
+        if not row:
+            return None
+        self._queue("delete", tx_id)
+        return self._row_to_item(row)
+
+    async def set_category(self, uid: int, tx_id: int, category: str) -> Optional[TxRecord]:
+        """Move a transaction (and its monthly totals) to ``category``."""
+        window = await self._window(uid)
+        item = window.get(tx_id)
+        if item is None and not window.complete:
+            await self.flush()
+            async with self.pool.acquire() as db:
+                cur = await db.execute(
+                    f"SELECT {TX_COLUMNS} FROM transactions WHERE id=? AND user_id=?",
+                    (tx_id, uid),
+                )
+                row = await cur.fetchone()
+            item = self._row_to_item(row) if row else None
+        if item is None:
+            return None
+        item.category = intern_str(category)
+        self._queue("category", (tx_id, category))
+        return item
+
+    async def import_history(self, uid: int, rows: List[tuple]) -> int:
+        """Insert historical rows in one transaction, bypassing write-behind.
+
+        ``rows`` are ``(kind, amount, currency, account, category, note, ts)``.
+        The user's cached window is dropped since the rows may predate it.
+        """
+        if not rows:
+            return 0
+        await self.flush()
+        batch = []
+        for kind, amount, currency, account, category, note, ts in rows:
+            self._next_id += 1
+            batch.append((
+                self._next_id, uid, kind, int(amount), currency, account,
+                category, note, to_db_ts(ts),
+            ))
+        async with self._flush_lock:
+            async with self.pool.acquire() as db:
+                try:
+                    deltas: StatsDelta = {}
+                    balances: BalanceDelta = {}
+                    await self._insert_many(db, batch, deltas, balances)
+                    await self._apply_stats(db, deltas)
+                    await self._apply_balances(db, balances)
+                    await db.commit()
+                except Exception:
+                    await db.rollback()
+                    raise
+        self._cache.pop(uid, None)
+        return len(batch)
+
+    async def clear_user(self, uid: int) -> None:
+        self._queue("clear", uid)
+        self._remember(uid, _UserWindow([], True))
+
+    def adjust_balance(self, uid: int, scope: str, name: str, currency: str, amount: int) -> None:
+        """Queue ``amount`` onto a running balance outside the ``account`` scope."""
+        if amount:
+            self._queue("balance", (uid, scope, name, currency or "UZS", int(amount)))
+
+    async def reset_balances(self, scope: str, rows: List[Tuple[int, str, str, int]]) -> None:
+        """Replace every ``scope`` balance with ``(user_id, name, currency, amount)`` rows."""
+        await self.flush()
+        async with self._flush_lock:
+            async with self.pool.acquire() as db:
+                try:
+                    await db.execute("DELETE FROM user_balances WHERE scope=?", (scope,))
+                    await db.executemany(
+                        "INSERT INTO user_balances(user_id, scope, name, currency, amount) VALUES(?,?,?,?,?) "
+                        "ON CONFLICT(user_id, scope, name, currency) DO UPDATE SET amount=amount+excluded.amount",
+                        [(uid, scope, name, currency or "UZS", int(amount)) for uid, name, currency, amount in rows],
+                    )
+                    await db.commit()
+                except Exception:
+                    await db.rollback()
+                    raise
+
+    # ---- reads ----
+    async def range(
+        self, uid: int, since: Optional[datetime] = None, until: Optional[datetime] = None,
+    ) -> List[TxRecord]:
+        window = await self._window(uid)
+        lo = to_epoch(since) if since is not None else None
+        if window.covers(lo):
+            return window.slice(lo, to_epoch(until) if until is not None else None)
+        await self.flush()
+        sql, params = self._range_query(uid, since, until)
+        async with self.pool.acquire() as db:
+            cur = await db.execute(sql, params)
+            rows = await cur.fetchall()
+        return [self._row_to_item(row) for row in rows]
+
+    def _range_query(self, uid: int, since: Optional[datetime], until: Optional[datetime]) -> Tuple[str, List[Any]]:
+        sql = f"SELECT {TX_COLUMNS} FROM transactions WHERE user_id=?"
+        params: List[Any] = [uid]
+        if since is not None:
+            sql += " AND created_at >= ?"
+            params.append(to_db_ts(since))
+        if until is not None:
+            sql += " AND created_at <= ?"
+            params.append(to_db_ts(until))
+        return sql + " ORDER BY created_at, id", params
+
+    async def iter_range(
+        self, uid: int, since: Optional[datetime] = None, until: Optional[datetime] = None, batch: int = 500,
+    ) -> AsyncIterator[List[TxRecord]]:
+        """Like ``range()`` but yields ``batch``-sized lists from an open cursor.
+
+        Holds a pool connection until exhausted or closed; wrap it in
+        ``contextlib.aclosing`` when the consumer may stop early.
+        """
+        await self.flush()
+        sql, params = self._range_query(uid, since, until)
+        async with self.pool.acquire() as db:
+            cur = await db.execute(sql, params)
+            while True:
+                rows = await cur.fetchmany(batch)
+                if not rows:
+                    break
+                yield [self._row_to_item(row) for row in rows]
+
+    async def month_stats(self, uid: int, month: str) -> Dict[Tuple[str, str, str], Tuple[int, int]]:
+        """(kind, category, currency) -> (total, tx_count) for ``month`` (``YYYYMM``)."""
+        await self.flush()
+        async with self.pool.acquire() as db:
+            cur = await db.execute(
+                "SELECT kind, category, currency, total, tx_count FROM user_month_stats "
+                "WHERE user_id=? AND yyyymm=?",
+                (uid, month),
+            )
+            rows = await cur.fetchall()
+        return {
+            (row["kind"], row["category"], row["currency"]): (int(row["total"]), int(row["tx_count"]))
+            for row in rows
+        }
+
+    async def kind_totals_since(self, uid: int, since: datetime) -> Dict[Tuple[str, str], int]:
+        """Sum amounts per (kind, currency) from ``since`` on.
+
+        Whole months after ``since`` come from ``user_month_stats``; only the
+        rest of the month ``since`` falls in is read transaction by transaction.
+        """
+        local = since.astimezone(self.tz)
+        next_month = (local.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+                      + timedelta(days=32)).replace(day=1)
+        result: Dict[Tuple[str, str], int] = {}
+        for it in await self.range(uid, since, next_month - timedelta(seconds=1)):
+            key = (it.kind, it.currency)
+            result[key] = result.get(key, 0) + it.amount
+        # range() may answer from the cached window; queued writes must reach the stats
+        await self.flush()
+        async with self.pool.acquire() as db:
+            cur = await db.execute(
+                "SELECT kind, currency, SUM(total) AS total FROM user_month_stats "
+                "WHERE user_id=? AND yyyymm >= ? GROUP BY kind, currency",
+                (uid, next_month.strftime("%Y%m")),
+            )
+            rows = await cur.fetchall()
+        for row in rows:
+            key = (row["kind"], row["currency"])
+            result[key] = result.get(key, 0) + int(row["total"] or 0)
+        return result
+
+    async def balances(self, uid: int) -> Dict[Tuple[str, str, str], int]:
+        """Running balances as ``{(scope, name, currency): amount}``."""
+        await self.flush()
+        async with self.pool.acquire() as db:
+            cur = await db.execute(
+                "SELECT scope, name, currency, amount FROM user_balances WHERE user_id=?", (uid,)
+            )
+            rows = await cur.fetchall()
+        return {(row["scope"], row["name"], row["currency"]): int(row["amount"]) for row in rows}
@@ -0,0 +1,215 @@
+"""Retention and compaction for ``payments_logs``.
+
+Every Click prepare/complete/callback event and polling step appends a row,
+so the table only grows.  ``PaymentLogRetention.run()`` is meant to be
+scheduled off-peak; it
+
+* moves rows older than ``retention_days`` into one SQLite file per month
+  (``payments_logs_YYYYMM.db`` under ``archive_dir``) or, with no archive
+  directory, deletes them,
+* returns free pages with ``PRAGMA incremental_vacuum`` (new databases are
+  created with ``auto_vacuum=INCREMENTAL`` by ``run_migrations``; an older
+  file needs one ``VACUUM`` run offline, and until then compaction is
+  skipped with a warning instead of rewriting the file under the bot),
+* truncates the WAL,
+
+and returns a before/after report of file sizes and checkpoint time.  It
+works on its own connection, so archive ATTACHes never reach the pool.
+
+Archived rows keep their ids and the copy uses ``INSERT OR IGNORE``, so a
+run interrupted between the archive commit and the delete is repaired by
+the next one.
+"""
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+import db as db_module
+from db import DB_PATH, ConnectionPool, to_db_ts, unpack_payload
+
+logger = logging.getLogger(__name__)
+
+PAYMENTS_LOG_RETENTION_DAYS = int(os.getenv("PAYMENTS_LOG_RETENTION_DAYS", "90"))
+# an empty value deletes expired rows instead of archiving them
+PAYMENTS_LOG_ARCHIVE_DIR = os.getenv(
+    "PAYMENTS_LOG_ARCHIVE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), "payments_logs_archive"),
+)
+PAYMENTS_LOG_BATCH = int(os.getenv("PAYMENTS_LOG_BATCH", "5000"))
+# 0 = free every reclaimable page in one go
+PAYMENTS_LOG_VACUUM_PAGES = int(os.getenv("PAYMENTS_LOG_VACUUM_PAGES", "0"))
+
+ARCHIVE_TABLE = """
+CREATE TABLE IF NOT EXISTS archive.payments_logs(
+    id INTEGER PRIMARY KEY,
+    event_type TEXT,
+    raw_payload TEXT,
+    payload_z BLOB,
+    verified BOOLEAN,
+    created_at TIMESTAMP
+)
+"""
+LOG_COLUMNS = "id, event_type, raw_payload, payload_z, verified, created_at"
+
+
+def _month_bounds(month: str) -> tuple:
+    start = datetime.strptime(month, "%Y-%m").replace(tzinfo=timezone.utc)
+    end = (start + timedelta(days=32)).replace(day=1)
+    return to_db_ts(start), to_db_ts(end)
+
+
+class PaymentLogRetention:
+    def __init__(
+        self,
+        pool: Optional[ConnectionPool] = None,
+        retention_days: int = PAYMENTS_LOG_RETENTION_DAYS,
+        archive_dir: Optional[str] = PAYMENTS_LOG_ARCHIVE_DIR,
+        batch_size: int = PAYMENTS_LOG_BATCH,
+        vacuum_pages: int = PAYMENTS_LOG_VACUUM_PAGES,
+    ) -> None:
+        self._pool = pool
+        self.retention_days = retention_days
+        self.archive_dir = archive_dir or None
+        self.batch_size = max(1, batch_size)
+        self.vacuum_pages = vacuum_pages
+
+    @property
+    def pool(self) -> ConnectionPool:
+        return self._pool or db_module.POOL
+
+    def archive_path(self, month: str) -> str:
+        assert self.archive_dir
+        return os.path.join(self.archive_dir, f"payments_logs_{month.replace('-', '')}.db")
+
+    # ---- report ----
+    async def _measure(self, db) -> Dict[str, Any]:
+        page_size = (await (await db.execute("PRAGMA page_size")).fetchone())[0]
+        page_count = (await (await db.execute("PRAGMA page_count")).fetchone())[0]
+        freelist = (await (await db.execute("PRAGMA freelist_count")).fetchone())[0]
+        rows = (await (await db.execute("SELECT COUNT(*) FROM payments_logs")).fetchone())[0]
+        wal_path = f"{self.pool.path}-wal"
+        wal_bytes = os.path.getsize(wal_path) if os.path.exists(wal_path) else 0
+        started = time.perf_counter()
+        await db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        checkpoint_ms = (time.perf_counter() - started) * 1000
+        return {
+            "db_bytes": page_size * page_count,
+            "wal_bytes": wal_bytes,
+            "free_pages": freelist,
+            "log_rows": rows,
+            "checkpoint_ms": round(checkpoint_ms, 2),
+        }
+
+    # ---- retention ----
+    async def _expired_months(self, db, cutoff: str) -> List[str]:
+        cur = await db.execute(
+            "SELECT DISTINCT substr(created_at, 1, 7) FROM payments_logs WHERE created_at < ? "
+            "ORDER BY 1",
+            (cutoff,),
+        )
+        return [row[0] for row in await cur.fetchall() if row[0]]
+
+    async def _roll_month(self, db, month: str, cutoff: str) -> int:
+        start, end = _month_bounds(month)
+        end = min(end, cutoff)
+        moved = 0
+        archive = self.archive_path(month) if self.archive_dir else None
+        if archive:
+            await db.execute("ATTACH DATABASE ? AS archive", (archive,))
+        try:
+            if archive:
+                await db.execute(ARCHIVE_TABLE)
+            while True:
+                # small batches keep the write lock short
+                await db.execute("BEGIN IMMEDIATE")
+                cur = await db.execute(
+                    "SELECT MAX(id), COUNT(*) FROM (SELECT id FROM payments_logs "
+                    "WHERE created_at >= ? AND created_at < ? ORDER BY id LIMIT ?)",
+                    (start, end, self.batch_size),
+                )
+                last_id, count = await cur.fetchone()
+                if not count:
+                    await db.rollback()
+                    break
+                where = "created_at >= ? AND created_at < ? AND id <= ?"
+                params = (start, end, last_id)
+                if archive:
+                    await db.execute(
+                        f"INSERT OR IGNORE INTO archive.payments_logs({LOG_COLUMNS}) "
+                        f"SELECT {LOG_COLUMNS} FROM main.payments_logs WHERE {where}",
+                        params,
+                    )
+                cur = await db.execute(f"DELETE FROM main.payments_logs WHERE {where}", params)
+                moved += cur.rowcount
+                await db.commit()
+        finally:
+            if db.in_transaction:
+                await db.rollback()
+            if archive:
+                await db.execute("DETACH DATABASE archive")
+        return moved
+
+    async def _compact(self, db) -> str:
+        mode = (await (await db.execute("PRAGMA auto_vacuum")).fetchone())[0]
+        if mode == 0:
+            # enabling auto_vacuum needs a full VACUUM, which rewrites the whole file
+            logger.warning("payments-logs-auto-vacuum-off", extra={"path": self.pool.path})
+            return "skipped"
+        if mode == 1:
+            # FULL -> INCREMENTAL switches without a VACUUM
+            await db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        pages = f"({int(self.vacuum_pages)})" if self.vacuum_pages > 0 else ""
+        # the pragma frees one page per step and has no result columns, so a
+        # cursor stops after the first page; executescript steps it to the end
+        await db.executescript(f"PRAGMA incremental_vacuum{pages};")
+        return "incremental"
+
+    async def run(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        now = now or datetime.now(timezone.utc)
+        cutoff = to_db_ts(now - timedelta(days=self.retention_days))
+        if self.archive_dir:
+            os.makedirs(self.archive_dir, exist_ok=True)
+        async with self.pool.connect() as db:
+            before = await self._measure(db)
+            moved: Dict[str, int] = {}
+            for month in await self._expired_months(db, cutoff):
+                moved[month] = await self._roll_month(db, month, cutoff)
+            compaction = await self._compact(db)
+            after = await self._measure(db)
+        report = {
+            "cutoff": cutoff,
+            "archived" if self.archive_dir else "deleted": moved,
+            "compaction": compaction,
+            "before": before,
+            "after": after,
+        }
+        logger.info("payments-logs-maintenance", extra=report)
+        return report
+
+    # ---- reading archived months ----
+    async def read_archive(self, month: str) -> List[Dict[str, Any]]:
+        """Rows archived for ``month`` (``YYYY-MM``) with decoded payloads."""
+        path = self.archive_path(month)
+        if not os.path.exists(path):
+            return []
+        async with self.pool.connect() as db:
+            await db.execute("ATTACH DATABASE ? AS archive", (path,))
+            try:
+                cur = await db.execute(
+                    f"SELECT {LOG_COLUMNS} FROM archive.payments_logs ORDER BY id"
+                )
+                rows = await cur.fetchall()
+            finally:
+                await db.execute("DETACH DATABASE archive")
+        return [
+            {
+                "id": row["id"],
+                "event_type": row["event_type"],
+                "payload": unpack_payload(row["payload_z"], row["raw_payload"]),
+                "verified": bool(row["verified"]),
+                "created_at": row["created_at"],
+            }
+            for row in rows
+        ]
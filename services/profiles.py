@@ -0,0 +1,83 @@
+"""User profiles stored in the ``users`` table.
+
+Profiles are served from the shared ``USER_CONTEXT`` entry, so the row read
+that fills a user's context also fills their profile, and both expire and
+invalidate together.  ``load()`` goes through the cache; ``get()`` only peeks
+at what is already cached (synchronous, so helpers such as ``get_lang`` keep
+working).  Each change is a single-row UPSERT group-committed through
+``db.WRITES`` and then applied to the cached entry.
+
+A ``users`` row only counts as a profile once ``created_at`` is set; rows that
+other code paths insert with just a ``user_id`` (payments, subscriptions) do
+not turn a first-time visitor into a returning one.
+"""
+from typing import Any, Dict, Optional
+
+import db as db_module
+from db import ConnectionPool, WriteCoalescer, now_db_ts
+from services.user_context import PROFILE_FIELDS, USER_CONTEXT, UserContextCache
+
+
+def _profile(context: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if not context or not context.get("created_at"):
+        return None
+    return {key: context[key] for key in PROFILE_FIELDS if context.get(key) is not None}
+
+
+class UserProfiles:
+    def __init__(
+        self,
+        pool: Optional[ConnectionPool] = None,
+        writes: Optional[WriteCoalescer] = None,
+        context: Optional[UserContextCache] = None,
+    ) -> None:
+        self.pool = pool or db_module.POOL
+        self.writes = writes or db_module.WRITES
+        self.context = context or USER_CONTEXT
+
+    def get(self, uid: int) -> Optional[Dict[str, Any]]:
+        return _profile(self.context.peek(uid))
+
+    async def load(self, uid: int) -> Optional[Dict[str, Any]]:
+        return _profile(await self.context.get(uid))
+
+    def invalidate(self, uid: int) -> None:
+        """Re-read ``uid`` on the next ``load()``; ``get()`` keeps serving it until then."""
+        self.context.invalidate(uid)
+
+    async def update(self, uid: int, **fields: Any) -> None:
+        unknown = set(fields) - set(PROFILE_FIELDS)
+        if unknown:
+            raise ValueError(f"unknown profile fields: {sorted(unknown)}")
+        profile = await self.load(uid) or {}
+        changed = {
+            key: value for key, value in fields.items()
+            if value is not None and profile.get(key) != value
+        }
+        now = now_db_ts()
+        if "created_at" not in profile:
+            changed.setdefault("created_at", now)
+        if not changed:
+            return
+        changed["updated_at"] = now
+        cols = list(changed)
+        assignments = ", ".join(
+            "created_at=COALESCE(users.created_at, excluded.created_at)" if col == "created_at"
+            else f"{col}=excluded.{col}"
+            for col in cols
+        )
+        await self.writes.execute(
+            f"INSERT INTO users(user_id, {', '.join(cols)}) VALUES(?{', ?' * len(cols)}) "
+            f"ON CONFLICT(user_id) DO UPDATE SET {assignments}",
+            (uid, *changed.values()),
+        )
+        self.context.apply(uid, changed)
+
+    async def count_activated(self) -> int:
+        async with self.pool.acquire() as db:
+            cur = await db.execute(
+                "SELECT COUNT(*) FROM users WHERE activated_at IS NOT NULL "
+                "OR contact_verified_at IS NOT NULL OR (created_at IS NOT NULL AND phone IS NOT NULL)"
+            )
+            row = await cur.fetchone()
+        return int(row[0] or 0) if row else 0
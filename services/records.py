@@ -0,0 +1,94 @@
+"""Compact in-memory records for transactions and debts.
+
+Ledger windows and the debt lists keep many of these per active user, so
+they use ``__slots__`` instead of dicts, store timestamps as integer epoch
+seconds and intern the small set of repeated strings (kind, currency,
+account, category, direction, status) so every record shares one copy.
+``when(tz)`` turns the timestamp back into an aware ``datetime`` for display.
+"""
+import sys
+from datetime import datetime, tzinfo
+from typing import Optional
+
+
+def intern_str(value: Optional[str], default: str = "") -> str:
+    return sys.intern(value) if value else default
+
+
+def to_epoch(value: datetime) -> int:
+    return int(value.timestamp())
+
+
+class TxRecord:
+    __slots__ = ("id", "ts", "kind", "amount", "currency", "account", "category", "desc")
+
+    def __init__(
+        self,
+        id: int,
+        ts: int,
+        kind: str,
+        amount: int,
+        currency: Optional[str],
+        account: Optional[str],
+        category: Optional[str],
+        desc: Optional[str],
+    ) -> None:
+        self.id = id
+        self.ts = ts
+        self.kind = intern_str(kind)
+        self.amount = amount
+        self.currency = intern_str(currency, "UZS")
+        self.account = intern_str(account, "cash")
+        self.category = intern_str(category)
+        self.desc = desc or ""
+
+    def when(self, tz: tzinfo) -> datetime:
+        return datetime.fromtimestamp(self.ts, tz)
+
+    def __repr__(self) -> str:
+        return f"TxRecord(id={self.id}, ts={self.ts}, kind={self.kind!r}, amount={self.amount}, {self.currency})"
+
+
+class DebtRecord:
+    __slots__ = ("id", "ts", "direction", "amount", "currency", "counterparty", "due", "status", "paid")
+
+    def __init__(
+        self,
+        id: int,
+        ts: int,
+        direction: str,
+        amount: int,
+        currency: Optional[str],
+        counterparty: Optional[str],
+        due: Optional[str],
+        status: str = "wait",
+        paid: int = 0,
+    ) -> None:
+        self.id = id
+        self.ts = ts
+        self.direction = intern_str(direction)
+        self.amount = amount
+        self.currency = intern_str(currency, "UZS")
+        self.counterparty = counterparty or ""
+        self.due = due or ""
+        self.status = intern_str(status, "wait")
+        self.paid = paid
+
+    def when(self, tz: tzinfo) -> datetime:
+        return datetime.fromtimestamp(self.ts, tz)
+
+    @property
+    def remaining(self) -> int:
+        return max(self.amount - self.paid, 0)
+
+    def __repr__(self) -> str:
+        return f"DebtRecord(id={self.id}, direction={self.direction!r}, amount={self.amount}, status={self.status!r})"
+
+
+class ArchivedDebt(DebtRecord):
+    __slots__ = ("archive_id", "archived_at")
+
+    def __init__(self, archive_id: int, archived_at: int, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.archive_id = archive_id
+        self.archived_at = archived_at
@@ -0,0 +1,114 @@
+"""Async data access for the routers, middleware and Click fallbacks.
+
+Everything here runs on ``db.POOL``: each aiosqlite connection executes its
+statements on its own worker thread, so a lock wait never stalls the event
+loop, and the pool size (``DB_POOL_SIZE``) bounds how many queries are in
+flight at once.  Small writes are group-committed through ``db.WRITES``.
+
+Columns are guaranteed by ``db.run_migrations()``; nothing here probes or
+alters the schema.
+"""
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import db as db_module
+from db import now_db_ts, to_db_ts
+from services.user_context import USER_CONTEXT
+
+PAYMENT_COLUMNS = "invoice_id, status, amount, plan, created_at"
+
+
+async def user_has_phone(user_id: int) -> bool:
+    context = await USER_CONTEXT.get(user_id)
+    return bool(context and context["phone"])
+
+
+async def store_phone(user_id: int, phone: str) -> None:
+    verified_at = now_db_ts()
+    await db_module.WRITES.execute(
+        "INSERT INTO users(user_id, phone, contact_verified_at) VALUES(?,?,?) "
+        "ON CONFLICT(user_id) DO UPDATE SET phone=excluded.phone, "
+        "contact_verified_at=excluded.contact_verified_at",
+        (user_id, phone, verified_at),
+    )
+    USER_CONTEXT.apply(user_id, {"phone": phone, "contact_verified_at": verified_at})
+
+
+async def recent_payments(user_id: int, limit: int = 5) -> List[Dict[str, Any]]:
+    async with db_module.POOL.acquire() as db:
+        cur = await db.execute(
+            f"SELECT {PAYMENT_COLUMNS} FROM payments WHERE user_id=? "
+            "ORDER BY created_at DESC LIMIT ?",
+            (user_id, limit),
+        )
+        rows = await cur.fetchall()
+    return [dict(row) for row in rows]
+
+
+async def latest_payment(user_id: int) -> Optional[Dict[str, Any]]:
+    rows = await recent_payments(user_id, 1)
+    return rows[0] if rows else None
+
+
+async def payment_status(invoice_id: str) -> Optional[str]:
+    async with db_module.POOL.acquire() as db:
+        cur = await db.execute("SELECT status FROM payments WHERE invoice_id=?", (invoice_id,))
+        row = await cur.fetchone()
+    return row["status"] if row else None
+
+
+async def create_invoice_record(user_id: int, invoice_id: str, amount: int, plan: str) -> None:
+    await db_module.WRITES.execute(
+        "INSERT OR IGNORE INTO payments(user_id, invoice_id, amount, plan, status, created_at) "
+        "VALUES(?,?,?,?, 'pending', ?)",
+        (user_id, invoice_id, int(amount), plan, now_db_ts()),
+    )
+
+
+def _plan_days(amount: Any, plan: Optional[str]) -> int:
+    month_price = int(os.getenv("MONTH_PRICE", 19900))
+    try:
+        amount_int = int(amount)
+    except Exception:
+        amount_int = month_price
+    plan_key = (plan or "").strip().lower()
+    if not plan_key:
+        plan_key = "month" if amount_int == month_price else "week"
+    return 30 if plan_key == "month" or amount_int == month_price else 7
+
+
+async def activate_invoice(invoice_id: str) -> bool:
+    """Mark ``invoice_id`` paid and open the user's subscription window.
+
+    Only the caller whose conditional UPDATE moves the invoice out of
+    ``pending`` extends ``sub_until``; an invoice that is already paid
+    returns True without touching the subscription again.
+    """
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    now_ts = to_db_ts(now)
+    async with db_module.POOL.acquire() as db:
+        await db.execute("BEGIN IMMEDIATE")
+        try:
+            cur = await db.execute(
+                "UPDATE payments SET status='paid', paid_at=? WHERE invoice_id=? AND status='pending' "
+                "RETURNING user_id, amount, plan",
+                (now_ts, invoice_id),
+            )
+            row = await cur.fetchone()
+            if not row:
+                await db.rollback()
+                cur = await db.execute("SELECT status FROM payments WHERE invoice_id=?", (invoice_id,))
+                current = await cur.fetchone()
+                return bool(current and current["status"] == "paid")
+            await db.execute(
+                "UPDATE users SET sub_started_at=?, sub_until=date(?, '+'||?||' days'), "
+                "sub_reminder_sent=0 WHERE user_id=?",
+                (now_ts, now_ts, _plan_days(row["amount"], row["plan"]), row["user_id"]),
+            )
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+    USER_CONTEXT.invalidate(row["user_id"])
+    return True
@@ -0,0 +1,108 @@
+"""Debounced, atomic snapshots of the JSON state files.
+
+Handlers only call ``mark_dirty(name)``.  A background task waits
+``interval`` seconds after the first change so a burst of changes becomes a
+single write, takes each dirty store's payload from its producer and writes
+it from a worker thread: temp file in the same directory, fsync, then
+``os.replace`` over the old file.  A crash mid-write leaves the previous
+snapshot intact.  ``close()`` flushes whatever is still dirty.
+"""
+import asyncio
+import json
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_INTERVAL = float(os.getenv("SNAPSHOT_INTERVAL", "1.0"))
+
+
+def write_json_atomic(path: Path, payload: Any) -> None:
+    data = json.dumps(payload, default=str)
+    directory = path.parent if str(path.parent) else Path(".")
+    fd, tmp_name = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_name, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except OSError:
+            pass
+        raise
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+class JsonSnapshotter:
+    def __init__(self, interval: float = SNAPSHOT_INTERVAL) -> None:
+        self.interval = interval
+        # name -> (path, producer); a producer returning None skips the write
+        self._stores: Dict[str, Tuple[Path, Callable[[], Any]]] = {}
+        self._dirty: Set[str] = set()
+        self._wake = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.writes = 0
+
+    def register(self, name: str, path: Path, producer: Callable[[], Any]) -> None:
+        self._stores[name] = (Path(path), producer)
+
+    def mark_dirty(self, name: str) -> None:
+        if name not in self._stores:
+            raise KeyError(f"unknown snapshot store: {name}")
+        self._dirty.add(name)
+        self._wake.set()
+
+    # ---- lifecycle ----
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await self._wake.wait()
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    # ---- writing ----
+    async def flush(self) -> None:
+        async with self._lock:
+            self._wake.clear()
+            names, self._dirty = self._dirty, set()
+            for name in sorted(names):
+                path, producer = self._stores[name]
+                try:
+                    payload = producer()
+                    if payload is not None:
+                        await asyncio.to_thread(write_json_atomic, path, payload)
+                        self.writes += 1
+                except Exception as exc:
+                    # keep it dirty so the next round retries
+                    self._dirty.add(name)
+                    self._wake.set()
+                    logger.warning("snapshot-write-failed", extra={"store": name, "error": str(exc)})
@@ -0,0 +1,141 @@
+"""Per-user context shared by middlewares, profiles, subscription checks and lang lookups.
+
+One ``users`` row read fills everything those code paths need (the profile
+fields, subscription window, reminder flag, activation).  Entries expire
+after ``ttl`` seconds so changes made by another process (the web app marking
+a payment paid) show up without a restart, and the least recently used
+entries are evicted beyond ``max_size``.  Writers in this process either
+``apply()`` the values they committed or ``invalidate()`` the entry, so their
+own changes are visible immediately.
+
+Concurrent misses for the same user share one query.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+
+import db as db_module
+from db import ConnectionPool
+
+PROFILE_FIELDS = (
+    "name",
+    "phone",
+    "lang",
+    "username",
+    "first_name",
+    "last_name",
+    "contact_verified_at",
+    "activated_at",
+    "expense_limit",
+    "expense_limit_start",
+    "expense_limit_notified",
+    "created_at",
+    "updated_at",
+)
+CONTEXT_FIELDS = PROFILE_FIELDS + (
+    "sub_started_at",
+    "sub_until",
+    "sub_reminder_sent",
+    "activated",
+)
+USER_CONTEXT_TTL = float(os.getenv("USER_CONTEXT_TTL", "30"))
+USER_CONTEXT_SIZE = int(os.getenv("USER_CONTEXT_SIZE", "10000"))
+
+
+class UserContextCache:
+    def __init__(
+        self,
+        pool: Optional[ConnectionPool] = None,
+        ttl: float = USER_CONTEXT_TTL,
+        max_size: int = USER_CONTEXT_SIZE,
+    ) -> None:
+        self._pool = pool
+        self.ttl = ttl
+        self.max_size = max(1, max_size)
+        # uid -> (expires_at, context or None when the user has no row)
+        self._entries: "OrderedDict[int, Tuple[float, Optional[Dict[str, Any]]]]" = OrderedDict()
+        self._inflight: Dict[int, asyncio.Future] = {}
+        self._stale: Set[int] = set()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def pool(self) -> ConnectionPool:
+        return self._pool or db_module.POOL
+
+    async def get(self, uid: int) -> Optional[Dict[str, Any]]:
+        """Context of ``uid`` (``None`` if the user has no row yet)."""
+        entry = self._entries.get(uid)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(uid)
+            self.hits += 1
+            return entry[1]
+        pending = self._inflight.get(uid)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[uid] = future
+        try:
+            context = await self._fetch(uid)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            future.exception()  # waiters re-raise it; keep asyncio quiet otherwise
+            raise
+        finally:
+            self._inflight.pop(uid, None)
+            # invalidate() while the query ran: the row read may predate the write
+            stale = uid in self._stale
+            self._stale.discard(uid)
+        if not stale:
+            self._store(uid, context)
+        future.set_result(context)
+        return context
+
+    def peek(self, uid: int) -> Optional[Dict[str, Any]]:
+        """Cached context of ``uid`` without a query, expired or not (``None`` if not cached)."""
+        entry = self._entries.get(uid)
+        return entry[1] if entry is not None else None
+
+    async def _fetch(self, uid: int) -> Optional[Dict[str, Any]]:
+        async with self.pool.acquire() as db:
+            cur = await db.execute(
+                f"SELECT {', '.join(CONTEXT_FIELDS)} FROM users WHERE user_id=?", (uid,)
+            )
+            row = await cur.fetchone()
+        return {key: row[key] for key in CONTEXT_FIELDS} if row else None
+
+    def _store(self, uid: int, context: Optional[Dict[str, Any]]) -> None:
+        self._entries[uid] = (time.monotonic() + self.ttl, context)
+        self._entries.move_to_end(uid)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def apply(self, uid: int, fields: Dict[str, Any]) -> None:
+        """Fold values just committed for ``uid`` into its cached entry, keeping its expiry."""
+        if uid in self._inflight:
+            self._stale.add(uid)
+        entry = self._entries.get(uid)
+        if entry is None:
+            return
+        expires_at, context = entry
+        self._entries[uid] = (expires_at, {**(context or dict.fromkeys(CONTEXT_FIELDS)), **fields})
+
+    def invalidate(self, uid: int) -> None:
+        """Re-read ``uid`` on the next ``get()``; ``peek()`` keeps serving it until then."""
+        entry = self._entries.get(uid)
+        if entry is not None:
+            self._entries[uid] = (0.0, entry[1])
+        if uid in self._inflight:
+            self._stale.add(uid)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+USER_CONTEXT = UserContextCache()
@@ -0,0 +1,222 @@
+"""Minimal streaming XLSX reader and writer on top of ``zipfile``.
+
+Only what statement import and ledger export need.  The reader yields the
+first worksheet's cell values as ``str``/``float``/``bool``/``datetime``
+one row at a time and clears parsed rows from the tree, so memory stays
+flat no matter how long the sheet is (shared strings are the only thing
+kept).  The writer streams a single sheet of inline strings and numbers
+straight into the zip entry.
+"""
+import posixpath
+import re
+import zipfile
+from datetime import datetime, timedelta
+from typing import IO, Any, Iterator, List, Optional, Sequence, Set
+from xml.etree.ElementTree import iterparse
+from xml.sax.saxutils import escape
+
+NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+# built-in number formats that render as dates/times
+DATE_FORMAT_IDS = set(range(14, 23)) | {45, 46, 47}
+DATE_FORMAT_RE = re.compile(r"[dmyhs]", re.IGNORECASE)
+EXCEL_EPOCH = datetime(1899, 12, 30)
+CELL_REF_RE = re.compile(r"([A-Z]+)")
+# control characters are not allowed in XML 1.0
+ILLEGAL_XML_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+QUOTE_ENTITY = {'"': "&quot;"}
+
+
+def _column_index(ref: str) -> Optional[int]:
+    m = CELL_REF_RE.match(ref or "")
+    if not m:
+        return None
+    idx = 0
+    for ch in m.group(1):
+        idx = idx * 26 + (ord(ch) - 64)
+    return idx - 1
+
+
+def _text(elem) -> str:
+    return "".join(t.text or "" for t in elem.iter(f"{NS}t"))
+
+
+def _first_sheet(zf: zipfile.ZipFile) -> str:
+    try:
+        with zf.open("xl/workbook.xml") as f:
+            rel_id = None
+            for _event, elem in iterparse(f):
+                if elem.tag == f"{NS}sheet":
+                    rel_id = elem.get(f"{REL_NS}id")
+                    break
+        with zf.open("xl/_rels/workbook.xml.rels") as f:
+            for _event, elem in iterparse(f):
+                if elem.tag == f"{PKG_REL_NS}Relationship" and elem.get("Id") == rel_id:
+                    target = elem.get("Target", "")
+                    if target.startswith("/"):
+                        return target.lstrip("/")
+                    return posixpath.normpath(posixpath.join("xl", target))
+    except KeyError:
+        pass
+    return "xl/worksheets/sheet1.xml"
+
+
+def _shared_strings(zf: zipfile.ZipFile) -> List[str]:
+    try:
+        f = zf.open("xl/sharedStrings.xml")
+    except KeyError:
+        return []
+    strings: List[str] = []
+    with f:
+        for _event, elem in iterparse(f):
+            if elem.tag == f"{NS}si":
+                strings.append(_text(elem))
+                elem.clear()
+    return strings
+
+
+def _date_styles(zf: zipfile.ZipFile) -> Set[int]:
+    """Indexes of ``cellXfs`` entries whose number format is a date."""
+    try:
+        f = zf.open("xl/styles.xml")
+    except KeyError:
+        return set()
+    custom_dates: Set[int] = set()
+    styles: Set[int] = set()
+    xf_index = 0
+    in_cell_xfs = False
+    with f:
+        for event, elem in iterparse(f, events=("start", "end")):
+            if elem.tag == f"{NS}numFmt" and event == "end":
+                code = re.sub(r'"[^"]*"|\[[^\]]*\]', "", elem.get("formatCode", ""))
+                if DATE_FORMAT_RE.search(code):
+                    custom_dates.add(int(elem.get("numFmtId", "0")))
+            elif elem.tag == f"{NS}cellXfs":
+                in_cell_xfs = event == "start"
+            elif elem.tag == f"{NS}xf" and event == "start" and in_cell_xfs:
+                fmt_id = int(elem.get("numFmtId", "0"))
+                if fmt_id in DATE_FORMAT_IDS or fmt_id in custom_dates:
+                    styles.add(xf_index)
+                xf_index += 1
+    return styles
+
+
+def iter_xlsx_rows(path: str) -> Iterator[List[Any]]:
+    """Rows of the first worksheet; empty cells are ``None``."""
+    with zipfile.ZipFile(path) as zf:
+        strings = _shared_strings(zf)
+        date_styles = _date_styles(zf)
+        with zf.open(_first_sheet(zf)) as f:
+            for _event, row in iterparse(f):
+                if row.tag != f"{NS}row":
+                    continue
+                values: List[Any] = []
+                for cell in row.iter(f"{NS}c"):
+                    idx = _column_index(cell.get("r", ""))
+                    if idx is None:
+                        idx = len(values)
+                    kind = cell.get("t", "n")
+                    raw = cell.find(f"{NS}v")
+                    raw_text = raw.text if raw is not None else None
+                    if kind == "inlineStr":
+                        value: Any = _text(cell)
+                    elif raw_text is None:
+                        value = None
+                    elif kind == "s":
+                        value = strings[int(raw_text)]
+                    elif kind == "b":
+                        value = raw_text == "1"
+                    elif kind in ("str", "e"):
+                        value = raw_text
+                    else:
+                        value = float(raw_text)
+                        if int(cell.get("s", "0")) in date_styles:
+                            value = EXCEL_EPOCH + timedelta(days=value)
+                    if idx >= len(values):
+                        values.extend([None] * (idx - len(values) + 1))
+                    values[idx] = value
+                row.clear()
+                yield values
+
+
+CONTENT_TYPES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    "</Types>"
+)
+ROOT_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    "</Relationships>"
+)
+WORKBOOK_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    "</Relationships>"
+)
+
+
+def _column_name(idx: int) -> str:
+    name = ""
+    idx += 1
+    while idx:
+        idx, rem = divmod(idx - 1, 26)
+        name = chr(65 + rem) + name
+    return name
+
+
+class XlsxWriter:
+    """Write one worksheet row by row into ``fileobj``; call ``close()`` at the end."""
+
+    def __init__(self, fileobj: IO[bytes], sheet_name: str = "Sheet1") -> None:
+        self._zip = zipfile.ZipFile(fileobj, "w", zipfile.ZIP_DEFLATED)
+        self._zip.writestr("[Content_Types].xml", CONTENT_TYPES_XML)
+        self._zip.writestr("_rels/.rels", ROOT_RELS_XML)
+        self._zip.writestr(
+            "xl/workbook.xml",
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            f'<workbook xmlns="{NS[1:-1]}" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{escape(sheet_name[:31], QUOTE_ENTITY)}" sheetId="1" r:id="rId1"/></sheets>'
+            "</workbook>",
+        )
+        self._zip.writestr("xl/_rels/workbook.xml.rels", WORKBOOK_RELS_XML)
+        self._sheet = self._zip.open("xl/worksheets/sheet1.xml", "w", force_zip64=True)
+        self._sheet.write(
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            f'<worksheet xmlns="{NS[1:-1]}"><sheetData>'.encode("utf-8")
+        )
+        self._rows = 0
+
+    def write_row(self, values: Sequence[Any]) -> None:
+        self._rows += 1
+        cells = []
+        for idx, value in enumerate(values):
+            if value is None or value == "":
+                continue
+            ref = f"{_column_name(idx)}{self._rows}"
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                text = escape(ILLEGAL_XML_RE.sub("", str(value)))
+                cells.append(f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+            else:
+                cells.append(f'<c r="{ref}"><v>{value}</v></c>')
+        self._sheet.write(f'<row r="{self._rows}">{"".join(cells)}</row>'.encode("utf-8"))
+
+    def close(self) -> None:
+        self._sheet.write(b"</sheetData></worksheet>")
+        self._sheet.close()
+        self._zip.close()
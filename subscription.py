@@ -6,7 +6,6 @@ import uuid
 from datetime import datetime, timedelta, timezone
 import re
 
-import aiosqlite
 from aiogram import F, Router, types
 from aiogram.filters import Command
 from aiogram.utils.keyboard import InlineKeyboardBuilder
@@ -29,7 +28,8 @@ from payments.click_polling import (
     build_click_pay_url,
     get_plan_amount,
 )
-from db import DB_PATH
+from db import POOL
+from services.user_context import USER_CONTEXT
 
 
 subscription_router = Router()
@@ -61,7 +61,6 @@ except Exception:
 PENDING_MANUAL_DIGITS: dict[int, dict[str, str]] = {}
 
 LANG_DEFAULT = "uz"
-_LANG_CACHE: dict[int, str] = {}
 
 LANG_TEXTS: dict[str, dict[str, str]] = {
     "status_inactive": {
@@ -215,26 +214,17 @@ def _normalize_lang(value: str | None) -> str:
 
 
 async def _get_user_lang(user_id: int, fallback: str | None = None) -> str:
-    cached = _LANG_CACHE.get(user_id)
-    if cached:
-        return cached
     lang_value: str | None = None
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
-            cur = await db.execute("SELECT lang FROM users WHERE user_id=?", (user_id,))
-            row = await cur.fetchone()
-        if row:
-            if isinstance(row, (list, tuple)):
-                lang_value = _normalize_lang(row[0])
-            else:
-                lang_value = _normalize_lang(row["lang"])
+        context = await USER_CONTEXT.get(user_id)
+        if context and context["lang"]:
+            lang_value = _normalize_lang(context["lang"])
     except Exception as exc:  # pragma: no cover
         logger.warning("user-lang-fetch-failed", extra={"uid": user_id, "error": str(exc)})
     if not lang_value and fallback:
         lang_value = _normalize_lang(fallback)
     if not lang_value:
         lang_value = LANG_DEFAULT
-    _LANG_CACHE[user_id] = lang_value
     return lang_value
 
 
@@ -309,13 +299,19 @@ def _format_display_amount(amount: str) -> str:
 async def _send_status(message: types.Message) -> None:
     user_id = message.from_user.id
     lang = await _get_user_lang(user_id, getattr(message.from_user, "language_code", None))
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with POOL.acquire() as db:
         cur = await db.execute(
             "SELECT sub_started_at, sub_until FROM users WHERE user_id=?",
             (user_id,),
         )
         row = await cur.fetchone()
+        plan_row = None
+        if row and row["sub_until"]:
+            cur = await db.execute(
+                "SELECT plan FROM payments WHERE user_id=? AND status='paid' ORDER BY paid_at DESC LIMIT 1",
+                (user_id,),
+            )
+            plan_row = await cur.fetchone()
     if not row or not row["sub_until"]:
         await message.answer(_t("status_inactive", lang))
         return
@@ -324,13 +320,6 @@ async def _send_status(message: types.Message) -> None:
         until = until.replace(tzinfo=timezone.utc)
     tz = ZoneInfo(os.getenv("TZ", "Asia/Tashkent"))
     until_local = until.astimezone(tz)
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        cur = await db.execute(
-            "SELECT plan FROM payments WHERE user_id=? AND status='paid' ORDER BY datetime(paid_at) DESC LIMIT 1",
-            (user_id,),
-        )
-        plan_row = await cur.fetchone()
     plan_key = plan_row["plan"] if plan_row else ""
     plan_label = _plan_label(plan_key, lang)
     status_key = "status_active" if until > datetime.now(timezone.utc) else "status_expired"
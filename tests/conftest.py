@@ -0,0 +1,15 @@
+"""Point ``db`` at a scratch database before any test imports it.
+
+``DB_POOL_SIZE=1`` keeps every query on one connection, so a trace callback
+set on it sees all of them.
+"""
+import os
+import sys
+import tempfile
+
+_TMP = tempfile.TemporaryDirectory()
+os.environ["DB_PATH"] = os.path.join(_TMP.name, "test.db")
+os.environ["DB_POOL_SIZE"] = "1"
+os.environ.pop("WEB_BASE", None)
+os.environ["ALLOW_MANUAL_CONFIRM"] = "true"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,82 @@
+"""A failed ledger flush must not lose acknowledged writes.
+
+Transient errors (a locked database) keep every op queued for the next
+flush; only an op that can never be written is dropped, and the ops around
+it still land.
+"""
+import asyncio
+import sqlite3
+from datetime import timezone
+
+import db
+from services.ledger import Ledger
+
+UID = 9001
+
+
+async def _rows(uid: int):
+    async with db.POOL.acquire() as conn:
+        cur = await conn.execute("SELECT note FROM transactions WHERE user_id=? ORDER BY id", (uid,))
+        notes = [row["note"] for row in await cur.fetchall()]
+        cur = await conn.execute(
+            "SELECT SUM(tx_count) FROM user_month_stats WHERE user_id=?", (uid,)
+        )
+        counted = (await cur.fetchone())[0] or 0
+    return notes, counted
+
+
+async def _ledger() -> Ledger:
+    await db.run_migrations()
+    ledger = Ledger(tz=timezone.utc, flush_interval=3600)
+    await ledger.start()
+    return ledger
+
+
+def test_transient_failure_keeps_ops_queued():
+    async def main():
+        ledger = await _ledger()
+        await ledger.add(UID, "expense", 1000, "UZS", "cash", "food", "first")
+        await ledger.add(UID, "expense", 2000, "UZS", "cash", "food", "second")
+        apply = ledger._apply
+        failures = []
+
+        async def locked_once(conn, ops):
+            if not failures:
+                failures.append(len(ops))
+                raise sqlite3.OperationalError("database is locked")
+            await apply(conn, ops)
+
+        ledger._apply = locked_once
+        await ledger.flush()
+        assert failures == [2]
+        assert len(ledger._pending) == 2
+        assert ledger._retry_at > 0
+        await ledger.add(UID, "expense", 3000, "UZS", "cash", "food", "third")
+        await ledger.flush()
+        assert ledger._pending == [] and ledger._retry_at == 0
+        await ledger.close()
+        result = await _rows(UID)
+        await db.POOL.close()
+        return result
+
+    notes, counted = asyncio.run(main())
+    assert notes == ["first", "second", "third"]
+    assert counted == 3
+
+
+def test_permanent_failure_drops_only_that_op():
+    async def main():
+        ledger = await _ledger()
+        await ledger.add(UID + 1, "expense", 1000, "UZS", "cash", "food", "kept")
+        ledger._pending.append(("insert", (1, 2)))  # wrong number of bindings
+        await ledger.add(UID + 1, "expense", 2000, "UZS", "cash", "food", "also kept")
+        await ledger.flush()
+        assert ledger._pending == []
+        await ledger.close()
+        result = await _rows(UID + 1)
+        await db.POOL.close()
+        return result
+
+    notes, counted = asyncio.run(main())
+    assert notes == ["kept", "also kept"]
+    assert counted == 2
@@ -0,0 +1,125 @@
+"""Handlers that touch the database must not stall the event loop.
+
+Another connection holds the write lock while the handlers run; asyncio
+debug mode reports every callback that keeps the loop busy for longer than
+``THRESHOLD_S`` (see also ``bench/loop_block.py``).
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from types import SimpleNamespace
+
+import db
+from bot.middlewares.phone_gate import PhoneGateMiddleware
+from bot.routers import contact_router, pay_debug, subscription_plans
+
+THRESHOLD_S = 0.05
+LOCK_S = 0.3
+
+
+class SlowCallbacks(logging.Handler):
+    """Collects asyncio's "Executing <Handle ...> took N seconds" reports."""
+
+    def __init__(self) -> None:
+        super().__init__(logging.WARNING)
+        self.reports = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        message = record.getMessage()
+        if message.startswith("Executing"):
+            self.reports.append(message)
+
+
+class FakeMessage:
+    def __init__(self, user_id: int, text: str = "") -> None:
+        self.from_user = SimpleNamespace(id=user_id)
+        self.text = text
+        self.contact = None
+        self.replies = []
+
+    async def answer(self, text: str, **_kw) -> None:
+        self.replies.append(text)
+
+
+class FakeCallback:
+    def __init__(self, user_id: int) -> None:
+        self.from_user = SimpleNamespace(id=user_id)
+        self.message = FakeMessage(user_id)
+
+    async def answer(self, *_a, **_kw) -> None:
+        return None
+
+
+def _hold_write_lock(locked: threading.Event) -> None:
+    conn = sqlite3.connect(os.environ["DB_PATH"])
+    conn.execute("BEGIN IMMEDIATE")
+    locked.set()
+    time.sleep(LOCK_S)
+    conn.commit()
+    conn.close()
+
+
+async def _under_lock(work) -> None:
+    locked = threading.Event()
+    holder = threading.Thread(target=_hold_write_lock, args=(locked,))
+    holder.start()
+    while not locked.is_set():
+        await asyncio.sleep(0.001)
+    try:
+        await work()
+    finally:
+        while holder.is_alive():
+            await asyncio.sleep(0.005)
+        # the slow-callback report is logged once the current step yields
+        await asyncio.sleep(0)
+
+
+async def _blocking_store() -> None:
+    conn = sqlite3.connect(os.environ["DB_PATH"], timeout=5)
+    conn.execute("UPDATE users SET phone='x' WHERE user_id=0")
+    conn.commit()
+    conn.close()
+
+
+async def _handlers() -> None:
+    async def passthrough(_event, _data):
+        return None
+
+    user_id = 42
+    await PhoneGateMiddleware()(passthrough, FakeMessage(user_id, "salom"), {})
+    await contact_router._store_phone(user_id, "+998901234567")
+    await subscription_plans.show_subscription_plans(FakeMessage(user_id))
+    await pay_debug.pay_status(FakeMessage(user_id, "/pay_status"))
+    await pay_debug.last_invoice(FakeMessage(user_id, "/last_invoice"))
+    await pay_debug.force_return(FakeMessage(user_id, "/force_return"))
+    await subscription_plans.pay_check(FakeCallback(user_id))
+
+
+def _slow_callbacks(work) -> list:
+    detector = SlowCallbacks()
+
+    async def main() -> None:
+        asyncio.get_running_loop().slow_callback_duration = THRESHOLD_S
+        await db.run_migrations()
+        await asyncio.sleep(0)
+        logging.getLogger("asyncio").addHandler(detector)
+        try:
+            await _under_lock(work)
+        finally:
+            logging.getLogger("asyncio").removeHandler(detector)
+            await db.WRITES.close()
+            await db.POOL.close()
+
+    asyncio.run(main(), debug=True)
+    return detector.reports
+
+
+def test_detector_fires_on_blocking_sqlite3():
+    assert _slow_callbacks(_blocking_store)
+
+
+def test_handlers_do_not_block_the_loop():
+    assert _slow_callbacks(_handlers) == []
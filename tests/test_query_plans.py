@@ -0,0 +1,112 @@
+"""Every hot lookup must be answered by its index, never by a table scan.
+
+Each case calls the real query helper with tracing on and runs the SELECTs
+it issued through EXPLAIN QUERY PLAN (see also ``bench/query_plans.py``).
+"""
+import asyncio
+import re
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+import db
+import payments
+from services.debt_archive import DebtArchive
+from services.debts import DebtStore
+from services.ledger import Ledger
+
+UID = 7
+SINCE = datetime.now(timezone.utc) - timedelta(days=7)
+
+
+async def _seed() -> None:
+    await db.run_migrations()
+    now = datetime.now(timezone.utc)
+    stamps = [db.to_db_ts(now - timedelta(hours=i)) for i in range(2000)]
+    async with db.POOL.acquire() as conn:
+        await conn.executemany(
+            "INSERT INTO transactions(user_id, kind, amount, created_at) VALUES(?,?,?,?)",
+            [(i % 50, "expense" if i % 3 else "income", 1000 + i, ts) for i, ts in enumerate(stamps)],
+        )
+        await conn.executemany(
+            "INSERT INTO payments(user_id, invoice_id, amount, status, created_at) VALUES(?,?,?,?,?)",
+            [(i % 50, f"inv-{i}", 19900, "paid" if i % 2 else "pending", ts) for i, ts in enumerate(stamps)],
+        )
+        await conn.executemany(
+            "INSERT INTO subs(user_id, plan, status, pay_id, start_at, end_at) VALUES(?,?,?,?,?,?)",
+            [(i % 50, "sub_month", "active", f"inv-{i}", ts, ts) for i, ts in enumerate(stamps)],
+        )
+        await conn.executemany(
+            "INSERT INTO debts(user_id, direction, amount, due_date, status, done) VALUES(?,?,?,?,?,?)",
+            [(i % 50, "given" if i % 2 else "taken", 5000, ts[:10], "wait" if i % 4 else "paid", int(i % 4 == 0))
+             for i, ts in enumerate(stamps)],
+        )
+        await conn.executemany(
+            "INSERT INTO debts_archive(debt_id, user_id, direction, amount, status, archived_at) "
+            "VALUES(?,?,?,?,?,?)",
+            [(i, i % 50, "given", 5000, "paid", ts) for i, ts in enumerate(stamps)],
+        )
+        await conn.commit()
+        await conn.execute("ANALYZE")
+    await db.POOL.close()
+
+
+@pytest.fixture(scope="module", autouse=True)
+def seeded():
+    asyncio.run(_seed())
+
+
+async def _conn(call):
+    async with db.POOL.acquire() as conn:
+        await call(conn)
+
+
+# call(ledger) -> awaitable; the ledger is started before tracing begins
+CASES = [
+    ("stats", "idx_transactions_user_created", lambda _: _conn(lambda c: db.stats(c, UID, SINCE))),
+    ("list_report", "idx_transactions_user_created", lambda _: _conn(lambda c: db.list_report(c, UID, 30))),
+    ("debts_due_morning", "idx_debts_done_due", lambda _: _conn(db.debts_due_today_morning)),
+    ("debts_due_evening", "idx_debts_done_due", lambda _: _conn(db.debts_due_today_evening)),
+    ("current_sub", "idx_subs_user_status_end", lambda _: _conn(lambda c: db.current_sub(c, UID))),
+    ("recent_pending_payment", "idx_payments_user_created", lambda _: payments.get_recent_pending_payment(UID)),
+    ("latest_payment", "idx_payments_user_created", lambda _: payments.get_latest_payment(UID)),
+    ("ledger_range", "idx_transactions_user_created",
+     lambda ledger: ledger.range(UID, since=SINCE - timedelta(days=365))),
+    ("ledger_month_stats", "PRIMARY KEY", lambda ledger: ledger.month_stats(UID, SINCE.strftime("%Y%m"))),
+    ("debts_open", "idx_debts_user_direction_status", lambda _: DebtStore().open(UID, "given")),
+    ("debts_due", "idx_debts_done_due", lambda _: DebtStore().due(date.today())),
+    ("debts_archive_page", "idx_debts_archive_user_id", lambda _: DebtArchive().page(UID, 10, before_id=1500)),
+]
+
+
+async def _plans(call):
+    ledger = Ledger(tz=timezone.utc, cache_per_user=1)
+    await ledger.start()
+    statements = []
+    async with db.POOL.acquire() as conn:
+        await conn.set_trace_callback(statements.append)
+    try:
+        await call(ledger)
+    finally:
+        async with db.POOL.acquire() as conn:
+            await conn.set_trace_callback(None)
+        await ledger.close()
+    plans = {}
+    async with db.POOL.acquire() as conn:
+        for sql in statements:
+            if sql.lstrip().upper().startswith("SELECT"):
+                cur = await conn.execute(f"EXPLAIN QUERY PLAN {sql}")
+                plans[" ".join(sql.split())] = [row["detail"] for row in await cur.fetchall()]
+    await db.POOL.close()
+    return plans
+
+
+@pytest.mark.parametrize("name,index,call", CASES, ids=[case[0] for case in CASES])
+def test_hot_query_uses_index(name, index, call):
+    hot = asyncio.run(_plans(call))
+    assert hot, f"{name} issued no SELECT"
+    wanted = re.compile(rf"^SEARCH \w+ USING (?:COVERING )?(?:INDEX )?{index}\b")
+    for sql, plan in hot.items():
+        scans = [d for d in plan if d.startswith("SCAN") and "USING" not in d]
+        assert not scans, f"{sql}: {plan}"
+    assert any(wanted.match(d) for plan in hot.values() for d in plan), f"{name} did not use {index}: {hot}"
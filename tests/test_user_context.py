@@ -0,0 +1,73 @@
+"""Profiles and the user context share one cached ``users`` read.
+
+A cold user costs a single SELECT whichever of the two asks first, and a
+profile update is visible to both without another read.
+"""
+import asyncio
+
+import db
+from services.profiles import UserProfiles
+from services.user_context import UserContextCache
+
+UID = 7001
+
+
+def _user_reads(statements):
+    return [sql for sql in statements if sql.lstrip().upper().startswith("SELECT") and "FROM users" in sql]
+
+
+async def _traced(call):
+    statements = []
+    async with db.POOL.acquire() as conn:
+        await conn.set_trace_callback(statements.append)
+    try:
+        await call()
+    finally:
+        async with db.POOL.acquire() as conn:
+            await conn.set_trace_callback(None)
+    return statements
+
+
+def test_profile_and_context_share_one_read():
+    async def main():
+        await db.run_migrations()
+        context = UserContextCache()
+        profiles = UserProfiles(context=context)
+        seen = {}
+
+        async def lookups():
+            seen["profile"] = await profiles.load(UID)
+            seen["context"] = await context.get(UID)
+            seen["concurrent"] = await asyncio.gather(profiles.load(UID + 1), context.get(UID + 1))
+
+        statements = await _traced(lookups)
+        await db.POOL.close()
+        return seen, _user_reads(statements)
+
+    seen, reads = asyncio.run(main())
+    assert seen["profile"] is None and seen["context"] is None
+    assert seen["concurrent"] == [None, None]
+    assert len(reads) == 2  # one per user
+
+
+def test_update_is_visible_to_both_without_rereading():
+    async def main():
+        await db.run_migrations()
+        context = UserContextCache()
+        profiles = UserProfiles(context=context)
+        seen = {}
+
+        async def update():
+            await profiles.update(UID + 2, lang="ru", first_name="Ali")
+            seen["profile"] = profiles.get(UID + 2)
+            seen["context"] = await context.get(UID + 2)
+
+        statements = await _traced(update)
+        await db.WRITES.close()
+        await db.POOL.close()
+        return seen, _user_reads(statements)
+
+    seen, reads = asyncio.run(main())
+    assert seen["profile"]["lang"] == "ru" and seen["profile"]["first_name"] == "Ali"
+    assert seen["context"]["lang"] == "ru" and seen["context"]["created_at"]
+    assert len(reads) == 1  # the load inside update()
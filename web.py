@@ -4,7 +4,6 @@ from datetime import datetime, timedelta
 from decimal import Decimal
 from typing import Any, Dict, Optional
 
-import aiosqlite
 from aiogram import Bot
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request, Response, Query
@@ -14,12 +13,12 @@ from zoneinfo import ZoneInfo
 from urllib.parse import urlencode, quote
 
 from payments import (
-    ensure_schema as ensure_payment_schema,
     get_payment_by_invoice,
     log_callback,
     mark_payment_paid,
 )
-from db import DB_PATH
+from db import POOL, WRITES, run_migrations
+from services.user_context import USER_CONTEXT
 
 load_dotenv()
 
@@ -50,24 +49,15 @@ app = FastAPI()
 app.mount("/clickpay", StaticFiles(directory="clickpay"), name="clickpay")
 
 
-async def _ensure_user_columns_async() -> None:
-    async with aiosqlite.connect(DB_PATH) as db:
-        cur = await db.execute("PRAGMA table_info(users)")
-        cols = {row[1] for row in await cur.fetchall()}
-        statements = []
-        if "sub_started_at" not in cols:
-            statements.append("ALTER TABLE users ADD COLUMN sub_started_at TIMESTAMP")
-        if "sub_until" not in cols:
-            statements.append("ALTER TABLE users ADD COLUMN sub_until TIMESTAMP")
-        if "sub_reminder_sent" not in cols and "sub_reminder_sent_date" not in cols:
-            statements.append("ALTER TABLE users ADD COLUMN sub_reminder_sent INTEGER DEFAULT 0")
-        for stmt in statements:
-            try:
-                await db.execute(stmt)
-            except Exception:
-                pass
-        if statements:
-            await db.commit()
+@app.on_event("startup")
+async def _migrate_db() -> None:
+    await run_migrations()
+
+
+@app.on_event("shutdown")
+async def _close_db_pool() -> None:
+    await WRITES.close()
+    await POOL.close()
 
 
 def _click_error_response(payload: Dict[str, Any], code: int, note: str, prepare_id: Optional[int] = None) -> JSONResponse:
@@ -119,8 +109,6 @@ def clickpay_pay(
 @app.get("/payments/return")
 async def payments_return(invoice_id: str):
     try:
-        await ensure_payment_schema()
-        await _ensure_user_columns_async()
         record = await mark_payment_paid(invoice_id)
     except Exception:
         record = None
@@ -179,8 +167,6 @@ async def click_prepare(request: Request) -> JSONResponse:
     await log_callback("click_prepare", payload, False)
 
     try:
-        await ensure_payment_schema()
-
         err = _validate_click_payload(payload)
         if err:
             return _click_error_response(payload, -4, err)
@@ -206,8 +192,6 @@ async def click_complete(request: Request) -> JSONResponse:
     await log_callback("click_complete", payload, False)
 
     try:
-        await ensure_payment_schema()
-
         err = _validate_click_payload(payload)
         if err:
             return _click_error_response(payload, -4, err)
@@ -226,12 +210,13 @@ async def click_complete(request: Request) -> JSONResponse:
         await log_callback("click_complete_result", {**payload, "status": status}, ok)
 
         if ok and isinstance(result, dict):
-            start_iso = result.get("sub_start") or result.get("paid_at") or datetime.now(LOCAL_TZ).isoformat()
-            end_iso = result.get("sub_end")
-            if not end_iso:
-                end_dt = _parse_iso(start_iso) + timedelta(days=SUBSCRIPTION_DAYS)
-                end_iso = end_dt.isoformat()
-            await _notify_subscription(result.get("user_id"), start_iso, end_iso)
+            if result.get("activated"):
+                start_iso = result.get("sub_start") or result.get("paid_at") or datetime.now(LOCAL_TZ).isoformat()
+                end_iso = result.get("sub_end")
+                if not end_iso:
+                    end_dt = _parse_iso(start_iso) + timedelta(days=SUBSCRIPTION_DAYS)
+                    end_iso = end_dt.isoformat()
+                await _notify_subscription(result.get("user_id"), start_iso, end_iso)
             return _click_success_response(payload, record["id"])
 
         return _click_error_response(payload, -9, "Failed to confirm", record.get("id"))
@@ -266,13 +251,10 @@ def _parse_iso(dt_str: str) -> datetime:
 
 
 async def _get_user_lang(user_id: int) -> str:
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        cur = await db.execute("SELECT lang FROM users WHERE user_id=?", (user_id,))
-        row = await cur.fetchone()
-        if not row:
-            return "uz"
-        return (row["lang"] or "uz")
+    context = await USER_CONTEXT.get(user_id)
+    if not context:
+        return "uz"
+    return context["lang"] or "uz"
 
 
 def _render_sub_ok(lang: str, start: str, end: str) -> str:
@@ -296,7 +278,6 @@ async def _notify_subscription(user_id: int, start_iso: str, end_iso: str) -> No
 
 @app.api_route("/payments/callback", methods=["GET", "POST"])
 async def payments_callback(request: Request) -> Response:
-    await ensure_payment_schema()
     payload = await _read_payload(request)
     invoice_id = payload.get("transaction_param") or payload.get("invoice_id")
     await log_callback("callback", payload, False)
@@ -320,7 +301,7 @@ async def payments_callback(request: Request) -> Response:
             pass
     result = await mark_payment_paid(invoice_id)
     await log_callback("callback_verified", payload, True)
-    if result and result.get("status") == "paid":
+    if result and result.get("activated"):
         start_iso = result.get("sub_start") or result.get("paid_at") or datetime.now(LOCAL_TZ).isoformat()
         end_iso = result.get("sub_end")
         if not end_iso: